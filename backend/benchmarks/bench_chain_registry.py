@@ -0,0 +1,57 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Compares the Python-side overhead of building the structured chain on every call against the chain registry"""
+
+import argparse
+import statistics
+import time
+
+from langchain_aws import ChatBedrock
+
+from stubs import CANNED_OUTPUTS, FakeBedrockRuntime, load_lambda
+
+parser = argparse.ArgumentParser(description='Measure per call chain setup overhead of process_post')
+parser.add_argument('--iterations', type=int, default=200, help='Number of calls per variant')
+
+
+def rebuild_per_call(process_post, text):
+    # The way the chains were built before the registry existed
+    bedrock_llm = ChatBedrock(
+        model_id=process_post.MODEL_ID,
+        model_kwargs=process_post.INFORMATION_EXTRACTION_MODEL_PARAMETERS,
+        client=process_post.bedrock_runtime,
+    )
+    prompt = process_post.get_prompt('information_extraction')
+    structured_chain = prompt | bedrock_llm.with_structured_output(process_post.ExtractedInformation)
+    return structured_chain.invoke({"text": text, "sentiments": process_post.META_SENTIMENTS_STR})
+
+
+def registry(process_post, text):
+    return process_post.text_information_extraction(process_post.META_SENTIMENTS_STR, text)
+
+
+def measure(function, process_post, iterations, phase):
+    # Texts differ between phases so that no measured call is answered by the insights cache from the warm-up
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        function(process_post, f'My {phase} new years resolution number {i} is to read more books')
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    process_post = load_lambda('process_post')
+    process_post.bedrock_runtime = FakeBedrockRuntime(CANNED_OUTPUTS)
+
+    for name, function in [('rebuild per call', rebuild_per_call), ('chain registry', registry)]:
+        # Warm up so that one-off imports and the first registry build are not measured
+        measure(function, process_post, 5, 'warm-up')
+        timings = measure(function, process_post, args.iterations, 'measured')
+        print(f'{name:>16}: mean {statistics.mean(timings):.3f} ms, '
+              f'p50 {statistics.median(timings):.3f} ms, '
+              f'p95 {statistics.quantiles(timings, n=20)[18]:.3f} ms')
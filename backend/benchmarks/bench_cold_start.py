@@ -0,0 +1,148 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Measures the cold start of process_post with each model client: the import of the function, with the breakdown of
+python -X importtime by top level package, and its first invocation on a local stand-in for Bedrock
+
+Every run is a fresh interpreter. The command fails when the median import time of a client exceeds its budget, the
+import time of the --baseline results plus --margin unless set with --<client>_budget_ms. Import times depend on the
+machine, the baseline must be recorded on the same one with --output.
+"""
+
+import argparse
+import collections
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CLIENTS = ['langchain', 'converse']
+
+# Runs in the fresh interpreter, prints the wall time of the import and of the first invocation as JSON
+COLD_START = '''
+import json, sys, time
+sys.path.insert(0, {benchmarks_dir!r})
+start = time.perf_counter()
+from stubs import CANNED_OUTPUTS, FakeBedrockRuntime, LambdaContextStub, load_lambda
+process_post = load_lambda('process_post', {{'POWERTOOLS_LOG_LEVEL': 'ERROR'}})
+import_ms = (time.perf_counter() - start) * 1000
+bedrock_runtime = process_post.bedrock_runtime
+process_post.bedrock_runtime = process_post.PromptCachingClient(FakeBedrockRuntime(CANNED_OUTPUTS),
+    mark_cacheable=bedrock_runtime.mark_cacheable, cache_messages=bedrock_runtime.cache_messages)
+start = time.perf_counter()
+process_post.handler({{'text': 'My resolution is to learn to cook', 'user': 'benchmark', 'source': 'benchmark',
+                      'platform': 'benchmark', 'created_at': '2024-01-01T00:00:00.000z'}}, LambdaContextStub())
+first_invocation_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{'import_ms': import_ms, 'first_invocation_ms': first_invocation_ms,
+                  'langchain_modules': sum(name.startswith('langchain') for name in sys.modules)}}))
+'''
+
+# import time: self [us] | cumulative | imported package
+IMPORT_TIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+parser = argparse.ArgumentParser(description='Import time and first invocation of process_post per model client')
+parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per client, the median is reported')
+parser.add_argument('--clients', type=str, nargs='+', default=CLIENTS, choices=CLIENTS)
+parser.add_argument('--process_mode', type=str, default='two_calls', choices=['two_calls', 'fused'])
+parser.add_argument('--baseline', type=str, help='Results file recorded with --output, the budgets are derived from it')
+parser.add_argument('--margin', type=float, default=0.25, help='Share of the baseline import time allowed on top of it')
+parser.add_argument('--langchain_budget_ms', type=float, help='Fixed budget, overrides the one of the baseline')
+parser.add_argument('--converse_budget_ms', type=float, help='Fixed budget, overrides the one of the baseline')
+parser.add_argument('--top', type=int, default=8, help='Packages listed in the import time breakdown')
+parser.add_argument('--output', type=str, help='Writes the results as JSON to this file')
+parser.add_argument('--compare', type=str, help='Results file of a previous run to compare with')
+
+
+def package_import_times(importtime_output):
+    """Milliseconds spent importing every top level package, its own modules and the modules they import first"""
+
+    totals = collections.Counter()
+    for line in importtime_output.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match and not match.group(3).startswith('  '):
+            # Top level entries are indented by a single space, their cumulative time includes their dependencies
+            totals[match.group(4).split('.')[0]] += int(match.group(2)) / 1000
+    return totals
+
+
+def import_budgets(args) -> dict:
+    """Budget of the median import time of every client, None when there is nothing to derive it from"""
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    budgets = {}
+    for client in CLIENTS:
+        budget = getattr(args, f'{client}_budget_ms')
+        if budget is None and client in baseline:
+            budget = round(baseline[client]['import_ms'] * (1 + args.margin), 1)
+        budgets[client] = budget
+    return budgets
+
+
+def cold_start(client, process_mode):
+
+    environment = {**os.environ, 'MODEL_CLIENT': client, 'PROCESS_MODE': process_mode}
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', COLD_START.format(benchmarks_dir=BENCHMARKS_DIR)],
+        capture_output=True, text=True, env=environment, cwd=BENCHMARKS_DIR
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'Cold start with {client} failed:\n{completed.stderr[-2000:]}')
+
+    return json.loads(completed.stdout.strip().splitlines()[-1]), package_import_times(completed.stderr)
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    budgets = import_budgets(args)
+    results, over_budget = {}, []
+
+    for client in args.clients:
+
+        runs = [cold_start(client, args.process_mode) for _ in range(args.runs)]
+        packages = collections.Counter()
+        for _, package_times in runs:
+            packages.update(package_times)
+
+        import_ms = statistics.median(run['import_ms'] for run, _ in runs)
+        results[client] = {
+            'import_ms': round(import_ms, 1),
+            'first_invocation_ms': round(statistics.median(run['first_invocation_ms'] for run, _ in runs), 1),
+            'langchain_modules': runs[0][0]['langchain_modules'],
+            'budget_ms': budgets[client],
+            'packages_ms': {package: round(total / len(runs), 1) for package, total in packages.most_common(args.top)},
+        }
+
+        budget = 'no budget' if budgets[client] is None else f'budget {budgets[client]} ms'
+        print(f'{client}: import {results[client]["import_ms"]} ms ({budget}), first invocation '
+              f'{results[client]["first_invocation_ms"]} ms, {results[client]["langchain_modules"]} LangChain modules')
+        for package, milliseconds in results[client]['packages_ms'].items():
+            print(f'  {package:<24} {milliseconds:8.1f} ms')
+
+        if budgets[client] is not None and import_ms > budgets[client]:
+            over_budget.append(client)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        for client, result in results.items():
+            if client in baseline:
+                for key in ('import_ms', 'first_invocation_ms'):
+                    before, after = baseline[client][key], result[key]
+                    print(f'  {client} {key}: {before} -> {after} ({(after - before) / before:+.1%})')
+
+    if over_budget:
+        print(f'Import time over budget for {", ".join(over_budget)}', file=sys.stderr)
+        sys.exit(1)
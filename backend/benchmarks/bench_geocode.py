@@ -0,0 +1,115 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Measures locate_post lookup latency with the gazetteer and the geocode cache against a simulated place index"""
+
+import argparse
+import random
+import statistics
+import time
+
+from stubs import FakeLocationService, LambdaContextStub, load_lambda
+
+# The cities data-streammer appends to the posts, plus other spellings found in real posts
+SAMPLE_CITIES = ['New York', 'Chicago', 'Kentucky', 'Arkansas', 'Miami', 'Los Angeles', 'San Francisco', 'New Jersey',
+                 'San Diego', 'Orlando', 'Arlington', 'Washington DC', 'Las Vegas', 'Portland', 'Seattle', 'Austin',
+                 'Phoenix']
+VARIANTS = ['NYC', 'new york', 'Seattle, WA', 'LAS VEGAS', 'Austin, Texas', 'San Francisco!', 'Boise', 'Spokane']
+UNKNOWN = ['my house', 'the gym', 'nowhere', 'home']
+
+parser = argparse.ArgumentParser(description='Benchmark the geocode cache and gazetteer of locate_post')
+parser.add_argument('--lookups', type=int, default=2000)
+parser.add_argument('--service_latency_ms', type=float, default=60,
+                    help='Simulated round trip of SearchPlaceIndexForText')
+parser.add_argument('--batch_size', type=int, default=25, help='Posts located together by the batch API')
+parser.add_argument('--seed', type=int, default=7)
+
+
+def percentile(values, ratio):
+    return sorted(values)[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run(locate_post, locations, enable_cache, gazetteer):
+
+    locate_post.GAZETTEER = gazetteer
+    service = locate_post.location_service
+    service.requests.clear()
+
+    latencies = []
+    for location in locations:
+        if not enable_cache:
+            locate_post.GEOCODE_CACHE.memory.entries.clear()
+        start = time.perf_counter()
+        locate_post.handler({'location': location}, LambdaContextStub())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencies, len(service.requests)
+
+
+def run_batches(locate_post, locations, batch_size, batch):
+    """Locates the posts batch_size at a time, one by one or with the batch API, from an empty cache each batch"""
+
+    service = locate_post.location_service
+    service.requests.clear()
+    failed = 0
+
+    latencies = []
+    for offset in range(0, len(locations), batch_size):
+        items = [{'location': location, 'process_location': True}
+                 for location in locations[offset:offset + batch_size]]
+        locate_post.GEOCODE_CACHE.memory.entries.clear()
+        start = time.perf_counter()
+        if batch:
+            items = locate_post.handler({'posts': items}, LambdaContextStub())['posts']
+        else:
+            for item in items:
+                try:
+                    locate_post.handler(item, LambdaContextStub())
+                except Exception as e:
+                    item['error'] = str(e)
+        latencies.append((time.perf_counter() - start) * 1000)
+        failed += sum('error' in item for item in items)
+
+    return latencies, len(service.requests), failed
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    locate_post = load_lambda('locate_post', {'LOG_LEVEL': 'WARNING'})
+    gazetteer = locate_post.Gazetteer.load(locate_post.GAZETTEER_PATH, 'USA')
+
+    # The simulated index knows every spelling of the sample, and a few places the gazetteer does not have
+    places = {name: (0.0, 0.0) for name in SAMPLE_CITIES + VARIANTS}
+    locate_post.location_service = FakeLocationService(places, args.service_latency_ms / 1000)
+
+    population = SAMPLE_CITIES * 8 + VARIANTS * 2 + UNKNOWN
+    locations = [rng.choice(population) for _ in range(args.lookups)]
+
+    for name, enable_cache, enable_gazetteer in [('service only', False, False), ('cache', True, False),
+                                                 ('gazetteer and cache', True, True)]:
+
+        locate_post.GEOCODE_CACHE = locate_post.create_geocode_cache(['USA', 'en', 'benchmark'], 4096, 86400, 3600)
+        latencies, service_calls = run(locate_post, locations, enable_cache, gazetteer if enable_gazetteer else None)
+
+        print(f'{name}: {service_calls} service calls for {len(locations)} lookups, '
+              f'p50 {statistics.median(latencies):.3f} ms, p99 {percentile(latencies, 0.99):.3f} ms, '
+              f'mean {statistics.mean(latencies):.3f} ms')
+        if enable_cache:
+            print(f'  {locate_post.GEOCODE_CACHE.stats()}')
+
+    # Cold batches against the service only, one of the places failing every time it is searched
+    locate_post.GAZETTEER = None
+    locate_post.location_service = FakeLocationService(places, args.service_latency_ms / 1000, failures=['Boise'])
+    batch_locations = locations[:args.batch_size * 8]
+
+    for name, batch in [('sequential', False), ('batch', True)]:
+
+        locate_post.GEOCODE_CACHE = locate_post.create_geocode_cache(['USA', 'en', 'benchmark'], 4096, 86400, 3600)
+        latencies, service_calls, failed = run_batches(locate_post, batch_locations, args.batch_size, batch)
+
+        print(f'{name} batches of {args.batch_size}: {service_calls} service calls for {len(batch_locations)} posts, '
+              f'{failed} failed posts, p50 {statistics.median(latencies):.1f} ms per batch, '
+              f'max {max(latencies):.1f} ms')
@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Measures lookup cost and dedup rate of the process_post near duplicate index on the data-streammer corpus"""
+
+import argparse
+import csv
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas', 'process_post'))
+
+from near_duplicates import NearDuplicateIndex  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data-streammer',
+                      'new_years_resolutions_tweets.csv')
+
+parser = argparse.ArgumentParser(description='Benchmark the near duplicate index of process_post')
+parser.add_argument('--corpus', type=str, default=CORPUS, help='CSV file with a text column')
+parser.add_argument('--variant_ratio', type=float, default=0.3,
+                    help='Ratio of posts replayed as retweets or with other links, mentions and emojis')
+parser.add_argument('--max_distance', type=int, nargs='+', default=[0, 3, 6], help='Hamming distances to compare')
+parser.add_argument('--seed', type=int, default=7)
+
+
+def make_variant(text, rng):
+    variant = rng.choice([
+        lambda t: f'RT @user{rng.randint(1, 999)}: {t}',
+        lambda t: f'{t} https://t.co/{rng.randint(10000, 99999)}',
+        lambda t: f'{t} \U0001F389',
+        lambda t: f'@friend{rng.randint(1, 999)} {t}',
+    ])
+    return variant(text)
+
+
+def build_stream(texts, variant_ratio, rng):
+    stream = []
+    for text in texts:
+        stream.append(text)
+        if rng.random() < variant_ratio:
+            stream.append(make_variant(rng.choice(stream), rng))
+    return stream
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with open(args.corpus, encoding='utf-8', errors='replace') as corpus_file:
+        texts = [row['text'] for row in csv.DictReader(corpus_file)]
+
+    stream = build_stream(texts, args.variant_ratio, rng)
+    print(f'{len(texts)} corpus posts, {len(stream) - len(texts)} synthetic variants, {len(stream)} posts in total')
+
+    for max_distance in args.max_distance:
+
+        index = NearDuplicateIndex(max_distance=max_distance, window_seconds=3600, max_entries=len(stream))
+        timings = []
+
+        for text in stream:
+            start = time.perf_counter()
+            if index.get('topic_match', text) is None:
+                index.put('topic_match', text, {'is_match': True})
+            timings.append((time.perf_counter() - start) * 1e6)
+
+        stats = index.stats()
+        print(f'max distance {max_distance}: dedup rate {stats["hits"] / len(stream):.1%}, '
+              f'lookup+insert p50 {statistics.median(timings):.0f} us, '
+              f'p99 {statistics.quantiles(timings, n=100)[98]:.0f} us, entries {stats["entries"]}')
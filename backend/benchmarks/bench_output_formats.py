@@ -0,0 +1,107 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Compares scan size and parse time of the JSON lines and Parquet layouts of save_post on generated topics data"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas', 'save_post'))
+
+from output_formats import TIMESTAMP_FORMAT, JsonLinesFormat, ParquetFormat  # noqa: E402
+
+TOPICS = ['health and fitness', 'humor', 'personal growth', 'philanthropy', 'recreation and leisure', 'career',
+          'finance', 'education and training', 'time management']
+SENTIMENTS = ['positive', 'negative', 'neutral']
+WORDS = 'this year i will finally run a marathon read more books save money learn to cook and call my family'.split()
+
+# Columns read by the Lookout for Metrics dataset and by a count of topics by sentiment
+QUERY_COLUMNS = ['topic', 'sentiment', 'count']
+
+parser = argparse.ArgumentParser(description='Scan size and parse time of the JSON lines and Parquet layouts')
+parser.add_argument('--records', type=int, default=100000, help='Records of the topics table in one object')
+parser.add_argument('--compression', type=str, default='snappy')
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--seed', type=int, default=7)
+
+
+def make_topics(count, rng):
+    start = datetime.datetime(2024, 1, 1)
+    records = []
+    for _ in range(count):
+        created_at = start + datetime.timedelta(seconds=rng.randrange(86400))
+        record = {'created_at': created_at.strftime(TIMESTAMP_FORMAT), 'timestamp': created_at.strftime(TIMESTAMP_FORMAT),
+                  'text_clean': ' '.join(rng.choices(WORDS, k=rng.randint(8, 40))), 'user': f'user{rng.randrange(5000)}',
+                  'platform': 'twitter', 'topic': rng.choice(TOPICS), 'sentiment': rng.choice(SENTIMENTS), 'count': 1}
+        if rng.random() < 0.5:
+            record.update({'location': 'Madrid', 'longitude': -3.70379, 'latitude': 40.416775})
+        records.append(record)
+    return records
+
+
+def count_json(body):
+    counts = Counter()
+    for line in body.decode('utf-8').splitlines():
+        record = json.loads(line)
+        counts[(record['topic'], record['sentiment'])] += record['count']
+    return counts
+
+
+def count_parquet(body, parquet):
+    table = parquet.read_table(io.BytesIO(body), columns=QUERY_COLUMNS)
+    counts = Counter()
+    for topic, sentiment, count in zip(*(table.column(name).to_pylist() for name in QUERY_COLUMNS)):
+        counts[(topic, sentiment)] += count
+    return counts
+
+
+def parquet_scanned_bytes(body, parquet):
+    """Compressed size of the column chunks a columnar engine reads for the query, plus the footer"""
+    metadata = parquet.ParquetFile(io.BytesIO(body)).metadata
+    scanned = metadata.serialized_size
+    for row_group in range(metadata.num_row_groups):
+        for column in range(metadata.num_columns):
+            chunk = metadata.row_group(row_group).column(column)
+            if chunk.path_in_schema in QUERY_COLUMNS:
+                scanned += chunk.total_compressed_size
+    return scanned
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, statistics.median(durations)
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    records = make_topics(args.records, random.Random(args.seed))
+
+    json_format, parquet_format = JsonLinesFormat(), ParquetFormat(args.compression)
+
+    json_body, json_encode_seconds = timed(lambda: json_format.encode('topics', records), args.repeat)
+    parquet_body, parquet_encode_seconds = timed(lambda: parquet_format.encode('topics', records), args.repeat)
+
+    json_counts, json_seconds = timed(lambda: count_json(json_body), args.repeat)
+    parquet_counts, parquet_seconds = timed(lambda: count_parquet(parquet_body, parquet_format.parquet), args.repeat)
+
+    assert json_counts == parquet_counts, 'Both layouts must give the same counts'
+
+    print(f'{args.records} topic records, query reads {", ".join(QUERY_COLUMNS)}')
+    print(f'json:    object {len(json_body) / 1024:.0f} KiB, scanned {len(json_body) / 1024:.0f} KiB, '
+          f'encode {json_encode_seconds * 1000:.0f} ms, parse and count {json_seconds * 1000:.0f} ms')
+    print(f'parquet: object {len(parquet_body) / 1024:.0f} KiB, '
+          f'scanned {parquet_scanned_bytes(parquet_body, parquet_format.parquet) / 1024:.0f} KiB, '
+          f'encode {parquet_encode_seconds * 1000:.0f} ms, parse and count {parquet_seconds * 1000:.0f} ms')
@@ -0,0 +1,194 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Runs posts through process_post, locate_post and save_post as the process_post state machine does, with local
+stand-ins for Bedrock, the place index and S3, and reports the latency of every stage
+
+With --cassette the model calls are recorded to a cassette, from Bedrock with --live_model, and replayed from it in
+later runs, to compare the throughput and token usage of prompt variants without network access."""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from stubs import CANNED_OUTPUTS, FakeBedrockRuntime, FakeLocationService, LambdaContextStub, load_lambda
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data-streammer',
+                      'new_years_resolutions_tweets.csv')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# The cities data-streammer appends to the posts
+SAMPLE_CITIES = ['New York', 'Chicago', 'Kentucky', 'Arkansas', 'Miami', 'Los Angeles', 'San Francisco', 'New Jersey',
+                 'San Diego', 'Orlando', 'Arlington', 'Washington DC', 'Las Vegas', 'Portland', 'Seattle', 'Austin',
+                 'Phoenix']
+CITY = re.compile(r'From (' + '|'.join(SAMPLE_CITIES) + ')')
+
+STAGES = ['process_post', 'locate_post', 'save_post']
+
+parser = argparse.ArgumentParser(description='Benchmark the process_post state machine end to end on local stand-ins')
+parser.add_argument('--posts', type=int, default=500)
+parser.add_argument('--model_latency_ms', type=float, default=0, help='Simulated latency of every model call')
+parser.add_argument('--location_latency_ms', type=float, default=0, help='Simulated latency of every place search')
+parser.add_argument('--location_ratio', type=float, default=0.1, help='Share of posts that mention a city')
+parser.add_argument('--process_mode', type=str, default='two_calls', choices=['two_calls', 'fused'])
+parser.add_argument('--model_client', type=str, default='langchain', choices=['langchain', 'converse'])
+parser.add_argument('--output_format', type=str, default='json', choices=['json', 'parquet'])
+parser.add_argument('--output', type=str, help='Results file, results/pipeline-<commit>.json by default')
+parser.add_argument('--compare', type=str, help='Results file of a previous run to compare with')
+parser.add_argument('--seed', type=int, default=7)
+parser.add_argument('--cassette', type=str, help='Records the model calls to, or replays them from, this cassette')
+parser.add_argument('--cassette_mode', type=str, default='replay', choices=['record', 'replay', 'auto'])
+parser.add_argument('--latency_scale', type=float, default=1.0, help='Multiplier of the latency of replayed calls')
+parser.add_argument('--live_model', action='store_true', help='Calls Bedrock instead of the canned outputs')
+
+
+def extracted_information(request):
+    """Canned insights, with the city the post mentions as its location"""
+    match = CITY.search(json.dumps(request['messages'], ensure_ascii=False))
+    return {**CANNED_OUTPUTS['ExtractedInformation'], 'location': match.group(1) if match else '<UNKNOWN>'}
+
+
+def summarize(latencies):
+    if not latencies:
+        return {'count': 0}
+    ordered = sorted(latencies)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.mean(ordered), 3),
+        **{f'p{ratio}_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * ratio / 100))], 3)
+           for ratio in (50, 95, 99)},
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+
+def run_post(functions, post, latencies, cpu_times):
+    """One execution: Extract Insights, ProcessPost?, LocatePost?, Locate Post and Save Post"""
+
+    item = post
+    for stage in STAGES:
+        if stage == 'locate_post' and not item.get('process_location'):
+            continue
+        start, cpu_start = time.perf_counter(), time.process_time()
+        item = functions[stage].handler(item, LambdaContextStub())
+        latencies[stage].append((time.perf_counter() - start) * 1000)
+        cpu_times[stage] += time.process_time() - cpu_start
+        if stage == 'process_post' and not item['process_post']:
+            break
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    root = tempfile.mkdtemp()
+
+    environment = {'PROCESS_MODE': args.process_mode, 'MODEL_CLIENT': args.model_client,
+                   'POWERTOOLS_LOG_LEVEL': 'ERROR', 'LOG_LEVEL': 'ERROR', 'POSTS_BUCKET': 'posts', 'LOCAL_S3_ROOT': root,
+                   'OUTPUT_FORMAT': args.output_format}
+    functions = {stage: load_lambda(stage, environment) for stage in STAGES}
+    # Importable once process_post is loaded, as its directory is then on the path
+    from cassette import CassetteMissError
+
+    process_post = functions['process_post']
+    fake_bedrock = FakeBedrockRuntime({**CANNED_OUTPUTS, 'ExtractedInformation': extracted_information},
+                                      args.model_latency_ms / 1000)
+    model_client = process_post.bedrock_client if args.live_model else fake_bedrock
+    if args.cassette:
+        model_client = process_post.CassetteClient(model_client, args.cassette, mode=args.cassette_mode,
+                                                   latency_scale=args.latency_scale)
+    process_post.bedrock_runtime = process_post.PromptCachingClient(
+        model_client, mark_cacheable=process_post.bedrock_runtime.mark_cacheable,
+        cache_messages=process_post.bedrock_runtime.cache_messages)
+
+    places = {city: (-100.0 + index, 40.0) for index, city in enumerate(SAMPLE_CITIES)}
+    functions['locate_post'].location_service = FakeLocationService(places, args.location_latency_ms / 1000)
+
+    with open(CORPUS, encoding='utf-8', errors='replace') as corpus_file:
+        texts = [row['text'] for row in csv.DictReader(corpus_file)][:args.posts]
+
+    posts = []
+    for index, text in enumerate(texts):
+        if rng.random() < args.location_ratio:
+            text = text + '. From ' + rng.choice(SAMPLE_CITIES)
+        created_at = datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=index * 60)
+        posts.append({'text': text, 'user': 'benchmark', 'source': 'benchmark', 'platform': 'benchmark',
+                      'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'z'})
+
+    latencies = {stage: [] for stage in STAGES + ['end_to_end']}
+    cpu_times = {stage: 0.0 for stage in STAGES}
+    failures = 0
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for post in posts:
+        post_start = time.perf_counter()
+        try:
+            run_post(functions, post, latencies, cpu_times)
+        except CassetteMissError:
+            # Results of a replay with calls missing from the cassette are not comparable
+            raise
+        except Exception as exception:
+            failures += 1
+            print(f'Execution failed: {exception}', file=sys.stderr)
+        latencies['end_to_end'].append((time.perf_counter() - post_start) * 1000)
+    wall_seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - cpu_start
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': sys.version.split()[0],
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'posts': len(posts),
+        'failures': failures,
+        'posts_per_second': round(len(posts) / wall_seconds, 2),
+        'wall_seconds': round(wall_seconds, 3),
+        'cpu_seconds': round(cpu_seconds, 3),
+        'cpu_ms_per_post': {stage: round(cpu_times[stage] * 1000 / len(posts), 3) for stage in STAGES},
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'latency': {stage: summarize(values) for stage, values in latencies.items()},
+        'model_requests': len(fake_bedrock.requests),
+        'model_usage': process_post.bedrock_runtime.usage.stats(),
+        'cassette': model_client.stats() if args.cassette else None,
+        'location_requests': len(functions['locate_post'].location_service.requests),
+        'objects_written': sum(len(files) for _, _, files in os.walk(root)),
+    }
+
+    print(json.dumps(results, indent=2))
+
+    output = args.output or os.path.join(RESULTS_DIR, f'pipeline-{results["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f'Compared with {baseline["commit"]}:')
+        for stage in STAGES + ['end_to_end']:
+            for key in ('p50_ms', 'p99_ms'):
+                before, after = baseline['latency'][stage].get(key), results['latency'][stage].get(key)
+                if before:
+                    print(f'  {stage} {key}: {before} -> {after} ({(after - before) / before:+.1%})')
+        print(f'  posts_per_second: {baseline["posts_per_second"]} -> {results["posts_per_second"]}')
+        print(f'  peak_rss_mb: {baseline["peak_rss_mb"]} -> {results["peak_rss_mb"]}')
+        for key in ('input_tokens', 'cache_read_input_tokens', 'output_tokens'):
+            if 'model_usage' in baseline:
+                print(f'  {key}: {baseline["model_usage"][key]} -> {results["model_usage"][key]}')
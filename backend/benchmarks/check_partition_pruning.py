@@ -0,0 +1,104 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Checks on a local stand-in that a time range query only needs the partition prefixes the projection prunes to
+
+The check fails unless the prefixes read are exactly the partitions save_post assigns to the minutes of the range,
+every matching record is in them and no record outside the time span of those partitions is read.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+
+from stubs import LambdaContextStub, load_lambda
+
+parser = argparse.ArgumentParser(description='Check partition pruning of save_post for a created_at range query')
+parser.add_argument('--interval_minutes', type=int, default=60)
+parser.add_argument('--posts', type=int, default=2000)
+parser.add_argument('--days', type=int, default=3)
+parser.add_argument('--start', type=str, default='2024-01-02 09:30:00', help='Start of the created_at range')
+parser.add_argument('--end', type=str, default='2024-01-02 11:10:00', help='End of the created_at range')
+parser.add_argument('--seed', type=int, default=7)
+
+
+def make_post(created_at):
+    return {'text': 'new year, new me', 'user': 'benchmark', 'source': 'benchmark', 'platform': 'benchmark',
+            'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'z', 'text_clean': 'new year, new me',
+            'topic': 'new years resolution', 'model_id': 'benchmark', 'sentiment': 'Positive', 'keyphrases': [],
+            'meta_topics': ['Personal growth'], 'links': [], 'process_post': True, 'process_location': False}
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    root = tempfile.mkdtemp()
+
+    save_post = load_lambda('save_post', {'POSTS_BUCKET': 'posts', 'LOCAL_S3_ROOT': root,
+                                          'PARTITION_INTERVAL_MINUTES': str(args.interval_minutes)})
+
+    from partitions import partition_name, partition_prefixes, partition_timestamp  # noqa: E402
+    from output_formats import TIMESTAMP_FORMAT  # noqa: E402
+
+    first_day = datetime.datetime(2024, 1, 1)
+    posts = [make_post(first_day + datetime.timedelta(seconds=rng.randrange(args.days * 86400)))
+             for _ in range(args.posts)]
+    save_post.handler({'posts': posts}, LambdaContextStub())
+
+    start = datetime.datetime.strptime(args.start, '%Y-%m-%d %H:%M:%S')
+    end = datetime.datetime.strptime(args.end, '%Y-%m-%d %H:%M:%S')
+    prefixes = partition_prefixes('topics', start, end, args.interval_minutes)
+
+    # Partitions of every minute of the range as save_post names them, independently of the projection
+    expected, minute = set(), start
+    while minute <= end:
+        expected.add(f'topics/{partition_name(minute, args.interval_minutes)}/')
+        minute += datetime.timedelta(minutes=1)
+    expected.add(f'topics/{partition_name(end, args.interval_minutes)}/')
+    span_start = partition_timestamp(start, args.interval_minutes)
+    span_end = partition_timestamp(end, args.interval_minutes) + datetime.timedelta(minutes=args.interval_minutes)
+
+    table_root = os.path.join(root, 'posts', 'topics')
+    in_range, found, scanned_records, total_records, scanned_bytes, total_bytes = 0, 0, 0, 0, 0, 0
+    scanned_prefixes, outside_span = set(), 0
+
+    for partition in sorted(os.listdir(table_root)):
+        pruned_in = f'topics/{partition}/' in prefixes
+        for name in os.listdir(os.path.join(table_root, partition)):
+            path = os.path.join(table_root, partition, name)
+            with open(path, encoding='utf-8') as object_file:
+                records = [json.loads(line) for line in object_file]
+            matches = sum(1 for record in records
+                          if start <= datetime.datetime.strptime(record['created_at'], TIMESTAMP_FORMAT) <= end)
+
+            in_range += matches
+            total_records += len(records)
+            total_bytes += os.path.getsize(path)
+            if pruned_in:
+                scanned_prefixes.add(f'topics/{partition}/')
+                outside_span += sum(1 for record in records if not span_start <= datetime.datetime.strptime(
+                    record['created_at'], TIMESTAMP_FORMAT) < span_end)
+                found += matches
+                scanned_records += len(records)
+                scanned_bytes += os.path.getsize(path)
+
+    print(f'{args.interval_minutes} minute partitions, {len(prefixes)} prefixes read: {prefixes[0]} .. {prefixes[-1]}')
+    print(f'{found}/{in_range} matching records found, {scanned_records}/{total_records} records and '
+          f'{scanned_bytes}/{total_bytes} bytes scanned')
+
+    present = {f'topics/{partition}/' for partition in os.listdir(table_root)}
+    checks = {
+        'all matching records found': found == in_range,
+        'projected prefixes are the partitions of the range': set(prefixes) == expected,
+        'scanned prefixes are the projected ones that exist': scanned_prefixes == expected & present,
+        'no record read outside the span of the projected partitions': outside_span == 0,
+    }
+    for check, passed in checks.items():
+        print(f'{"ok" if passed else "FAILED"}: {check}')
+
+    sys.exit(0 if all(checks.values()) else 1)
@@ -0,0 +1,58 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Verifies against a local Bedrock stand-in that the cacheable prompt prefix is byte for byte stable across posts"""
+
+import argparse
+import csv
+import os
+import sys
+from collections import defaultdict
+
+from stubs import CANNED_OUTPUTS, FakeBedrockRuntime, LambdaContextStub, load_lambda
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data-streammer',
+                      'new_years_resolutions_tweets.csv')
+
+parser = argparse.ArgumentParser(description='Check that the cacheable prompt prefix of process_post is stable')
+parser.add_argument('--posts', type=int, default=50)
+parser.add_argument('--model_id', type=str, default='anthropic.claude-3-5-haiku-20241022-v1:0',
+                    help='A model id that supports prompt caching')
+parser.add_argument('--process_mode', type=str, default='two_calls', choices=['two_calls', 'fused'])
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    process_post = load_lambda('process_post', {'MODEL_ID': args.model_id, 'PROCESS_MODE': args.process_mode,
+                                                'POWERTOOLS_LOG_LEVEL': 'ERROR'})
+
+    from prompt_cache import prefix_fingerprint  # noqa: E402
+
+    fake_bedrock = FakeBedrockRuntime(CANNED_OUTPUTS)
+    cache_messages = process_post.bedrock_runtime.cache_messages
+    process_post.bedrock_runtime = process_post.PromptCachingClient(fake_bedrock, mark_cacheable=True,
+                                                                    cache_messages=cache_messages)
+
+    with open(CORPUS, encoding='utf-8', errors='replace') as corpus_file:
+        texts = [row['text'] for row in csv.DictReader(corpus_file)][:args.posts]
+
+    for text in texts:
+        process_post.handler({'text': text, 'user': 'benchmark', 'created_at': '2024-01-01T00:00:00.000z',
+                              'source': 'benchmark', 'platform': 'benchmark'}, LambdaContextStub())
+
+    # Group the requests actually sent by output schema, every group must share a single prefix
+    prefixes = defaultdict(set)
+    checkpoints = {}
+    for request in fake_bedrock.requests:
+        schema = request['tools'][0]['name']
+        prefixes[schema].add(prefix_fingerprint(request, cache_messages))
+        checkpoints[schema] = str(request).count('cache_control')
+
+    stable = True
+    for schema, fingerprints in prefixes.items():
+        print(f'{schema}: {len(fingerprints)} distinct prefix(es), {checkpoints[schema]} cache checkpoint(s)')
+        stable = stable and len(fingerprints) == 1
+
+    print(f'{len(fake_bedrock.requests)} requests, usage {process_post.bedrock_runtime.usage.stats()}')
+    sys.exit(0 if stable else 1)
@@ -0,0 +1,86 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Runs save_post over batches of posts against a local directory and checks that every record is written once"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+
+from stubs import LambdaContextStub, load_lambda
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data-streammer',
+                      'new_years_resolutions_tweets.csv')
+
+parser = argparse.ArgumentParser(description='Check the buffered S3 writer of save_post on a local stand-in')
+parser.add_argument('--posts', type=int, default=500)
+parser.add_argument('--batch_size', type=int, default=50)
+parser.add_argument('--days', type=int, default=3, help='Number of daily partitions the posts are spread over')
+parser.add_argument('--max_records', type=int, default=5000)
+parser.add_argument('--output_format', type=str, default='json', choices=['json', 'parquet'])
+parser.add_argument('--seed', type=int, default=7)
+
+
+def count_records(path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetFile(path).metadata.num_rows
+    with open(path, encoding='utf-8') as object_file:
+        return sum(1 for line in object_file if json.loads(line))
+
+
+def make_post(text, rng, days):
+    created_at = datetime.datetime(2024, 1, 1) + datetime.timedelta(days=rng.randrange(days),
+                                                                     seconds=rng.randrange(86400))
+    process_location = rng.random() < 0.5
+    post = {'text': text, 'user': 'benchmark', 'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'z',
+            'source': 'benchmark', 'platform': 'benchmark', 'text_clean': text, 'topic': 'New years resolution',
+            'model_id': 'benchmark', 'sentiment': 'Positive', 'keyphrases': ['new year', 'resolution'],
+            'meta_topics': ['Personal growth'], 'links': [], 'process_post': True,
+            'process_location': process_location}
+    if process_location:
+        post.update({'location': 'Madrid', 'longitude': -3.7, 'latitude': 40.4})
+    return post
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    root = tempfile.mkdtemp()
+
+    save_post = load_lambda('save_post', {'POSTS_BUCKET': 'posts', 'LOCAL_S3_ROOT': root,
+                                          'WRITER_MAX_RECORDS': str(args.max_records),
+                                          'OUTPUT_FORMAT': args.output_format})
+
+    with open(CORPUS, encoding='utf-8', errors='replace') as corpus_file:
+        texts = [row['text'] for row in csv.DictReader(corpus_file)][:args.posts]
+
+    posts = [make_post(text, rng, args.days) for text in texts]
+    expected = Counter()
+    for post in posts:
+        expected.update({'posts': 1, 'phrases': len(post['keyphrases']), 'topics': len(post['meta_topics']),
+                         'links': len(post['links'])})
+
+    for start in range(0, len(posts), args.batch_size):
+        save_post.handler({'posts': posts[start:start + args.batch_size]}, LambdaContextStub())
+
+    written, objects = Counter(), Counter()
+    for directory, _, files in os.walk(os.path.join(root, 'posts')):
+        for name in files:
+            table = os.path.relpath(directory, os.path.join(root, 'posts')).split(os.sep)[0]
+            written[table] += count_records(os.path.join(directory, name))
+            objects[table] += 1
+
+    unbatched_puts = sum(1 for post in posts for key in ('keyphrases', 'meta_topics', 'links') if post[key]) + len(posts)
+    print(f'{len(posts)} posts, {sum(objects.values())} objects written, {unbatched_puts} without batching')
+    for table in expected:
+        print(f'{table}: {written[table]}/{expected[table]} records in {objects[table]} objects')
+
+    sys.exit(0 if written == +expected else 1)
@@ -0,0 +1,49 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Reports the estimated input tokens of every section of the process_post prompts over a sample of posts"""
+
+import argparse
+import csv
+import os
+import statistics
+import sys
+
+from stubs import DEFAULT_ENVIRONMENT, LAMBDAS_DIR
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data-streammer',
+                      'new_years_resolutions_tweets.csv')
+
+parser = argparse.ArgumentParser(description='Token accounting per prompt section of process_post')
+parser.add_argument('--few_shot_k', type=int, default=0, help='Examples selected per post, 0 for all of them')
+parser.add_argument('--few_shot_token_budget', type=int, default=0, help='Token budget of the few-shot block')
+parser.add_argument('--language', type=str, default='en')
+parser.add_argument('--posts', type=int, default=200, help='Number of posts of the corpus to format')
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    # The few-shot configuration is read when prompt_selector is imported
+    os.environ['FEW_SHOT_K'] = str(args.few_shot_k)
+    os.environ['FEW_SHOT_TOKEN_BUDGET'] = str(args.few_shot_token_budget)
+    sys.path.insert(0, os.path.join(LAMBDAS_DIR, 'process_post'))
+
+    import prompt_selector  # noqa: E402
+    from token_accounting import prompt_token_report  # noqa: E402
+
+    with open(CORPUS, encoding='utf-8', errors='replace') as corpus_file:
+        texts = [row['text'] for row in csv.DictReader(corpus_file)][:args.posts]
+
+    for name in ('information_extraction', 'topic_match', 'fused'):
+
+        prompt = prompt_selector.get_chat_prompt(name, args.language, DEFAULT_ENVIRONMENT['MODEL_ID'])
+        reports = [prompt_token_report(prompt, {
+            'text': text,
+            'meta_topics': DEFAULT_ENVIRONMENT['LABELS'],
+            'sentiments': DEFAULT_ENVIRONMENT['SENTIMENT_LABELS'],
+        }) for text in texts]
+
+        sections = ', '.join(f'{section} {statistics.mean(report[section] for report in reports):.1f}'
+                             for section in reports[0])
+        print(f'{name}: {sections}')
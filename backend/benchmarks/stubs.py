@@ -0,0 +1,158 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+
+LAMBDAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas')
+
+# Modules of the layers the functions import, found in /opt/python in Lambda
+LAYER_DIRS = [os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'layers', 'cache'))]
+
+DEFAULT_ENVIRONMENT = {
+    'MODEL_ID': 'anthropic.claude-3-haiku-20240307-v1:0',
+    'AWS_REGION': 'us-east-1',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'LANGUAGE_CODE': 'en',
+    'LABELS': 'Health and fitness, Humor, Personal growth, Philanthropy, Recreation and leisure, Family, friends, and, '
+              'relationships, Career, Finance, Education and training, Time management',
+    'SENTIMENT_LABELS': 'Positive, Negative, Neutral',
+    'POWERTOOLS_LOG_LEVEL': 'WARNING',
+    'GEO_REGION': 'USA',
+    'LANGUAGE': 'en',
+    'PLACE_INDEX_NAME': 'benchmark',
+}
+
+
+def load_lambda(name, environment=None):
+    """Imports backend/lambdas/<name>/lambda.py as a module the same way the Lambda runtime does"""
+
+    for key, value in {**DEFAULT_ENVIRONMENT, **(environment or {})}.items():
+        os.environ.setdefault(key, value)
+
+    function_dir = os.path.abspath(os.path.join(LAMBDAS_DIR, name))
+    for directory in LAYER_DIRS + [function_dir]:
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+
+    spec = importlib.util.spec_from_file_location(f'{name}_lambda', os.path.join(function_dir, 'lambda.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+class LambdaContextStub:
+    function_name = 'benchmark'
+    memory_limit_in_mb = 1024
+    invoked_function_arn = 'arn:aws:lambda:us-east-1:000000000000:function:benchmark'
+    aws_request_id = 'benchmark'
+
+
+class FakeBedrockRuntime:
+    """Answers InvokeModel and Converse tool calls with canned structured outputs keyed by output schema name"""
+
+    def __init__(self, outputs, latency_seconds=0.0):
+        self.outputs = outputs
+        self.latency_seconds = latency_seconds
+        self.requests = []
+
+    def invoke_model(self, **kwargs):
+
+        request = json.loads(kwargs['body'])
+        self.requests.append(request)
+
+        tool_name = request['tools'][0]['name']
+        tool_input = self.outputs[tool_name]
+        tool_input = tool_input(request) if callable(tool_input) else tool_input
+
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        body = {
+            'content': [{'type': 'tool_use', 'id': 'toolu_benchmark', 'name': tool_name, 'input': tool_input}],
+            'stop_reason': 'tool_use',
+            'usage': {'input_tokens': len(kwargs['body']) // 4, 'output_tokens': len(json.dumps(tool_input)) // 4},
+        }
+
+        return {
+            'body': io.BytesIO(json.dumps(body).encode('utf-8')),
+            'ResponseMetadata': {'HTTPHeaders': {
+                'x-amzn-bedrock-input-token-count': str(body['usage']['input_tokens']),
+                'x-amzn-bedrock-output-token-count': str(body['usage']['output_tokens']),
+            }},
+        }
+
+
+    def converse(self, **kwargs):
+
+        self.requests.append(kwargs)
+
+        tool_name = kwargs['toolConfig']['tools'][0]['toolSpec']['name']
+        tool_input = self.outputs[tool_name]
+        tool_input = tool_input(kwargs) if callable(tool_input) else tool_input
+
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        input_tokens, output_tokens = len(json.dumps(kwargs)) // 4, len(json.dumps(tool_input)) // 4
+
+        return {
+            'output': {'message': {'role': 'assistant', 'content': [
+                {'toolUse': {'toolUseId': 'tooluse_benchmark', 'name': tool_name, 'input': tool_input}}
+            ]}},
+            'stopReason': 'tool_use',
+            'usage': {'inputTokens': input_tokens, 'outputTokens': output_tokens,
+                      'totalTokens': input_tokens + output_tokens},
+            'metrics': {'latencyMs': int(self.latency_seconds * 1000)},
+        }
+
+
+class FakeLocationService:
+    """Answers SearchPlaceIndexForText from a table of known places after a simulated round trip"""
+
+    def __init__(self, places, latency_seconds=0.0, failures=()):
+        self.places = {name.lower(): point for name, point in places.items()}
+        self.latency_seconds = latency_seconds
+        # Place names whose search raises, as a throttled or failed request would
+        self.failures = {name.lower() for name in failures}
+        self.requests = []
+
+    def search_place_index_for_text(self, **kwargs):
+
+        self.requests.append(kwargs)
+
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        if kwargs['Text'].lower().strip() in self.failures:
+            raise Exception(f"ThrottlingException: Rate exceeded for {kwargs['Text']}")
+
+        point = self.places.get(kwargs['Text'].lower().strip())
+        results = [{'Place': {'Label': kwargs['Text'], 'Geometry': {'Point': list(point)}}, 'Relevance': 1.0}] \
+            if point else []
+
+        return {'Summary': {'Text': kwargs['Text'], 'MaxResults': kwargs.get('MaxResults', 1)}, 'Results': results}
+
+
+CANNED_OUTPUTS = {
+    'TopicMatch': {
+        'understanding': 'The text talks about a new years resolution',
+        'related_topics': ['Personal growth'],
+        'is_match': True
+    },
+    'ExtractedInformation': {
+        'topic': 'new years resolution',
+        'location': '<UNKNOWN>',
+        'entities': [],
+        'keyphrases': ['new years resolution'],
+        'sentiment': 'Positive',
+        'links': []
+    },
+}
+
+CANNED_OUTPUTS['TopicMatchWithInformation'] = {**CANNED_OUTPUTS['TopicMatch'], **CANNED_OUTPUTS['ExtractedInformation']}
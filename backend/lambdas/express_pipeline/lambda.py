@@ -0,0 +1,132 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import sys
+
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType
+from aws_lambda_powertools.utilities.batch.exceptions import BatchProcessingError
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
+
+logging.getLogger().setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+
+LAMBDAS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_function(name):
+    """Imports lambdas/<name>/lambda.py with its own directory on the path, as the Lambda runtime does"""
+
+    function_dir = os.path.join(LAMBDAS_DIR, name)
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+
+    spec = importlib.util.spec_from_file_location(f'{name}_lambda', os.path.join(function_dir, 'lambda.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+# The three functions of the state machine run in process, the helper modules of each must have distinct names
+process_post = load_function('process_post')
+locate_post = load_function('locate_post')
+save_post = load_function('save_post')
+
+processor = BatchProcessor(event_type=EventType.SQS)
+
+
+def record_handler(record: SQSRecord, insights=None, saved=None):
+    """Same choices as the state machine: ProcessPost? then Save Post, the batch has already been located
+
+    Message ids of the buffered posts are added to saved, they are only written when the buffers are flushed.
+    """
+
+    item = insights.get(record.message_id)
+
+    # Empty messages are acknowledged without any processing
+    if item is None:
+        return {'success': True}
+
+    # The post is retried by SQS if its body, its insights or its location could not be read or extracted
+    if 'error' in item:
+        raise Exception(item['error'])
+
+    if not item['process_post']:
+        return {'success': True}
+
+    failed_writes = save_post.writer.failed_writes
+    try:
+        save_post.save_item(item)
+    except Exception:
+        # A failed write also dropped the buffered posts of other records, any other error only fails this post
+        if save_post.writer.failed_writes != failed_writes:
+            saved['write_failed'] = True
+        raise
+
+    saved['message_ids'].append(record.message_id)
+
+    return {'success': True}
+
+
+def write_failures(response, saved):
+    """Reports every buffered post as failed when a write failed, SQS retries them and nothing else of the batch"""
+
+    failed = {failure['itemIdentifier'] for failure in response['batchItemFailures']}
+    response['batchItemFailures'].extend({'itemIdentifier': message_id} for message_id in saved['message_ids']
+                                         if message_id not in failed)
+    return response
+
+
+def handler(event, context):
+
+    insights, posts = {}, []
+
+    # Empty messages are acknowledged, invalid ones fail on their own and the rest of the batch is processed
+    for record in [SQSRecord(record) for record in event['Records']]:
+        if record.body:
+            try:
+                posts.append((record, json.loads(record.body, strict=False)))
+            except ValueError as exception:
+                insights[record.message_id] = {'error': f'Invalid message body: {exception}'}
+
+    if posts:
+        # Insights of the whole batch are extracted concurrently before the per record steps
+        results = asyncio.run(process_post.ahandle_batch([post for _, post in posts]))['posts']
+
+        # Locations of the batch are searched together, each distinct place once
+        results = locate_post.handle_batch(results)['posts']
+        insights.update({record.message_id: result for (record, _), result in zip(posts, results)})
+
+    saved = {'message_ids': [], 'write_failed': False}
+
+    try:
+        with processor(records=event['Records'], handler=lambda record: record_handler(record, insights, saved)):
+            processor.process()
+    except BatchProcessingError:
+        # Every post failed and SQS retries the whole batch, none is left buffered for the next invocation
+        save_post.writer.discard()
+        raise
+
+    response = processor.response()
+
+    # Saved posts are only acknowledged once written
+    if not saved['write_failed']:
+        try:
+            save_post.writer.flush()
+        except Exception as exception:
+            logging.error(f'Unable to write {len(saved["message_ids"])} posts: {exception}')
+            saved['write_failed'] = True
+
+    if saved['write_failed']:
+        # The buffers are left empty for the next invocation, the retried posts are written again
+        save_post.writer.discard()
+        response = write_failures(response, saved)
+
+    logging.info({'express_pipeline': {'posts': len(event['Records']), 'failures': len(response['batchItemFailures']),
+                                       'writer': save_post.writer.stats()}})
+
+    return response
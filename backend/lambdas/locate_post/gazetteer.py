@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import bisect
+import csv
+import os
+import re
+import unicodedata
+from array import array
+from typing import Optional, Tuple
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_place(text: str) -> str:
+    """Lower case ASCII words of the place name, so that 'São Paulo', 'sao paulo' and 'Sao Paulo.' are the same"""
+    ascii_text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(NON_ALPHANUMERIC.split(ascii_text.lower())).strip()
+
+
+class Gazetteer:
+    """Offline table of place names and their aliases to (longitude, latitude)
+
+    Names are kept in a sorted list searched with bisect and coordinates in two arrays of doubles, which takes a
+    fraction of the memory of a dictionary of tuples.
+    """
+
+    def __init__(self, rows, country: Optional[str] = None):
+
+        entries = {}
+        longitudes, latitudes = array('d'), array('d')
+
+        for row in rows:
+            if country and row['country'] != country:
+                continue
+            index = len(longitudes)
+            longitudes.append(float(row['longitude']))
+            latitudes.append(float(row['latitude']))
+            for name in [row['name'], *row['aliases'].split('|')]:
+                if normalize_place(name):
+                    entries.setdefault(normalize_place(name), index)
+
+        self.names = sorted(entries)
+        self.indexes = array('i', (entries[name] for name in self.names))
+        self.longitudes = longitudes
+        self.latitudes = latitudes
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH, country: Optional[str] = None) -> 'Gazetteer':
+        with open(path, encoding='utf-8') as gazetteer_file:
+            return cls(csv.DictReader(gazetteer_file), country)
+
+    def find(self, normalized_name: str) -> Optional[Tuple[float, float]]:
+        position = bisect.bisect_left(self.names, normalized_name)
+        if position == len(self.names) or self.names[position] != normalized_name:
+            return None
+        index = self.indexes[position]
+        return self.longitudes[index], self.latitudes[index]
+
+    def locate(self, text: str) -> Optional[Tuple[float, float]]:
+
+        point = self.find(normalize_place(text))
+
+        # 'Seattle, WA' or 'Austin, Texas' are found by the part before the comma
+        if point is None and ',' in text:
+            point = self.find(normalize_place(text.split(',')[0]))
+
+        return point
+
+    def __len__(self):
+        return len(self.names)
@@ -0,0 +1,108 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import logging
+from typing import Dict, Optional, Sequence
+
+from cache_backends import DynamoDBBackend, LRUCache, SQLiteBackend
+from gazetteer import normalize_place
+
+# Cached value of a place the service could not find
+NOT_FOUND = {'found': False}
+
+
+class GeocodeCache:
+    """Caches the coordinates of place names, and the names that were not found for a shorter time"""
+
+    def __init__(self, context: Sequence[str], memory: LRUCache, backend=None, ttl_seconds: float = 30 * 86400,
+                 negative_ttl_seconds: float = 86400):
+        self.context = list(context)
+        self.memory = memory
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.gazetteer_hits = 0
+        self.hits = 0
+        self.backend_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+
+    def key(self, location: str) -> str:
+        # The same name can be a different place in another region or index
+        return '|'.join(['geocode', normalize_place(location), *self.context])
+
+    def get(self, location: str) -> Optional[dict]:
+        """Cached value of the location, NOT_FOUND for a cached negative result or None if not cached"""
+
+        key = self.key(location)
+        value = self.memory.get(key)
+
+        if value is None and self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                self.backend_errors += 1
+                logging.warning(f'Unable to read from the geocode cache backend: {e}')
+
+            if value is not None:
+                self.backend_hits += 1
+                self.memory.put(key, value, self.ttl(value))
+
+        if value is None:
+            self.misses += 1
+        elif value == NOT_FOUND:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+
+        return value
+
+    def put(self, location: str, value: dict):
+
+        key = self.key(location)
+
+        self.memory.put(key, value, self.ttl(value))
+
+        if self.backend is not None:
+            try:
+                self.backend.put(key, value, self.ttl(value))
+            except Exception as e:
+                self.backend_errors += 1
+                logging.warning(f'Unable to write to the geocode cache backend: {e}')
+
+    def ttl(self, value: dict) -> float:
+        return self.negative_ttl_seconds if value == NOT_FOUND else self.ttl_seconds
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.gazetteer_hits + self.hits + self.negative_hits + self.misses
+        return {
+            'gazetteer_hits': self.gazetteer_hits,
+            'hits': self.hits,
+            'backend_hits': self.backend_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            'evictions': self.memory.evictions,
+            'backend_errors': self.backend_errors,
+            'entries': len(self.memory),
+        }
+
+
+def create_geocode_cache(
+        context: Sequence[str],
+        max_entries: int,
+        ttl_seconds: float,
+        negative_ttl_seconds: float,
+        table_name: Optional[str] = None,
+        sqlite_path: Optional[str] = None
+) -> GeocodeCache:
+
+    backend = None
+
+    if table_name:
+        backend = DynamoDBBackend(table_name)
+    elif sqlite_path:
+        backend = SQLiteBackend(sqlite_path, 'geocode_cache')
+
+    return GeocodeCache(context, LRUCache(max_entries), backend, ttl_seconds, negative_ttl_seconds)
@@ -4,27 +4,150 @@
 import boto3
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.config import Config
+
+from gazetteer import GAZETTEER_PATH, Gazetteer
+from geocode_cache import NOT_FOUND, create_geocode_cache
 
 logging.getLogger().setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
-location_service = boto3.client('location')
 
-def handler(event, context):
+# Maximum number of place names of a batch searched at the same time
+GEOCODE_MAX_CONCURRENCY = int(os.environ.get('GEOCODE_MAX_CONCURRENCY', '8'))
 
-    item = event
+location_service = boto3.client('location', config=Config(max_pool_connections=GEOCODE_MAX_CONCURRENCY))
+
+# Optional offline table of common places, checked before the cache and the service
+GAZETTEER = Gazetteer.load(os.environ.get('GAZETTEER_PATH', GAZETTEER_PATH), os.environ['GEO_REGION']) \
+    if os.environ.get('GAZETTEER_ENABLED', 'false').lower() == 'true' else None
+
+# The same few hundred place names repeat, results are cached with the settings of the search that produced them
+GEOCODE_CACHE = create_geocode_cache(
+    context=[os.environ['GEO_REGION'], os.environ['LANGUAGE'], os.environ['PLACE_INDEX_NAME']],
+    max_entries=int(os.environ.get('GEOCODE_CACHE_MAX_ENTRIES', '4096')),
+    ttl_seconds=float(os.environ.get('GEOCODE_CACHE_TTL_SECONDS', str(30 * 86400))),
+    negative_ttl_seconds=float(os.environ.get('GEOCODE_CACHE_NEGATIVE_TTL_SECONDS', '86400')),
+    table_name=os.environ.get('GEOCODE_CACHE_TABLE'),
+    sqlite_path=os.environ.get('GEOCODE_CACHE_SQLITE_PATH'),
+)
+
+
+def search_location(location):
 
-    logging.info('Item is located in ' + item['location'])
     res_locations = location_service.search_place_index_for_text(FilterCountries=[os.environ['GEO_REGION']],
                                                                  IndexName=os.environ['PLACE_INDEX_NAME'],
                                                                  Language=os.environ['LANGUAGE'],
                                                                  MaxResults=1,
-                                                                 Text=item['location']
+                                                                 Text=location
                                                                  )
     logging.info(res_locations)
 
     if len(res_locations['Results']) >= 1:
-        print(res_locations['Results'][0])
-        item['longitude'] = res_locations['Results'][0]['Place']['Geometry']['Point'][0]
-        item['latitude'] = res_locations['Results'][0]['Place']['Geometry']['Point'][1]
+        logging.info(res_locations['Results'][0])
+        point = res_locations['Results'][0]['Place']['Geometry']['Point']
+        return {'longitude': point[0], 'latitude': point[1]}
 
-    return item
+    return NOT_FOUND
+
+
+def lookup_location(location):
+    """Coordinates from the gazetteer or the cache, None if the service has to be searched"""
+
+    if GAZETTEER is not None:
+        point = GAZETTEER.locate(location)
+        if point is not None:
+            GEOCODE_CACHE.gazetteer_hits += 1
+            return {'longitude': point[0], 'latitude': point[1]}
+
+    return GEOCODE_CACHE.get(location)
+
+
+def geocode(location):
+
+    value = lookup_location(location)
+
+    if value is None:
+        value = search_location(location)
+        GEOCODE_CACHE.put(location, value)
+
+    return value
+
+
+def geocode_batch(locations):
+    """Geocodes a list of place names, searching every distinct normalized name once
+
+    Returns a value, or the exception raised while searching it, for every location in the order of the input.
+    """
+
+    keys = [GEOCODE_CACHE.key(location) for location in locations]
+
+    # The first spelling of every distinct name is the one searched
+    distinct = {}
+    for key, location in zip(keys, locations):
+        distinct.setdefault(key, location)
 
+    values = {key: lookup_location(location) for key, location in distinct.items()}
+    missing = [key for key, value in values.items() if value is None]
+
+    def search(key):
+        try:
+            return search_location(distinct[key])
+        except Exception as e:
+            logging.error(f'Unable to locate {distinct[key]}: {e}')
+            return e
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(GEOCODE_MAX_CONCURRENCY, len(missing))) as executor:
+            for key, value in zip(missing, executor.map(search, missing)):
+                values[key] = value
+                if not isinstance(value, Exception):
+                    GEOCODE_CACHE.put(distinct[key], value)
+
+    logging.info({'locations': len(locations), 'distinct': len(distinct), 'searched': len(missing)})
+
+    return [values[key] for key in keys]
+
+
+def handle_batch(items):
+
+    located = [item for item in items if item.get('process_location') and 'error' not in item]
+
+    # A post whose location could not be searched is marked as failed, the rest of the batch is located
+    for item, value in zip(located, geocode_batch([item['location'] for item in located])):
+        if isinstance(value, Exception):
+            item['error'] = f'Unable to locate the post: {value}'
+        elif value != NOT_FOUND:
+            item['longitude'] = value['longitude']
+            item['latitude'] = value['latitude']
+        else:
+            # Saved without coordinates, as a post without a location
+            item['process_location'] = False
+
+    logging.info(GEOCODE_CACHE.stats())
+
+    return {'posts': items}
+
+
+def handler(event, context):
+
+    # A list of posts is located together, each distinct place is searched once
+    if 'posts' in event:
+        return handle_batch(event['posts'])
+
+    item = event
+
+    logging.info('Item is located in ' + item['location'])
+
+    value = geocode(item['location'])
+
+    if value != NOT_FOUND:
+        item['longitude'] = value['longitude']
+        item['latitude'] = value['latitude']
+    else:
+        # Saved without coordinates, as a post without a location
+        item['process_location'] = False
+
+    logging.info(GEOCODE_CACHE.stats())
+
+    return item
@@ -0,0 +1,193 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+CASSETTE_MODES = ('record', 'replay', 'auto')
+
+# Response headers kept with every recorded call, LangChain reads the token counts from them
+RECORDED_HEADERS = (
+    'x-amzn-bedrock-input-token-count',
+    'x-amzn-bedrock-output-token-count',
+    'x-amzn-bedrock-invocation-latency',
+)
+
+
+class CassetteMissError(KeyError):
+    """Raised in replay mode for a request that was not recorded"""
+
+
+def raise_cassette_miss(exception: BaseException):
+    """Raises the CassetteMissError behind the exception, LangChain wraps the errors of the client in a ValueError
+
+    A request missing from the cassette is a broken replay, it must not be reported as a failed post.
+    """
+    while exception is not None:
+        if isinstance(exception, CassetteMissError):
+            raise exception
+        exception = exception.__cause__ or exception.__context__
+
+
+def request_key(operation: str, kwargs: Dict[str, Any]) -> str:
+    """Hash of the request with its JSON body in canonical form, so that key order and whitespace do not matter"""
+
+    request = {name: value for name, value in kwargs.items() if name not in ('body', 'accept', 'contentType')}
+    if 'body' in kwargs:
+        request['body'] = json.loads(kwargs['body'])
+    normalized = json.dumps([operation, request], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Recorded calls by request key, stored as gzip compressed JSON lines
+
+    Every recording is appended as a gzip member of its own, the file stays readable if the process is killed while
+    recording and cassettes can be concatenated.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as cassette_file:
+                for line in cassette_file:
+                    entry = json.loads(line)
+                    self.entries[entry['key']] = entry
+        except (EOFError, ValueError) as exception:
+            # Only the last recording of an interrupted run is lost
+            logger.warning(f'Cassette {self.path} is truncated after {len(self.entries)} calls: {exception}')
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def append(self, entry: Dict[str, Any]):
+        line = (json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+        with self.lock:
+            self.entries[entry['key']] = entry
+            with open(self.path, 'ab') as cassette_file:
+                cassette_file.write(gzip.compress(line))
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CassetteClient:
+    """Wraps the bedrock-runtime client, recording InvokeModel and Converse calls to a cassette or answering from it
+
+    record calls the model and records every call, replay answers from the cassette without network access after the
+    recorded latency multiplied by latency_scale, auto replays the recorded calls and records the others.
+    """
+
+    def __init__(self, client, path: str, mode: str = 'replay', latency_scale: float = 1.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f'Unknown cassette mode {mode}, expected one of {", ".join(CASSETTE_MODES)}')
+        if client is None and mode != 'replay':
+            raise ValueError(f'A client is needed to record calls in {mode} mode')
+        self.client = client
+        self.cassette = Cassette(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.counts = {'replayed': 0, 'recorded': 0}
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def recorded(self, key: str, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Recorded call of the request, None if it has to be sent to the model"""
+
+        if self.mode == 'record':
+            return None
+        entry = self.cassette.get(key)
+        if entry is None and self.mode == 'replay':
+            raise CassetteMissError(f'No recorded call for request {key[:16]} to {kwargs.get("modelId")}')
+        return entry
+
+    def invoke_model(self, **kwargs):
+
+        key = request_key('invoke_model', kwargs)
+
+        entry = self.recorded(key, kwargs)
+        if entry is not None:
+            return self.replay(entry)
+
+        start = time.perf_counter()
+        response = self.client.invoke_model(**kwargs)
+        payload = response['body'].read()
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+        self.cassette.append({
+            'key': key,
+            'model_id': kwargs.get('modelId'),
+            'response': json.loads(payload),
+            'headers': {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+            'content_type': response.get('contentType', 'application/json'),
+            'latency_ms': round(latency_ms, 1),
+        })
+        with self.lock:
+            self.counts['recorded'] += 1
+
+        response['body'] = io.BytesIO(payload)
+        return response
+
+    def converse(self, **kwargs):
+
+        key = request_key('converse', kwargs)
+
+        entry = self.recorded(key, kwargs)
+        if entry is not None:
+            self.wait(entry)
+            return {**entry['response'], 'ResponseMetadata': {'HTTPStatusCode': 200, 'HTTPHeaders': {}}}
+
+        start = time.perf_counter()
+        response = self.client.converse(**kwargs)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        self.cassette.append({
+            'key': key,
+            'model_id': kwargs.get('modelId'),
+            'response': {name: value for name, value in response.items() if name != 'ResponseMetadata'},
+            'latency_ms': round(latency_ms, 1),
+        })
+        with self.lock:
+            self.counts['recorded'] += 1
+
+        return response
+
+    def wait(self, entry: Dict[str, Any]):
+
+        if self.latency_scale:
+            time.sleep(entry['latency_ms'] * self.latency_scale / 1000)
+        with self.lock:
+            self.counts['replayed'] += 1
+
+    def replay(self, entry: Dict[str, Any]):
+
+        self.wait(entry)
+
+        return {
+            'body': io.BytesIO(json.dumps(entry['response']).encode('utf-8')),
+            'contentType': entry['content_type'],
+            'ResponseMetadata': {'HTTPStatusCode': 200, 'HTTPHeaders': dict(entry['headers'])},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {'mode': self.mode, 'cassette_calls': len(self.cassette), **self.counts}
@@ -0,0 +1,67 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from typing import Any, Dict, Optional, Type
+
+from langchain_aws import ChatBedrock
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts.chat import ChatPromptTemplate
+from langchain_core.pydantic_v1 import BaseModel
+from langchain_core.runnables import Runnable
+
+# Chains are built once per container and reused by every warm invocation
+_STRUCTURED_CHAINS: Dict[tuple, Runnable] = {}
+
+
+def prerender_prompt(prompt: ChatPromptTemplate, static_values: Dict[str, str]) -> ChatPromptTemplate:
+    """Formats once every message of the prompt that depends only on static values (system prompt, few-shot examples)"""
+
+    messages = []
+
+    for message in prompt.messages:
+        if isinstance(message, BaseMessage):
+            messages.append(message)
+        elif set(message.input_variables) <= static_values.keys():
+            messages.extend(message.format_messages(**{name: static_values[name] for name in message.input_variables}))
+        else:
+            messages.append(message)
+
+    return ChatPromptTemplate.from_messages(messages)
+
+
+def get_structured_chain(
+        model_id: str,
+        model_kwargs: Dict[str, Any],
+        prompt: ChatPromptTemplate,
+        output_schema: Type[BaseModel],
+        client: Any,
+        static_values: Optional[Dict[str, str]] = None,
+) -> Runnable:
+    """Returns the prompt | structured model chain for the given configuration, building it on first use"""
+
+    static_values = static_values or {}
+
+    key = (model_id, tuple(sorted(model_kwargs.items())), id(prompt), output_schema, id(client),
+           tuple(sorted(static_values.items())))
+
+    chain = _STRUCTURED_CHAINS.get(key)
+
+    if chain is None:
+
+        bedrock_llm = ChatBedrock(
+            model_id=model_id,
+            model_kwargs=dict(model_kwargs),
+            client=client,
+        )
+
+        structured_llm = bedrock_llm.with_structured_output(output_schema)
+
+        chain = prerender_prompt(prompt, static_values) | structured_llm
+
+        _STRUCTURED_CHAINS[key] = chain
+
+    return chain
+
+
+def clear_chains():
+    _STRUCTURED_CHAINS.clear()
@@ -0,0 +1,74 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+from botocore.exceptions import ClientError
+
+T = TypeVar('T')
+
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException'}
+
+
+def is_throttling(exception: BaseException) -> bool:
+    """True if the exception, or any exception it was raised from, is a throttling response of the service"""
+    while exception is not None:
+        if isinstance(exception, ClientError) and exception.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+            return True
+        # ChatBedrock re-raises service errors as ValueError with the original message
+        if any(code in str(exception) for code in THROTTLING_ERROR_CODES):
+            return True
+        exception = exception.__cause__ or exception.__context__
+    return False
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the requests in flight, halving the limit on throttling and growing it back one by one on success"""
+
+    def __init__(self, max_concurrency: int, max_attempts: int = 4, base_delay_seconds: float = 0.5,
+                 successes_to_increase: int = 5):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.successes_to_increase = successes_to_increase
+        self.successes = 0
+        self.throttles = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self, throttled: bool):
+        async with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self.successes = 0
+                self.limit = max(1, self.limit // 2)
+            else:
+                self.successes += 1
+                if self.successes >= self.successes_to_increase and self.limit < self.max_concurrency:
+                    self.successes = 0
+                    self.limit += 1
+            self.condition.notify_all()
+
+    async def run(self, function: Callable[[], Awaitable[T]]) -> T:
+        """Awaits function() within the concurrency limit, retrying it with exponential backoff when throttled"""
+        for attempt in range(self.max_attempts):
+            await self.acquire()
+            try:
+                result = await function()
+            except Exception as e:
+                throttled = is_throttling(e)
+                await self.release(throttled)
+                if not throttled or attempt == self.max_attempts - 1:
+                    raise
+            else:
+                await self.release(False)
+                return result
+            await asyncio.sleep(self.base_delay_seconds * 2 ** attempt)
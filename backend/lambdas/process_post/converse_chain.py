@@ -0,0 +1,152 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import asyncio
+from typing import Any, Dict, List, Optional, Type
+
+from prompt_selector import PromptSpec, get_examples, selects_examples
+
+# Chains are built once per container and reused by every warm invocation
+_CONVERSE_CHAINS: Dict[tuple, 'ConverseStructuredChain'] = {}
+
+# Model parameters with a field of their own in the inference configuration of the Converse API
+INFERENCE_CONFIG_FIELDS = {
+    'max_tokens': 'maxTokens',
+    'temperature': 'temperature',
+    'top_p': 'topP',
+    'stop_sequences': 'stopSequences',
+}
+
+
+def tool_input_schema(schema: Dict[str, Any], definitions: Optional[Dict[str, Any]] = None) -> Any:
+    """JSON schema of a pydantic model with its references inlined and without titles, as LangChain sends it"""
+
+    definitions = schema.get('definitions', {}) if definitions is None else definitions
+
+    if isinstance(schema, list):
+        return [tool_input_schema(value, definitions) for value in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if '$ref' in schema:
+        return tool_input_schema(definitions[schema['$ref'].split('/')[-1]], definitions)
+
+    converted = {}
+    for name, value in schema.items():
+        if name in ('title', 'definitions'):
+            continue
+        if name == 'properties':
+            converted[name] = {field: tool_input_schema(field_schema, definitions)
+                               for field, field_schema in value.items()}
+        else:
+            converted[name] = tool_input_schema(value, definitions)
+    return converted
+
+
+def tool_config(output_schema: Type) -> Dict[str, Any]:
+    """Single tool with the schema of the output model, the model is required to call it
+
+    The description of the model is the description of the tool, it is not repeated in the schema.
+    """
+    name = output_schema.__name__
+    return {
+        'tools': [{'toolSpec': {
+            'name': name,
+            'description': output_schema.__doc__ or name,
+            'inputSchema': {'json': {name: value for name, value in tool_input_schema(output_schema.schema()).items()
+                                     if name != 'description'}},
+        }}],
+        'toolChoice': {'tool': {'name': name}},
+    }
+
+
+def text_message(role: str, text: str) -> Dict[str, Any]:
+    return {'role': role, 'content': [{'text': text}]}
+
+
+def example_messages(examples: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    messages = []
+    for example in examples:
+        messages.append(text_message('user', example['text']))
+        messages.append(text_message('assistant', example['extraction']))
+    return messages
+
+
+class ConverseStructuredChain:
+    """Formats the prompt and calls the Converse API with the output model as a tool, without LangChain
+
+    Exposes the invoke and ainvoke methods of the LangChain chains it replaces and returns the same models.
+    """
+
+    def __init__(self, model_id: str, model_kwargs: Dict[str, Any], prompt: PromptSpec, output_schema: Type,
+                 client: Any, static_values: Dict[str, str]):
+
+        self.client = client
+        self.prompt = prompt
+        self.output_schema = output_schema
+
+        inference_config = {INFERENCE_CONFIG_FIELDS[name]: value for name, value in model_kwargs.items()
+                            if name in INFERENCE_CONFIG_FIELDS}
+        additional_fields = {name: value for name, value in model_kwargs.items() if name not in INFERENCE_CONFIG_FIELDS}
+
+        # Everything but the user message is formatted once
+        self.request = {
+            'modelId': model_id,
+            'system': [{'text': prompt.system.format(**static_values)}],
+            'inferenceConfig': inference_config,
+            'toolConfig': tool_config(output_schema),
+        }
+        if additional_fields:
+            self.request['additionalModelRequestFields'] = additional_fields
+
+        self.static_examples = example_messages(get_examples(prompt.examples_language, '')) \
+            if prompt.examples_language is not None and not selects_examples() else []
+
+    def messages(self, values: Dict[str, str]) -> List[Dict[str, Any]]:
+
+        examples = self.static_examples
+        if self.prompt.examples_language is not None and selects_examples():
+            examples = example_messages(get_examples(self.prompt.examples_language, values['text']))
+
+        return examples + [text_message('user', self.prompt.user.format(**values))]
+
+    def invoke(self, values: Dict[str, str]):
+
+        response = self.client.converse(**self.request, messages=self.messages(values))
+
+        for block in response['output']['message']['content']:
+            if 'toolUse' in block:
+                return self.output_schema.parse_obj(block['toolUse']['input'])
+
+        # Same as the structured output of LangChain when the model does not call the tool
+        return None
+
+    async def ainvoke(self, values: Dict[str, str]):
+        return await asyncio.get_running_loop().run_in_executor(None, self.invoke, values)
+
+
+def get_converse_chain(
+        model_id: str,
+        model_kwargs: Dict[str, Any],
+        prompt: PromptSpec,
+        output_schema: Type,
+        client: Any,
+        static_values: Optional[Dict[str, str]] = None,
+) -> ConverseStructuredChain:
+    """Returns the Converse chain for the given configuration, building it on first use"""
+
+    static_values = static_values or {}
+
+    key = (model_id, tuple(sorted(model_kwargs.items())), prompt, output_schema, id(client),
+           tuple(sorted(static_values.items())))
+
+    chain = _CONVERSE_CHAINS.get(key)
+
+    if chain is None:
+        chain = ConverseStructuredChain(model_id, model_kwargs, prompt, output_schema, client, static_values)
+        _CONVERSE_CHAINS[key] = chain
+
+    return chain
+
+
+def clear_chains():
+    _CONVERSE_CHAINS.clear()
@@ -0,0 +1,70 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import math
+import zlib
+from collections import Counter
+from typing import Dict, List
+
+from langchain_core.example_selectors import BaseExampleSelector
+
+from text_preprocessing import TweetPreprocessor
+from token_accounting import estimate_tokens
+
+
+def hashed_ngram_vector(text: str, n: int = 3, n_features: int = 2 ** 16) -> Dict[int, float]:
+    """L2 normalized bag of hashed character n-grams of the normalized text"""
+
+    normalized = f' {TweetPreprocessor.normalize(text)} '
+    counts = Counter(zlib.crc32(normalized[i:i + n].encode('utf-8')) % n_features
+                     for i in range(len(normalized) - n + 1))
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+
+    return {feature: count / norm for feature, count in counts.items()}
+
+
+def cosine_similarity(first: Dict[int, float], second: Dict[int, float]) -> float:
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(weight * second.get(feature, 0.0) for feature, weight in first.items())
+
+
+class HashedNgramExampleSelector(BaseExampleSelector):
+    """Selects the k examples most similar to the input text that fit in a token budget
+
+    The example pool is indexed once in memory, selecting examples costs a sparse dot product per example.
+    """
+
+    def __init__(self, examples: List[Dict[str, str]], k: int, token_budget: int = 0, input_key: str = 'text'):
+        self.k = k
+        self.token_budget = token_budget
+        self.input_key = input_key
+        self.examples: List[Dict[str, str]] = []
+        self.vectors: List[Dict[int, float]] = []
+        self.tokens: List[int] = []
+        for example in examples:
+            self.add_example(example)
+
+    def add_example(self, example: Dict[str, str]):
+        self.examples.append(example)
+        self.vectors.append(hashed_ngram_vector(example[self.input_key]))
+        self.tokens.append(sum(estimate_tokens(value) for value in example.values()))
+
+    def select_examples(self, input_variables: Dict[str, str]) -> List[dict]:
+
+        query = hashed_ngram_vector(input_variables[self.input_key])
+        ranked = sorted(range(len(self.examples)), key=lambda index: cosine_similarity(query, self.vectors[index]),
+                        reverse=True)
+
+        selected, used_tokens = [], 0
+
+        for index in ranked:
+            if len(selected) == self.k:
+                break
+            if self.token_budget and used_tokens + self.tokens[index] > self.token_budget:
+                continue
+            selected.append(index)
+            used_tokens += self.tokens[index]
+
+        # Keep the original order of the pool so that the prompt reads the same as with fixed examples
+        return [self.examples[index] for index in sorted(selected)]
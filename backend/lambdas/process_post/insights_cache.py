@@ -0,0 +1,99 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import hashlib
+import json
+from typing import Dict, Optional, Sequence, Type
+
+from aws_lambda_powertools import Logger
+from langchain_core.pydantic_v1 import BaseModel
+
+from cache_backends import DynamoDBBackend, LRUCache, SQLiteBackend
+
+logger = Logger(child=True)
+
+
+class InsightsCache:
+    """Caches model outputs keyed by a hash of the cleaned text and the configuration that produced them"""
+
+    def __init__(self, context: Sequence[str], memory: LRUCache, backend=None):
+        self.context = list(context)
+        self.memory = memory
+        self.backend = backend
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+
+    def key(self, kind: str, clean_text: str) -> str:
+        # Whitespace left behind by removed emojis or links must not produce a different key
+        normalized_text = ' '.join(clean_text.split())
+        key_parts = json.dumps([kind, normalized_text, *self.context], ensure_ascii=False)
+        return hashlib.sha256(key_parts.encode('utf-8')).hexdigest()
+
+    def get(self, kind: str, clean_text: str, output_model: Type[BaseModel]) -> Optional[BaseModel]:
+
+        key = self.key(kind, clean_text)
+        value = self.memory.get(key)
+
+        if value is not None:
+            self.hits += 1
+            return output_model.parse_obj(value)
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f'Unable to read from the insights cache backend: {e}')
+
+            if value is not None:
+                self.backend_hits += 1
+                self.memory.put(key, value)
+                return output_model.parse_obj(value)
+
+        self.misses += 1
+        return None
+
+    def put(self, kind: str, clean_text: str, output: BaseModel):
+
+        key = self.key(kind, clean_text)
+        value = output.dict()
+
+        self.memory.put(key, value)
+
+        if self.backend is not None:
+            try:
+                self.backend.put(key, value, self.memory.ttl_seconds)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f'Unable to write to the insights cache backend: {e}')
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'backend_hits': self.backend_hits,
+            'misses': self.misses,
+            'evictions': self.memory.evictions,
+            'expirations': self.memory.expirations,
+            'backend_errors': self.backend_errors,
+            'entries': len(self.memory),
+        }
+
+
+def create_insights_cache(
+        context: Sequence[str],
+        max_entries: int,
+        ttl_seconds: float,
+        table_name: Optional[str] = None,
+        sqlite_path: Optional[str] = None
+) -> InsightsCache:
+
+    backend = None
+
+    if table_name:
+        backend = DynamoDBBackend(table_name)
+    elif sqlite_path:
+        backend = SQLiteBackend(sqlite_path, 'insights_cache')
+
+    return InsightsCache(context, LRUCache(max_entries, ttl_seconds), backend)
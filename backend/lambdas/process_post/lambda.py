@@ -1,17 +1,26 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
+import asyncio
 import copy
 import os
+import random
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 import demoji
 
 import boto3
-import langchain_core
-from langchain_aws import ChatBedrock
 
-from output_models.models import ExtractedInformation, TopicMatch, TextWithInsights
-from prompt_selector import get_information_extraction_prompt_selector, get_topic_match_prompt_selector
+from concurrency import AdaptiveConcurrencyLimiter
+from insights_cache import create_insights_cache
+from near_duplicates import NearDuplicateIndex
+from prefilter import ShadowStats, TopicPrefilter
+from cassette import CassetteClient, raise_cassette_miss
+from prompt_cache import PromptCachingClient, supports_prompt_caching
+from output_models.models import ExtractedInformation, TopicMatch, TextWithInsights, BatchTopicMatch, \
+    TopicMatchWithInformation
+from prompt_selector import get_chat_prompt, get_prompt_spec, FEW_SHOT_K, FEW_SHOT_TOKEN_BUDGET
 
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools import Logger
@@ -22,8 +31,23 @@ LANGUAGE_CODE = os.environ['LANGUAGE_CODE']
 META_TOPICS_STR = os.environ['LABELS']
 META_SENTIMENTS_STR = os.environ['SENTIMENT_LABELS']
 
-INFORMATION_EXTRACTION_PROMPT_SELECTOR = get_information_extraction_prompt_selector(LANGUAGE_CODE)
-TOPIC_MATCH_PROMPT_SELECTOR = get_topic_match_prompt_selector(LANGUAGE_CODE)
+# "langchain" calls the model through ChatBedrock, "converse" calls the Converse API directly and does not import
+# LangChain, which shortens cold starts
+MODEL_CLIENT = os.environ.get('MODEL_CLIENT', 'langchain').lower()
+
+if MODEL_CLIENT == 'converse':
+    from converse_chain import get_converse_chain as get_structured_chain
+else:
+    from chain_registry import get_structured_chain
+
+# "two_calls" matches topics and then extracts information in a second call, "fused" does both in a single call
+PROCESS_MODE = os.environ.get('PROCESS_MODE', 'two_calls').lower()
+
+# Maximum number of posts classified by a single batch topic match call
+TOPIC_MATCH_BATCH_SIZE = int(os.environ.get('TOPIC_MATCH_BATCH_SIZE', '10'))
+
+# Maximum number of model requests in flight for the asynchronous batch handler
+MAX_CONCURRENCY = int(os.environ.get('MAX_CONCURRENCY', '8'))
 
 TOPIC_MATCH_MODEL_PARAMETERS = {
     "max_tokens": 500,
@@ -31,20 +55,98 @@ TOPIC_MATCH_MODEL_PARAMETERS = {
     "top_k": 20,
 }
 
+BATCH_TOPIC_MATCH_MODEL_PARAMETERS = {
+    "max_tokens": 500 * TOPIC_MATCH_BATCH_SIZE,
+    "temperature": 0.1,
+    "top_k": 20,
+}
+
 INFORMATION_EXTRACTION_MODEL_PARAMETERS = {
     "max_tokens": 1500,
     "temperature": 0.1,
     "top_k": 20,
 }
 
-bedrock_runtime = boto3.client(
+FUSED_MODEL_PARAMETERS = {
+    "max_tokens": 2000,
+    "temperature": 0.1,
+    "top_k": 20,
+}
+
+# The system prompt and, unless they are selected per text, the few-shot examples are marked as a cacheable prefix
+# when the model supports prompt caching, or always with true. Token usage, cached and not cached, is recorded for
+# every call.
+PROMPT_CACHING_MODE = os.environ.get('PROMPT_CACHING', 'auto').lower()
+PROMPT_CACHING = PROMPT_CACHING_MODE == 'true' or (PROMPT_CACHING_MODE == 'auto' and supports_prompt_caching(MODEL_ID))
+
+# Model calls can be recorded to a cassette and replayed from it offline, to benchmark prompt and schema variants
+# without network access. See CassetteClient for the modes.
+BEDROCK_CASSETTE_PATH = os.environ.get('BEDROCK_CASSETTE_PATH')
+
+bedrock_client = boto3.client(
     service_name="bedrock-runtime",
     region_name=AWS_REGION
 )
 
+if BEDROCK_CASSETTE_PATH:
+    bedrock_client = CassetteClient(
+        bedrock_client,
+        BEDROCK_CASSETTE_PATH,
+        mode=os.environ.get('BEDROCK_CASSETTE_MODE', 'replay').lower(),
+        latency_scale=float(os.environ.get('BEDROCK_CASSETTE_LATENCY_SCALE', '1.0'))
+    )
+
+bedrock_runtime = PromptCachingClient(
+    bedrock_client,
+    mark_cacheable=PROMPT_CACHING,
+    cache_messages=FEW_SHOT_K == 0 and FEW_SHOT_TOKEN_BUDGET == 0
+)
+
+# Retweets and copy-pasted posts are answered from the cache instead of calling the model again
+INSIGHTS_CACHE = create_insights_cache(
+    context=[META_TOPICS_STR, META_SENTIMENTS_STR, LANGUAGE_CODE, MODEL_ID],
+    max_entries=int(os.environ.get('INSIGHTS_CACHE_MAX_ENTRIES', '2048')),
+    ttl_seconds=float(os.environ.get('INSIGHTS_CACHE_TTL_SECONDS', '86400')),
+    table_name=os.environ.get('INSIGHTS_CACHE_TABLE'),
+    sqlite_path=os.environ.get('INSIGHTS_CACHE_SQLITE_PATH'),
+)
+
+# Near duplicates (same text with another link, mention, retweet prefix or emoji) reuse the insights of a recent post
+NEAR_DUPLICATE_INDEX = NearDuplicateIndex(
+    max_distance=int(os.environ.get('NEAR_DUPLICATE_MAX_DISTANCE', '3')),
+    window_seconds=float(os.environ.get('NEAR_DUPLICATE_WINDOW_SECONDS', '900')),
+    max_entries=int(os.environ.get('NEAR_DUPLICATE_MAX_ENTRIES', '5000')),
+) if os.environ.get('NEAR_DUPLICATE_ENABLED', 'false').lower() == 'true' else None
+
+# Optional CPU only prefilter that drops posts unlikely to match any topic before calling the model.
+# In shadow mode it only logs what it would have dropped next to the topic match of the model.
+PREFILTER_MODE = os.environ.get('PREFILTER_MODE', 'off').lower()
+PREFILTER_THRESHOLD = float(os.environ.get('PREFILTER_THRESHOLD', '0.2'))
+# Share of the shadow decisions logged with the text of the post, the training data of the prefilter
+PREFILTER_SHADOW_SAMPLE_RATE = float(os.environ.get('PREFILTER_SHADOW_SAMPLE_RATE', '0.1'))
+
+if PREFILTER_MODE in ('shadow', 'enforce'):
+    PREFILTER = TopicPrefilter.load(os.environ['PREFILTER_MODEL_PATH']) if os.environ.get('PREFILTER_MODEL_PATH') \
+        else TopicPrefilter.from_labels(META_TOPICS_STR)
+else:
+    PREFILTER = None
+
+PREFILTER_SHADOW_STATS = ShadowStats()
+
 logger = Logger()
 
-langchain_core.globals.set_debug(True)
+# LangChain debug tracing logs every prompt and response, it is only turned on when asked for
+if os.environ.get('LANGCHAIN_DEBUG', 'false').lower() == 'true' and MODEL_CLIENT != 'converse':
+    from langchain_core.globals import set_debug
+    set_debug(True)
+
+
+def get_prompt(kind: str):
+    """Prompt of the model client for the language and model of the function, built on first use"""
+    if MODEL_CLIENT == 'converse':
+        return get_prompt_spec(kind, LANGUAGE_CODE, MODEL_ID)
+    return get_chat_prompt(kind, LANGUAGE_CODE, MODEL_ID)
+
 
 def remove_unknown_values(extracted_info: ExtractedInformation):
 
@@ -60,136 +162,502 @@ def remove_unknown_values(extracted_info: ExtractedInformation):
 
     return text_insights
 
+# Only topic matches are reused for near duplicates, an extraction carries the links, mentions and location of the
+# text it was extracted from, which are exactly what near duplicates differ in
+NEAR_DUPLICATE_KINDS = ('topic_match',)
+
+def lookup_insights(kind: str, text: str, output_model):
+
+    insights = INSIGHTS_CACHE.get(kind, text, output_model)
+
+    if insights is None and NEAR_DUPLICATE_INDEX is not None and kind in NEAR_DUPLICATE_KINDS:
+        near_duplicate_insights = NEAR_DUPLICATE_INDEX.get(kind, text)
+        if near_duplicate_insights is not None:
+            logger.info(f'Reusing {kind} of a near duplicate text')
+            insights = output_model.parse_obj(near_duplicate_insights)
+
+    return insights
+
+# Insights cache lookups and writes can be DynamoDB requests, the async handlers run them on this pool so that they do
+# not block the event loop
+CACHE_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+
+async def run_cache_io(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(CACHE_EXECUTOR, function, *args)
+
+def store_insights(kind: str, text: str, insights):
+
+    INSIGHTS_CACHE.put(kind, text, insights)
+
+    if NEAR_DUPLICATE_INDEX is not None and kind in NEAR_DUPLICATE_KINDS:
+        NEAR_DUPLICATE_INDEX.put(kind, text, insights.dict())
+
+def get_topic_match_chain(meta_topics: str):
+    return get_structured_chain(
+        MODEL_ID,
+        TOPIC_MATCH_MODEL_PARAMETERS,
+        get_prompt('topic_match'),
+        TopicMatch,
+        bedrock_runtime,
+        static_values={"meta_topics": meta_topics}
+    )
+
 def text_topic_match(
         meta_topics: str,
         text: str,
 ) -> TopicMatch:
 
-    bedrock_llm = ChatBedrock(
-        model_id=MODEL_ID,
-        model_kwargs=TOPIC_MATCH_MODEL_PARAMETERS,
-        client=bedrock_runtime,
-    )
+    cached_topic_match = lookup_insights('topic_match', text, TopicMatch)
 
-    claude_topic_match_prompt_template = TOPIC_MATCH_PROMPT_SELECTOR.get_prompt(MODEL_ID)
+    if cached_topic_match is not None:
+        return cached_topic_match
 
-    structured_llm = bedrock_llm.with_structured_output(TopicMatch)
+    topic_match_obj = get_topic_match_chain(meta_topics).invoke({"text": text})
 
-    structured_topic_match_chain = claude_topic_match_prompt_template | structured_llm
+    store_insights('topic_match', text, topic_match_obj)
 
-    topic_match_obj = structured_topic_match_chain.invoke({"meta_topics": meta_topics, "text": text})
+    return topic_match_obj
+
+async def atext_topic_match(
+        meta_topics: str,
+        text: str,
+) -> TopicMatch:
+
+    cached_topic_match = await run_cache_io(lookup_insights, 'topic_match', text, TopicMatch)
+
+    if cached_topic_match is not None:
+        return cached_topic_match
+
+    topic_match_obj = await get_topic_match_chain(meta_topics).ainvoke({"text": text})
+
+    await run_cache_io(store_insights, 'topic_match', text, topic_match_obj)
 
     return topic_match_obj
 
+def format_batch_texts(texts: List[str]) -> str:
+    return "\n".join(f'<text index="{index}">\n{text}\n</text>' for index, text in enumerate(texts))
+
+def text_topic_match_batch(
+        meta_topics: str,
+        texts: List[str],
+) -> List[TopicMatch]:
+
+    topic_matches: List[Optional[TopicMatch]] = [lookup_insights('topic_match', text, TopicMatch) for text in texts]
+
+    # Only the texts that are not cached are sent to the model
+    uncached = [index for index, topic_match in enumerate(topic_matches) if topic_match is None]
+
+    if not uncached:
+        return topic_matches
+
+    try:
+
+        structured_batch_topic_match_chain = get_structured_chain(
+            MODEL_ID,
+            BATCH_TOPIC_MATCH_MODEL_PARAMETERS,
+            get_prompt('batch_topic_match'),
+            BatchTopicMatch,
+            bedrock_runtime,
+            static_values={"meta_topics": meta_topics}
+        )
+
+        batch_topic_match_obj = structured_batch_topic_match_chain.invoke({
+            "texts": format_batch_texts([texts[index] for index in uncached])
+        })
+
+        # Match every classification back to its post, ignoring unknown or repeated indexes
+        for match in batch_topic_match_obj.matches:
+            if 0 <= match.index < len(uncached) and topic_matches[uncached[match.index]] is None:
+                topic_match = TopicMatch(
+                    understanding=match.understanding,
+                    related_topics=match.related_topics,
+                    is_match=match.is_match
+                )
+                topic_matches[uncached[match.index]] = topic_match
+                store_insights('topic_match', texts[uncached[match.index]], topic_match)
+
+    except Exception as e:
+
+        raise_cassette_miss(e)
+
+        logger.warning("Malformed batch topic match, falling back to single text topic match")
+        logger.warning(traceback.format_exc())
+
+    missing = [index for index, topic_match in enumerate(topic_matches) if topic_match is None]
+
+    if missing:
+        logger.info(f'Matching topics individually for {len(missing)} of {len(texts)} texts')
+
+    for index in missing:
+        topic_matches[index] = text_topic_match(meta_topics, texts[index])
+
+    return topic_matches
+
+def get_information_extraction_chain(sentiments: str):
+    return get_structured_chain(
+        MODEL_ID,
+        INFORMATION_EXTRACTION_MODEL_PARAMETERS,
+        get_prompt('information_extraction'),
+        ExtractedInformation,
+        bedrock_runtime,
+        static_values={"sentiments": sentiments}
+    )
+
 def text_information_extraction(
         sentiments: str,
         text: str
 ) -> ExtractedInformation:
 
-    bedrock_llm = ChatBedrock(
-        model_id=MODEL_ID,
-        model_kwargs=INFORMATION_EXTRACTION_MODEL_PARAMETERS,
-        client=bedrock_runtime,
-    )
+    cached_information = lookup_insights('information_extraction', text, ExtractedInformation)
+
+    if cached_information is not None:
+        return cached_information
 
-    claude_information_extraction_prompt_template = INFORMATION_EXTRACTION_PROMPT_SELECTOR.get_prompt(MODEL_ID)
+    information_extraction_obj = get_information_extraction_chain(sentiments).invoke({"text": text})
 
-    structured_llm = bedrock_llm.with_structured_output(ExtractedInformation)
+    if information_extraction_obj is not None:
+        store_insights('information_extraction', text, information_extraction_obj)
 
-    structured_chain = claude_information_extraction_prompt_template | structured_llm
+    return information_extraction_obj
+
+async def atext_information_extraction(
+        sentiments: str,
+        text: str
+) -> ExtractedInformation:
 
-    information_extraction_obj = structured_chain.invoke({
-        "text": text,
-        "sentiments": sentiments
-    })
+    cached_information = await run_cache_io(lookup_insights, 'information_extraction', text, ExtractedInformation)
+
+    if cached_information is not None:
+        return cached_information
+
+    information_extraction_obj = await get_information_extraction_chain(sentiments).ainvoke({"text": text})
+
+    if information_extraction_obj is not None:
+        await run_cache_io(store_insights, 'information_extraction', text, information_extraction_obj)
 
     return information_extraction_obj
 
-@logger.inject_lambda_context(log_event=True)
-def handler(event, _context: LambdaContext):
+def is_topic_matched(topic_match: TopicMatch) -> bool:
+    return topic_match.is_match and len(topic_match.related_topics) > 0
+
+def get_fused_chain(meta_topics: str, sentiments: str):
+    return get_structured_chain(
+        MODEL_ID,
+        FUSED_MODEL_PARAMETERS,
+        get_prompt('fused'),
+        TopicMatchWithInformation,
+        bedrock_runtime,
+        static_values={"meta_topics": meta_topics, "sentiments": sentiments}
+    )
 
-        item = event
-        text = item['text']
+def lookup_fused_insights(text: str) -> Optional[Tuple[TopicMatch, Optional[ExtractedInformation]]]:
 
-        clean_text = demoji.replace(text, "")
+    topic_match_obj = lookup_insights('topic_match', text, TopicMatch)
 
-        # Attemp to extract information from text
-        try:
+    if topic_match_obj is not None and not is_topic_matched(topic_match_obj):
+        return topic_match_obj, None
 
-            topic_match = text_topic_match(META_TOPICS_STR, clean_text)
+    information_extraction_obj = lookup_insights('information_extraction', text, ExtractedInformation)
+
+    if topic_match_obj is not None and information_extraction_obj is not None:
+        return topic_match_obj, information_extraction_obj
+
+    return None
+
+def store_fused_insights(
+        text: str,
+        fused_obj: TopicMatchWithInformation
+) -> Tuple[TopicMatch, Optional[ExtractedInformation]]:
+
+    # Split the combined output so that both kinds are cached the same way as in the two calls mode
+    topic_match_obj = TopicMatch(**{name: getattr(fused_obj, name) for name in TopicMatch.__fields__})
+    store_insights('topic_match', text, topic_match_obj)
+
+    if not is_topic_matched(topic_match_obj):
+        return topic_match_obj, None
+
+    information_extraction_obj = ExtractedInformation(
+        **{name: getattr(fused_obj, name) for name in ExtractedInformation.__fields__}
+    )
+    store_insights('information_extraction', text, information_extraction_obj)
+
+    return topic_match_obj, information_extraction_obj
 
-            if topic_match.is_match and len(topic_match.related_topics) > 0:
+def text_fused_extraction(
+        meta_topics: str,
+        sentiments: str,
+        text: str
+) -> Tuple[TopicMatch, Optional[ExtractedInformation]]:
+
+    cached_insights = lookup_fused_insights(text)
+
+    if cached_insights is not None:
+        return cached_insights
+
+    fused_obj = get_fused_chain(meta_topics, sentiments).invoke({"text": text})
+
+    return store_fused_insights(text, fused_obj)
+
+async def atext_fused_extraction(
+        meta_topics: str,
+        sentiments: str,
+        text: str
+) -> Tuple[TopicMatch, Optional[ExtractedInformation]]:
 
-                try:
+    cached_insights = await run_cache_io(lookup_fused_insights, text)
 
-                    insights = text_information_extraction(META_SENTIMENTS_STR, clean_text)
-                    logger.info(f'Text insights:')
-                    logger.info(insights)
+    if cached_insights is not None:
+        return cached_insights
 
-                    if insights is not None:
+    fused_obj = await get_fused_chain(meta_topics, sentiments).ainvoke({"text": text})
 
-                        logger.info("Removing <UNKNOWN> values")
-                        logger.debug(insights)
+    return await run_cache_io(store_fused_insights, text, fused_obj)
 
-                        insights = remove_unknown_values(insights)
+def prefilter_drops(clean_text: str) -> bool:
+    return PREFILTER is not None and PREFILTER_MODE == 'enforce' and PREFILTER.score(clean_text) < PREFILTER_THRESHOLD
 
-                        logger.info("<UNKNOWN> removed")
-                        logger.debug(insights)
+def prefilter_shadow(clean_text: str, topic_match: TopicMatch):
 
-                        # Create output object
-                        text_insights = TextWithInsights(
-                            text=item["text"],
-                            user=item["user"],
-                            created_at=item["created_at"],
-                            source=item["source"],
-                            platform=item["platform"],
-                            text_clean=clean_text,
-                            meta_topics=topic_match.related_topics,
-                            topic=insights.topic,
-                            location=insights.location,
-                            entities=insights.entities,
-                            keyphrases=insights.keyphrases,
-                            sentiment=insights.sentiment,
-                            links=insights.links,
-                            model_id=MODEL_ID,
-                            process_post=True,
-                            process_location=True if len(insights.location) > 0 else False # Process location only if there is one
-                        )
+    if PREFILTER is None or PREFILTER_MODE != 'shadow':
+        return
 
-                        logger.info(f'Invoking next function')
-                        logger.debug(item)
-                    else:
+    score = PREFILTER.score(clean_text)
+    is_match = is_topic_matched(topic_match)
 
-                        # Create output object
-                        text_insights = TextWithInsights(
-                            text=item["text"],
-                            user=item["user"],
-                            created_at=item["created_at"],
-                            source=item["source"],
-                            platform=item["platform"],
-                            text_clean=clean_text,
-                            model_id=MODEL_ID,
-                            process_post=False
-                        )
+    PREFILTER_SHADOW_STATS.record(score < PREFILTER_THRESHOLD, is_match)
 
-                        logger.info(f'Could not extract information from this text')
-                        logger.debug(item)
+    if random.random() >= PREFILTER_SHADOW_SAMPLE_RATE:
+        return
 
-                    return text_insights.dict()
+    # text and is_match are the outcomes the prefilter is trained on, read back by prefilter.read_outcomes
+    logger.info({'prefilter_shadow': {
+        'text': clean_text,
+        'is_match': is_match,
+        'score': round(score, 4),
+        'would_drop': score < PREFILTER_THRESHOLD,
+        **PREFILTER_SHADOW_STATS.as_dict()
+    }})
 
-                except Exception as e:
+def extract_insights(
+        item,
+        clean_text: str,
+        topic_match: TopicMatch,
+        insights: Optional[ExtractedInformation] = None,
+        insights_extracted: bool = False
+):
 
-                    logger.error("Unable to extract data from text")
-                    logger.error(traceback.format_exc())
+    if is_topic_matched(topic_match):
 
-                    raise Exception("Unable to extract data from text")
+        try:
 
+            # Insights may already come from the call that matched the topics (fused mode) or from an async call
+            if not insights_extracted:
+                insights = text_information_extraction(META_SENTIMENTS_STR, clean_text)
+            logger.info(f'Text insights:')
+            logger.info(insights)
+
+            if insights is not None:
+
+                logger.info("Removing <UNKNOWN> values")
+                logger.debug(insights)
+
+                insights = remove_unknown_values(insights)
+
+                logger.info("<UNKNOWN> removed")
+                logger.debug(insights)
+
+                # Create output object
+                text_insights = TextWithInsights(
+                    text=item["text"],
+                    user=item["user"],
+                    created_at=item["created_at"],
+                    source=item["source"],
+                    platform=item["platform"],
+                    text_clean=clean_text,
+                    meta_topics=topic_match.related_topics,
+                    topic=insights.topic,
+                    location=insights.location,
+                    entities=insights.entities,
+                    keyphrases=insights.keyphrases,
+                    sentiment=insights.sentiment,
+                    links=insights.links,
+                    model_id=MODEL_ID,
+                    process_post=True,
+                    process_location=True if len(insights.location) > 0 else False # Process location only if there is one
+                )
+
+                logger.info(f'Invoking next function')
+                logger.debug(item)
             else:
-                logger.info(f'Topic not matched')
-                return {'process_post': False}
+
+                # Create output object
+                text_insights = TextWithInsights(
+                    text=item["text"],
+                    user=item["user"],
+                    created_at=item["created_at"],
+                    source=item["source"],
+                    platform=item["platform"],
+                    text_clean=clean_text,
+                    model_id=MODEL_ID,
+                    process_post=False
+                )
+
+                logger.info(f'Could not extract information from this text')
+                logger.debug(item)
+
+            return text_insights.dict()
+
+        except Exception as e:
+
+            raise_cassette_miss(e)
+
+            logger.error("Unable to extract data from text")
+            logger.error(traceback.format_exc())
+
+            raise Exception("Unable to extract data from text")
+
+    else:
+        logger.info(f'Topic not matched')
+        return {'process_post': False}
+
+def handle_batch(items):
+
+    clean_texts = [demoji.replace(item['text'], "") for item in items]
+    results = [{'process_post': False}] * len(items)
+
+    # Posts dropped by the prefilter keep the default result and are not sent to the model
+    indexes = [index for index, clean_text in enumerate(clean_texts) if not prefilter_drops(clean_text)]
+
+    if PROCESS_MODE == 'fused':
+        for index in indexes:
+            try:
+                topic_match, insights = text_fused_extraction(META_TOPICS_STR, META_SENTIMENTS_STR, clean_texts[index])
+                prefilter_shadow(clean_texts[index], topic_match)
+                results[index] = extract_insights(items[index], clean_texts[index], topic_match, insights, True)
+            except Exception as e:
+                raise_cassette_miss(e)
+                logger.error(traceback.format_exc())
+                results[index] = {'process_post': False, 'error': str(e)}
+        return {'posts': results}
+
+    for start in range(0, len(indexes), TOPIC_MATCH_BATCH_SIZE):
+
+        batch_indexes = indexes[start:start + TOPIC_MATCH_BATCH_SIZE]
+
+        try:
+            topic_matches = text_topic_match_batch(META_TOPICS_STR, [clean_texts[index] for index in batch_indexes])
+        except Exception as e:
+            raise_cassette_miss(e)
+            logger.error(traceback.format_exc())
+            for index in batch_indexes:
+                results[index] = {'process_post': False, 'error': "Unable to match topics on text"}
+            continue
+
+        for index, topic_match in zip(batch_indexes, topic_matches):
+            prefilter_shadow(clean_texts[index], topic_match)
+            try:
+                results[index] = extract_insights(items[index], clean_texts[index], topic_match)
+            except Exception as e:
+                raise_cassette_miss(e)
+                results[index] = {'process_post': False, 'error': str(e)}
+
+    return {'posts': results}
+
+async def aprocess_item(item, limiter: AdaptiveConcurrencyLimiter):
+
+    clean_text = demoji.replace(item['text'], "")
+
+    if prefilter_drops(clean_text):
+        return {'process_post': False}
+
+    if PROCESS_MODE == 'fused':
+        topic_match, insights = await limiter.run(
+            lambda: atext_fused_extraction(META_TOPICS_STR, META_SENTIMENTS_STR, clean_text)
+        )
+    else:
+        topic_match = await limiter.run(lambda: atext_topic_match(META_TOPICS_STR, clean_text))
+        insights = await limiter.run(
+            lambda: atext_information_extraction(META_SENTIMENTS_STR, clean_text)
+        ) if is_topic_matched(topic_match) else None
+
+    prefilter_shadow(clean_text, topic_match)
+
+    return extract_insights(item, clean_text, topic_match, insights, True)
+
+async def ahandle_batch(items):
+
+    limiter = AdaptiveConcurrencyLimiter(MAX_CONCURRENCY)
+
+    # The Bedrock client is synchronous, ainvoke runs it in the default executor which must fit every request in flight
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=MAX_CONCURRENCY))
+
+    # A failed post is reported in its own result and does not fail the rest of the batch
+    outcomes = await asyncio.gather(*[aprocess_item(item, limiter) for item in items], return_exceptions=True)
+
+    results = []
+    errors = 0
+
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            raise_cassette_miss(outcome)
+            logger.error("".join(traceback.format_exception(outcome)))
+            results.append({'process_post': False, 'error': str(outcome)})
+            errors += 1
+        else:
+            results.append(outcome)
+
+    logger.info({'batch': {'posts': len(items), 'errors': errors, 'throttles': limiter.throttles,
+                           'final_concurrency': limiter.limit}})
+
+    return {'posts': results}
+
+@logger.inject_lambda_context(log_event=True)
+def batch_handler(event, _context: LambdaContext):
+
+    logger.info({'insights_cache': INSIGHTS_CACHE.stats(), 'model_usage': bedrock_runtime.usage.stats()})
+
+    return asyncio.run(ahandle_batch(event['posts']))
+
+@logger.inject_lambda_context(log_event=True)
+def handler(event, _context: LambdaContext):
+
+        # Cache counters are cumulative for the lifetime of the container
+        logger.info({'insights_cache': INSIGHTS_CACHE.stats(), 'model_usage': bedrock_runtime.usage.stats()})
+
+        if NEAR_DUPLICATE_INDEX is not None:
+            logger.info({'near_duplicate_index': NEAR_DUPLICATE_INDEX.stats()})
+
+        # A list of posts is classified in batches, results keep the order of the input posts
+        if 'posts' in event:
+            return handle_batch(event['posts'])
+
+        item = event
+        text = item['text']
+
+        clean_text = demoji.replace(text, "")
+
+        if prefilter_drops(clean_text):
+            logger.info(f'Topic not matched by the prefilter')
+            return {'process_post': False}
+
+        # Attemp to extract information from text
+        try:
+
+            if PROCESS_MODE == 'fused':
+                topic_match, insights = text_fused_extraction(META_TOPICS_STR, META_SENTIMENTS_STR, clean_text)
+                prefilter_shadow(clean_text, topic_match)
+                return extract_insights(item, clean_text, topic_match, insights, True)
+
+            topic_match = text_topic_match(META_TOPICS_STR, clean_text)
+
+            prefilter_shadow(clean_text, topic_match)
+
+            return extract_insights(item, clean_text, topic_match)
 
         except Exception as e:
 
+            raise_cassette_miss(e)
+
             logger.error(traceback.format_exc())
 
             raise Exception("Unable to match topics on text")
\ No newline at end of file
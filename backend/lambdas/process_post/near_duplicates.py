@@ -0,0 +1,120 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from text_preprocessing import TweetPreprocessor
+
+FINGERPRINT_BITS = 64
+
+
+def feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str) -> Optional[int]:
+    """64 bit SimHash of the words and word pairs of the normalized text, None if there are no words"""
+
+    words = TweetPreprocessor.normalize(text).split()
+
+    if not words:
+        return None
+
+    features = words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+    hashes = [format(feature_hash(feature), '064b') for feature in features]
+
+    # Every bit of the fingerprint is set when it is set in the majority of the feature hashes
+    majority = len(hashes) / 2
+    bits = ''.join('1' if column.count('1') > majority else '0' for column in zip(*hashes))
+
+    return int(bits, 2)
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count('1')
+
+
+class NearDuplicateIndex:
+    """Remembers the insights of recent posts and finds them again for posts whose SimHash is within a distance
+
+    Fingerprints are split in max_distance + 1 bands, two fingerprints within max_distance bits of each other
+    share at least one identical band, so only the posts in the matching bands are compared.
+    """
+
+    def __init__(self, max_distance: int = 3, window_seconds: float = 900, max_entries: int = 5000,
+                 clock: Callable[[], float] = time.time):
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.bands = max_distance + 1
+        self.band_width = FINGERPRINT_BITS // self.bands
+        self.entries = OrderedDict()  # fingerprint -> (inserted_at, {kind: value})
+        self.band_tables: List[Dict[int, set]] = [{} for _ in range(self.bands)]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def band_values(self, fingerprint: int) -> List[int]:
+        mask = (1 << self.band_width) - 1
+        return [(fingerprint >> (band * self.band_width)) & mask for band in range(self.bands)]
+
+    def evict(self):
+        oldest_allowed = self.clock() - self.window_seconds
+        while self.entries:
+            fingerprint, (inserted_at, _) = next(iter(self.entries.items()))
+            if inserted_at > oldest_allowed and len(self.entries) <= self.max_entries:
+                break
+            del self.entries[fingerprint]
+            for band_table, band_value in zip(self.band_tables, self.band_values(fingerprint)):
+                band_fingerprints = band_table.get(band_value)
+                band_fingerprints.discard(fingerprint)
+                if not band_fingerprints:
+                    del band_table[band_value]
+            self.evictions += 1
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        best, best_distance = None, self.max_distance + 1
+        for band_table, band_value in zip(self.band_tables, self.band_values(fingerprint)):
+            for candidate in band_table.get(band_value, ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best
+
+    def get(self, kind: str, text: str):
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return None
+        with self.lock:
+            self.evict()
+            match = self.find(fingerprint)
+            value = self.entries[match][1].get(kind) if match is not None else None
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, kind: str, text: str, value):
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry is None:
+                # Time based eviction keeps the insertion time of the first post with this fingerprint
+                entry = (self.clock(), {})
+                self.entries[fingerprint] = entry
+                for band_table, band_value in zip(self.band_tables, self.band_values(fingerprint)):
+                    band_table.setdefault(band_value, set()).add(fingerprint)
+            entry[1][kind] = value
+            self.evict()
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries)}
@@ -20,6 +20,20 @@ class TopicMatch(BaseModel):
     is_match: bool = Field(description="true if the text matches one of your topics of interest, false otherwise")
 
 
+class IndexedTopicMatch(TopicMatch):
+    """Information regarding the match of a topic for one of the texts in a batch"""
+    index: int = Field(description="The index of the text this classification belongs to")
+
+
+class BatchTopicMatch(BaseModel):
+    """Information regarding the match of a topic for each text in a numbered batch of texts"""
+    matches: List[IndexedTopicMatch] = Field(description="One classification per input text, identified by the index of the text")
+
+
+class TopicMatchWithInformation(ExtractedInformation, TopicMatch):
+    """Information regarding the match of a topic and, only when the text matches, the information extracted from it"""
+
+
 class TextWithInsights(ExtractedInformation):
     """A text with its extracted insights"""
     text: str = Field(description="The original text as written by the user")
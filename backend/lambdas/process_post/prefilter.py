@@ -0,0 +1,136 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import json
+import math
+import random
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+from text_preprocessing import TweetPreprocessor
+
+STOP_WORDS = {'and', 'or', 'the', 'of', 'a', 'an', 'in', 'to', 'for', 'y', 'o', 'el', 'la', 'los', 'las', 'de', 'en'}
+
+
+class TopicPrefilter:
+    """Hashed word n-gram logistic regression that estimates whether a text matches any of the topics of interest"""
+
+    def __init__(self, weights: Dict[int, float], bias: float, n_features: int = 2 ** 18):
+        self.weights = weights
+        self.bias = bias
+        self.n_features = n_features
+
+    def features(self, text: str) -> List[int]:
+        words = TweetPreprocessor.normalize(text).split()
+        ngrams = words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+        return [zlib.crc32(ngram.encode('utf-8')) % self.n_features for ngram in ngrams]
+
+    def score(self, text: str) -> float:
+        logit = self.bias + sum(self.weights.get(feature, 0.0) for feature in self.features(text))
+        return 1 / (1 + math.exp(-max(min(logit, 30), -30)))
+
+    def train(self, examples: Iterable[Tuple[str, bool]], epochs: int = 5, learning_rate: float = 0.1,
+              l2: float = 1e-4, seed: int = 0):
+        examples = [(self.features(text), 1.0 if is_match else 0.0) for text, is_match in examples]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            for features, label in examples:
+                logit = self.bias + sum(self.weights.get(feature, 0.0) for feature in features)
+                error = label - 1 / (1 + math.exp(-max(min(logit, 30), -30)))
+                self.bias += learning_rate * error
+                for feature in features:
+                    weight = self.weights.get(feature, 0.0)
+                    self.weights[feature] = weight + learning_rate * (error - l2 * weight)
+
+    @classmethod
+    def from_labels(cls, labels: str, keyword_weight: float = 3.0, bias: float = -1.5) -> 'TopicPrefilter':
+        """Seeds a model that only trusts the words of the labels, used until there are outcomes to train on"""
+        prefilter = cls({}, bias)
+        for word in TweetPreprocessor.normalize(labels).split():
+            if word not in STOP_WORDS:
+                for feature in prefilter.features(word):
+                    prefilter.weights[feature] = keyword_weight
+        return prefilter
+
+    @classmethod
+    def load(cls, path: str) -> 'TopicPrefilter':
+        with open(path) as model_file:
+            model = json.load(model_file)
+        return cls({int(feature): weight for feature, weight in model['weights'].items()}, model['bias'],
+                   model['n_features'])
+
+    def save(self, path: str):
+        with open(path, 'w') as model_file:
+            json.dump({'n_features': self.n_features, 'bias': self.bias,
+                       'weights': {str(feature): round(weight, 6) for feature, weight in self.weights.items()
+                                   if abs(weight) > 1e-6}}, model_file)
+
+
+class ShadowStats:
+    """Agreement between the prefilter decisions and the topic match of the model"""
+
+    def __init__(self):
+        self.decisions = 0
+        self.would_drop = 0
+        self.agreements = 0
+        self.dropped_matches = 0
+
+    def record(self, would_drop: bool, is_match: bool):
+        self.decisions += 1
+        self.would_drop += would_drop
+        self.agreements += would_drop != is_match
+        self.dropped_matches += would_drop and is_match
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'decisions': self.decisions,
+            'would_drop': self.would_drop,
+            'dropped_matches': self.dropped_matches,
+            'agreement_rate': self.agreements / self.decisions if self.decisions else 0.0,
+        }
+
+
+def read_outcomes(path: str) -> List[Tuple[str, bool]]:
+    """Reads JSON lines with text and is_match keys
+
+    Lines can also be the log records of process_post in shadow mode, where the outcome is under
+    message.prefilter_shadow. Other log records are skipped.
+    """
+
+    outcomes = []
+
+    with open(path, encoding='utf-8') as outcomes_file:
+        for line in outcomes_file:
+            if not line.strip():
+                continue
+            outcome = json.loads(line)
+            message = outcome.get('message')
+            if isinstance(message, dict) and 'prefilter_shadow' in message:
+                outcome = message['prefilter_shadow']
+            if 'text' in outcome and 'is_match' in outcome:
+                outcomes.append((outcome['text'], outcome['is_match']))
+
+    return outcomes
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Train the topic prefilter on past topic match outcomes')
+    parser.add_argument('outcomes', type=str, help='JSON lines file with text and is_match keys, or the shadow mode logs of process_post')
+    parser.add_argument('model', type=str, help='Path where the trained model is written')
+    parser.add_argument('--labels', type=str, required=True, help='The same LABELS used by process_post')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    outcomes = read_outcomes(args.outcomes)
+    prefilter = TopicPrefilter.from_labels(args.labels)
+    prefilter.train(outcomes, epochs=args.epochs)
+    prefilter.save(args.model)
+
+    stats = ShadowStats()
+    for text, is_match in outcomes:
+        stats.record(prefilter.score(text) < args.threshold, is_match)
+    print(f'Training set: {stats.as_dict()}')
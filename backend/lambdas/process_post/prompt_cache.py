@@ -0,0 +1,150 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import hashlib
+import io
+import json
+import threading
+from typing import Any, Dict
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+# Models that accept cache checkpoints (cache_control) in InvokeModel requests
+PROMPT_CACHING_MODELS = (
+    'anthropic.claude-3-5-haiku',
+    'anthropic.claude-3-7-sonnet',
+    'anthropic.claude-sonnet-4',
+    'anthropic.claude-opus-4',
+)
+
+CACHE_CHECKPOINT = {'type': 'ephemeral'}
+
+# Cache checkpoint of the Converse API, a content block of its own
+CACHE_POINT_BLOCK = {'cachePoint': {'type': 'default'}}
+
+# Token usage names of the Converse API and the InvokeModel names they are recorded as
+CONVERSE_USAGE = {
+    'inputTokens': 'input_tokens',
+    'cacheReadInputTokens': 'cache_read_input_tokens',
+    'cacheWriteInputTokens': 'cache_creation_input_tokens',
+    'outputTokens': 'output_tokens',
+}
+
+
+def supports_prompt_caching(model_id: str) -> bool:
+    return any(model in model_id for model in PROMPT_CACHING_MODELS)
+
+
+def mark_cacheable_prefix(body: Dict[str, Any], cache_messages: bool) -> Dict[str, Any]:
+    """Adds cache checkpoints after the system prompt and, if cache_messages, after the messages before the last one
+
+    Everything up to a checkpoint (tools, system prompt, few-shot examples) must be byte for byte identical between
+    calls for the cache to be hit, only the last user message carries the text of the post.
+    """
+
+    if isinstance(body.get('system'), str):
+        body['system'] = [{'type': 'text', 'text': body['system'], 'cache_control': CACHE_CHECKPOINT}]
+
+    messages = body.get('messages', [])
+
+    if cache_messages and len(messages) > 1:
+        prefix_message = messages[-2]
+        if isinstance(prefix_message['content'], str):
+            prefix_message['content'] = [{'type': 'text', 'text': prefix_message['content']}]
+        prefix_message['content'][-1]['cache_control'] = CACHE_CHECKPOINT
+
+    return body
+
+
+def mark_cacheable_converse_prefix(request: Dict[str, Any], cache_messages: bool) -> Dict[str, Any]:
+    """Same checkpoints as mark_cacheable_prefix for a Converse request"""
+
+    request['system'] = request.get('system', []) + [CACHE_POINT_BLOCK]
+
+    messages = request.get('messages', [])
+
+    if cache_messages and len(messages) > 1:
+        prefix_message = {**messages[-2], 'content': messages[-2]['content'] + [CACHE_POINT_BLOCK]}
+        request['messages'] = messages[:-2] + [prefix_message, messages[-1]]
+
+    return request
+
+
+def prefix_fingerprint(body: Dict[str, Any], include_messages: bool = True) -> str:
+    """Hash of everything in the request up to the last cache checkpoint"""
+    prefix = {key: value for key, value in body.items() if key != 'messages'}
+    prefix['messages'] = body.get('messages', [])[:-1] if include_messages else []
+    return hashlib.sha256(json.dumps(prefix, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class UsageRecorder:
+    """Input tokens read from the prompt cache, written to it and not cached, per call and in total"""
+
+    def __init__(self):
+        self.calls = 0
+        self.totals = {'input_tokens': 0, 'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0,
+                       'output_tokens': 0}
+        self.prefix_fingerprints = set()
+        self.lock = threading.Lock()
+
+    def record(self, usage: Dict[str, int], fingerprint: str) -> Dict[str, Any]:
+        call_usage = {name: int(usage.get(name) or 0) for name in self.totals}
+        with self.lock:
+            self.calls += 1
+            self.prefix_fingerprints.add(fingerprint)
+            for name, tokens in call_usage.items():
+                self.totals[name] += tokens
+        return {**call_usage, 'prefix_fingerprint': fingerprint[:16]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {'calls': self.calls, **self.totals, 'distinct_prefixes': len(self.prefix_fingerprints)}
+
+
+class PromptCachingClient:
+    """Wraps the bedrock-runtime client, marking the static prompt prefix as cacheable and recording token usage"""
+
+    def __init__(self, client, mark_cacheable: bool, cache_messages: bool):
+        self.client = client
+        self.mark_cacheable = mark_cacheable
+        self.cache_messages = cache_messages
+        self.usage = UsageRecorder()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def invoke_model(self, **kwargs):
+
+        body = json.loads(kwargs['body'])
+        fingerprint = prefix_fingerprint(body, self.cache_messages)
+
+        if self.mark_cacheable:
+            kwargs['body'] = json.dumps(mark_cacheable_prefix(body, self.cache_messages))
+
+        response = self.client.invoke_model(**kwargs)
+
+        # The streaming body can only be read once, it is replaced by an in memory copy for the caller
+        payload = response['body'].read()
+        response['body'] = io.BytesIO(payload)
+
+        try:
+            logger.info({'model_usage': self.usage.record(json.loads(payload).get('usage', {}), fingerprint)})
+        except ValueError:
+            pass
+
+        return response
+
+    def converse(self, **kwargs):
+
+        fingerprint = prefix_fingerprint(kwargs, self.cache_messages)
+
+        if self.mark_cacheable:
+            kwargs = mark_cacheable_converse_prefix(dict(kwargs), self.cache_messages)
+
+        response = self.client.converse(**kwargs)
+
+        usage = {name: response.get('usage', {}).get(converse_name) for converse_name, name in CONVERSE_USAGE.items()}
+        logger.info({'model_usage': self.usage.record(usage, fingerprint)})
+
+        return response
@@ -1,13 +1,69 @@
-from langchain.chains.prompt_selector import ConditionalPromptSelector
-
-from langchain_core.prompts.chat import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate, \
-    AIMessagePromptTemplate
-from langchain_core.prompts.few_shot import FewShotChatMessagePromptTemplate
+import functools
+import os
 
 from examples.examples_eng import examples_eng
 from examples.examples_es import examples_es
 
-from typing import Callable
+from typing import Callable, Dict, List, NamedTuple, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.prompts.chat import ChatPromptTemplate
+    from langchain_core.prompts.few_shot import FewShotChatMessagePromptTemplate
+
+# Number of few-shot examples most similar to the text sent with every extraction, 0 sends all of them
+FEW_SHOT_K = int(os.environ.get('FEW_SHOT_K', '0'))
+# Maximum estimated tokens of the selected few-shot examples, 0 for no limit
+FEW_SHOT_TOKEN_BUDGET = int(os.environ.get('FEW_SHOT_TOKEN_BUDGET', '0'))
+
+EXAMPLES = {
+    'en': examples_eng,
+    'es': examples_es,
+}
+
+
+def selects_examples() -> bool:
+    return FEW_SHOT_K > 0 or FEW_SHOT_TOKEN_BUDGET > 0
+
+
+@functools.lru_cache(maxsize=None)
+def get_example_selector(examples_language: str):
+    """Example selector over the examples of the language, indexed once and shared by every prompt using them"""
+    from example_selector import HashedNgramExampleSelector
+
+    examples = EXAMPLES[examples_language]
+    return HashedNgramExampleSelector(examples, FEW_SHOT_K or len(examples), FEW_SHOT_TOKEN_BUDGET)
+
+
+def get_examples(examples_language: str, text: str) -> List[Dict[str, str]]:
+    """Few-shot examples sent with the text, all of them unless they are selected per text"""
+    if selects_examples():
+        return get_example_selector(examples_language).select_examples({"text": text})
+    return EXAMPLES[examples_language]
+
+
+@functools.lru_cache(maxsize=None)
+def get_few_shot_prompt(examples_language: str) -> 'FewShotChatMessagePromptTemplate':
+    from langchain_core.prompts.chat import AIMessagePromptTemplate, ChatPromptTemplate, HumanMessagePromptTemplate
+    from langchain_core.prompts.few_shot import FewShotChatMessagePromptTemplate
+
+    example_prompt = ChatPromptTemplate.from_messages(
+        [
+            HumanMessagePromptTemplate.from_template("{text}", input_variables=["text"], validate_template=True),
+            AIMessagePromptTemplate.from_template("{extraction}", input_variables=["extraction"],
+                                                  validate_template=True)
+        ]
+    )
+
+    if selects_examples():
+        return FewShotChatMessagePromptTemplate(
+            example_prompt=example_prompt,
+            example_selector=get_example_selector(examples_language),
+            input_variables=["text"],
+        )
+    return FewShotChatMessagePromptTemplate(
+        example_prompt=example_prompt,
+        examples=EXAMPLES[examples_language],
+    )
 
 # ANTHROPIC CLAUDE 3 PROMPT TEMPLATES
 
@@ -54,28 +110,45 @@ Classify the following text into one or more categories of your interest:
 {text}
 """
 
-examples_prompt_template_eng = ChatPromptTemplate.from_messages(
-    [
-        HumanMessagePromptTemplate.from_template("{text}", input_variables=["text"], validate_template=True),
-        AIMessagePromptTemplate.from_template("{extraction}", input_variables=["extraction"], validate_template=True)
-    ]
-)
-
-few_shot_chat_prompt_eng = FewShotChatMessagePromptTemplate(
-    example_prompt=examples_prompt_template_eng,
-    examples=examples_eng,
-)
-
-CLAUDE_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_EN = ChatPromptTemplate.from_messages([
-    SystemMessagePromptTemplate.from_template(claude_information_extraction_system_prompt_en, input_variables=["sentiments"], validate_template=True),
-    few_shot_chat_prompt_eng,
-    HumanMessagePromptTemplate.from_template(claude_information_extraction_user_prompt_en, input_variables=["text"], validate_template=True),
-])
-
-CLAUDE_TOPIC_MATCH_PROMPT_TEMPLATE_EN = ChatPromptTemplate.from_messages([
-    SystemMessagePromptTemplate.from_template(claude_topic_match_system_prompt_en, input_variables=["meta_topics"], validate_template=True),
-    HumanMessagePromptTemplate.from_template(claude_topic_match_user_prompt_en, input_variables=["text"], validate_template=True),
-])
+claude_batch_topic_match_user_prompt_en = """
+Classify each of the following texts into one or more categories of your interest. Every text is enclosed in a <text> tag \
+with its index, return exactly one classification per text using that same index:
+
+{texts}
+"""
+
+claude_fused_system_prompt_en = """
+You are a highly accurate text classification and information extraction system. Your first task is to classify text into one \
+or more categories. Even though you can classify text in any category for this task you are only interested in classifying the \
+text in some of the topics listed below:
+
+<meta_topics>
+{meta_topics}
+</meta_topics>
+
+Here are some rules for the text classification you will perform:
+
+- You should not be forced to classify the text in any of the existing categories, its ok if you cant fit a text into the topics of interest
+- Only classify a text into a category if you are really sure it belongs to it
+- Use only the categories in the <meta_topics> list for your classification
+- You may classify a text in any number of topics (including zero) but your result must always be a list (even if its empty)
+- You can classify text in multiple categories at once
+
+Only when the text matches one of your topics of interest your second task is to extract key information from it. Here are \
+some basic rules for this task:
+
+- You must classify the sentiment of the text in one of the following: {sentiments}
+- NEVER fill a value of your own for entries where you are unsure of and rather use default values
+- If the text does not match any of your topics of interest leave all the extraction fields empty
+
+You can reason about your tasks, take your time to think.
+"""
+
+claude_fused_user_prompt_en = """
+Classify the following text into one or more categories of your interest and, if it matches, extract its information:
+
+{text}
+"""
 
 # Spanish Prompts
 
@@ -121,31 +194,70 @@ Clasifica el siguiente texto en una o mas categorias de tu interes:
 {text}
 """
 
-examples_prompt_template_es = ChatPromptTemplate.from_messages(
-    [
-        HumanMessagePromptTemplate.from_template("{text}", input_variables=["text"], validate_template=True),
-        AIMessagePromptTemplate.from_template("{extraction}", input_variables=["extraction"], validate_template=True)
-    ]
-)
-
-few_shot_chat_prompt_es = FewShotChatMessagePromptTemplate(
-    example_prompt=examples_prompt_template_es,
-    examples=examples_es,
-)
-
-CLAUDE_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_ES = ChatPromptTemplate.from_messages([
-    SystemMessagePromptTemplate.from_template(claude_information_extraction_system_prompt_es, input_variables=["sentiments"], validate_template=True),
-    few_shot_chat_prompt_eng,
-    HumanMessagePromptTemplate.from_template(claude_information_extraction_user_prompt_es,
-                                             input_variables=["text"], validate_template=True),
-])
-
-CLAUDE_TOPIC_MATCH_PROMPT_TEMPLATE_ES = ChatPromptTemplate.from_messages([
-    SystemMessagePromptTemplate.from_template(claude_topic_match_system_prompt_es, input_variables=["meta_topics"],
-                                              validate_template=True),
-    HumanMessagePromptTemplate.from_template(claude_topic_match_user_prompt_es, input_variables=["text"],
-                                             validate_template=True),
-])
+claude_batch_topic_match_user_prompt_es = """
+Clasifica cada uno de los siguientes textos en una o mas categorias de tu interes. Cada texto esta contenido en una etiqueta \
+<text> con su indice, regresa exactamente una clasificacion por texto usando ese mismo indice:
+
+{texts}
+"""
+
+claude_fused_system_prompt_es = """
+Eres un sistema de clasificacion de texto y extraccion de informacion altamente preciso. Tu primera tarea es clasificar texto \
+en una o mas categorias. Aunque eres capaz de clasificar texto en cualquier categoria para esta tarea solo estas interesado en \
+clasificar el texto en algunas de las categorias listadas aqui:
+
+<meta_topics>
+{meta_topics}
+</meta_topics>
+
+Aqui hay algunas reglas para la clasificacion de texto que vas a realizar:
+
+- No te debes ver forzado a clasificar el texto en ninguna de las categorias existentes, esta bien si no puedes clasificar el texto en ninguno de los temas de interes
+- Solo clasifica el texto en una categoria si estas completamente seguro que pertenece a esa categoria
+- Usa solo las categorias en la lista <meta_topics> para tu clasificacion
+- Puedes clasificar el texto en cualquier numero de categorias (incluso cero) pero tu respuesta siempre debe ser una lista (aunque sea una lista vacia)
+- Puedes clasificar el texto en multiples categorias a la vez
+
+Solo cuando el texto pertenece a alguna de las categorias de tu interes tu segunda tarea es extraer informacion clave del \
+texto. Estas son algunas reglas basicas que debes seguir:
+
+- Debes clasificar el sentimiento en uno de los siguientes: {sentiments}
+- NUNCA acompletes un valor del cual no estas seguro con valores tuyos, en su lugar emplea los valores por defecto para cada campo
+- Si el texto no pertenece a ninguna de las categorias de tu interes deja vacios todos los campos de extraccion
+
+Puedes razonar sobre tus tareas, tomate tu tiempo para pensar.
+"""
+
+claude_fused_user_prompt_es = """
+Clasifica el siguiente texto en una o mas categorias de tu interes y, si pertenece a alguna, extrae su informacion:
+
+{text}
+"""
+
+
+class PromptSpec(NamedTuple):
+    """Templates of a prompt: the system message, the language of its few-shot examples if any and the user message"""
+    system: str
+    examples_language: Optional[str]
+    user: str
+
+
+# The few-shot examples only show the extraction fields, the fused prompt is sent without them so that the model is not
+# shown outputs without the topic match fields that TopicMatchWithInformation requires
+PROMPT_SPECS = {
+    ('information_extraction', 'en'): PromptSpec(claude_information_extraction_system_prompt_en, 'en',
+                                                 claude_information_extraction_user_prompt_en),
+    ('topic_match', 'en'): PromptSpec(claude_topic_match_system_prompt_en, None, claude_topic_match_user_prompt_en),
+    ('batch_topic_match', 'en'): PromptSpec(claude_topic_match_system_prompt_en, None,
+                                            claude_batch_topic_match_user_prompt_en),
+    ('fused', 'en'): PromptSpec(claude_fused_system_prompt_en, None, claude_fused_user_prompt_en),
+    ('information_extraction', 'es'): PromptSpec(claude_information_extraction_system_prompt_es, 'en',
+                                                 claude_information_extraction_user_prompt_es),
+    ('topic_match', 'es'): PromptSpec(claude_topic_match_system_prompt_es, None, claude_topic_match_user_prompt_es),
+    ('batch_topic_match', 'es'): PromptSpec(claude_topic_match_system_prompt_es, None,
+                                            claude_batch_topic_match_user_prompt_es),
+    ('fused', 'es'): PromptSpec(claude_fused_system_prompt_es, None, claude_fused_user_prompt_es),
+}
 
 
 def is_es(language: str) -> bool:
@@ -168,19 +280,22 @@ def is_en_claude(language: str) -> Callable[[str], bool]:
     return lambda model_id: is_en(language) and is_claude(model_id)
 
 
-def get_information_extraction_prompt_selector(lang: str) -> ConditionalPromptSelector:
-    return ConditionalPromptSelector(
-        default_prompt=CLAUDE_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_EN,
-        conditionals=[
-            (is_es_claude(lang), CLAUDE_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_ES),
-        ]
-    )
+def get_prompt_spec(kind: str, lang: str, model_id: str) -> PromptSpec:
+    """Spanish prompts are used with Claude models when the language is Spanish, English prompts otherwise"""
+    return PROMPT_SPECS[(kind, 'es' if is_es_claude(lang)(model_id) else 'en')]
 
 
-def get_topic_match_prompt_selector(lang: str) -> ConditionalPromptSelector:
-    return ConditionalPromptSelector(
-        default_prompt=CLAUDE_TOPIC_MATCH_PROMPT_TEMPLATE_EN,
-        conditionals=[
-            (is_es_claude(lang), CLAUDE_TOPIC_MATCH_PROMPT_TEMPLATE_ES)
-        ]
-    )
\ No newline at end of file
+@functools.lru_cache(maxsize=None)
+def get_chat_prompt(kind: str, lang: str, model_id: str) -> 'ChatPromptTemplate':
+    """ChatPromptTemplate of the prompt, built on first use so that only the prompts of the language in use are built"""
+    from langchain_core.prompts.chat import ChatPromptTemplate, HumanMessagePromptTemplate, \
+        SystemMessagePromptTemplate
+
+    spec = get_prompt_spec(kind, lang, model_id)
+
+    messages = [SystemMessagePromptTemplate.from_template(spec.system, validate_template=True)]
+    if spec.examples_language is not None:
+        messages.append(get_few_shot_prompt(spec.examples_language))
+    messages.append(HumanMessagePromptTemplate.from_template(spec.user, validate_template=True))
+
+    return ChatPromptTemplate.from_messages(messages)
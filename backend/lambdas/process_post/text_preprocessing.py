@@ -44,6 +44,16 @@ class TweetPreprocessor:
         tweet = ' '.join(tweet.split())  # Remove extra spaces
         return tweet.strip()
 
+    @staticmethod
+    def normalize(tweet):
+        """Takes a string and reduces it to its words so that retweets, mentions, links and emojis are ignored"""
+        tweet = TweetPreprocessor.remove_users(tweet)
+        tweet = TweetPreprocessor.remove_av(tweet)
+        tweet = TweetPreprocessor.remove_links(tweet.lower())
+        tweet = re.sub(r'^rt\b', '', tweet.strip())  # remove a bare retweet marker
+        tweet = re.sub(r'[^\w\s]|_', ' ', tweet)  # remove punctuation and symbols
+        return ' '.join(tweet.split())
+
     @staticmethod
     def get_hash_tags(tweet):
         return re.findall(r"#(\w+)", tweet)
\ No newline at end of file
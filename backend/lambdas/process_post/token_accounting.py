@@ -0,0 +1,46 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from typing import Dict
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts.chat import ChatPromptTemplate
+from langchain_core.prompts.few_shot import FewShotChatMessagePromptTemplate
+
+# Claude tokenizes English prose at roughly four characters per token, good enough to compare prompt sections
+CHARACTERS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, round(len(text) / CHARACTERS_PER_TOKEN)) if text else 0
+
+
+def message_tokens(message: BaseMessage) -> int:
+    if isinstance(message.content, str):
+        return estimate_tokens(message.content)
+    return sum(estimate_tokens(block.get('text', '')) for block in message.content if isinstance(block, dict))
+
+
+def prompt_token_report(prompt: ChatPromptTemplate, values: Dict[str, str]) -> Dict[str, int]:
+    """Estimated input tokens of every section of the prompt (system, few_shot, user) once formatted with values"""
+
+    report = {'system': 0, 'few_shot': 0, 'few_shot_examples': 0, 'user': 0}
+
+    for message in prompt.messages:
+
+        if isinstance(message, BaseMessage):
+            messages = [message]
+        else:
+            messages = message.format_messages(**{name: values[name] for name in message.input_variables})
+
+        if isinstance(message, FewShotChatMessagePromptTemplate):
+            report['few_shot'] += sum(message_tokens(example_message) for example_message in messages)
+            report['few_shot_examples'] += len(messages) // 2
+        elif messages and messages[0].type == 'system':
+            report['system'] += sum(message_tokens(system_message) for system_message in messages)
+        else:
+            report['user'] += sum(message_tokens(user_message) for user_message in messages)
+
+    report['total'] = report['system'] + report['few_shot'] + report['user']
+
+    return report
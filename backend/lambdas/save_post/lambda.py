@@ -5,17 +5,33 @@ import boto3
 import os
 import logging
 import datetime
-import uuid
-import io
-import json
-import jsonlines
+
+from output_formats import get_output_format
+from partitions import check_interval, partition_name
+from s3_writer import BufferedS3Writer, LocalFileSystemClient
 
 logging.getLogger().setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
-s3 = boto3.client('s3')
+
+# Objects are written below a local directory instead of S3 when LOCAL_S3_ROOT is set
+s3 = LocalFileSystemClient(os.environ['LOCAL_S3_ROOT']) if os.environ.get('LOCAL_S3_ROOT') else boto3.client('s3')
+
+# Must match projection.partition_timestamp.interval of the Glue tables, one day unless configured
+PARTITION_INTERVAL_MINUTES = check_interval(int(os.environ.get('PARTITION_INTERVAL_MINUTES', '1440')))
+
+# Records are buffered per table and partition and written as a single object
+writer = BufferedS3Writer(
+    s3,
+    os.environ['POSTS_BUCKET'],
+    max_bytes=int(os.environ.get('WRITER_MAX_BYTES', str(8 * 1024 * 1024))),
+    max_records=int(os.environ.get('WRITER_MAX_RECORDS', '5000')),
+    max_age_seconds=float(os.environ.get('WRITER_MAX_AGE_SECONDS', '60')),
+    # json (JSON lines) or parquet, must match the format of the Glue tables
+    output_format=get_output_format(os.environ.get('OUTPUT_FORMAT', 'json'),
+                                    os.environ.get('PARQUET_COMPRESSION', 'snappy')),
+)
 
 
 def create_multi_records(insights, key, dest_key):
-    items = io.StringIO()
     item = {}
 
     item['created_at'] = insights['created_at']
@@ -33,21 +49,17 @@ def create_multi_records(insights, key, dest_key):
             item['longitude'] = insights['longitude']
             item['latitude'] = insights['latitude']
 
-    # Write as JSON lines so that Athena can read them
-    with jsonlines.Writer(items) as writer:
-        for insights_key in insights[key]:
-            if key == 'meta_topics':
-                item[dest_key] = insights_key.lower().strip()
-            else:
-                item[dest_key] = insights_key
-            writer.write(item)
+    records = []
+    for insights_key in insights[key]:
+        if key == 'meta_topics':
+            records.append({**item, dest_key: insights_key.lower().strip()})
+        else:
+            records.append({**item, dest_key: insights_key})
 
-    return items.getvalue()
+    return records
 
 
-def handler(event, context):
-
-    item = event
+def save_item(item):
 
     utc_now = datetime.datetime.now(datetime.timezone.utc)
     item['timestamp'] = utc_now.strftime('%Y-%m-%d %H:%M:%S.%f')
@@ -62,22 +74,21 @@ def handler(event, context):
     logging.info(item)
 
     #Retrive objects 1:N
-    phrases_json_lines = create_multi_records(item, key='keyphrases', dest_key='phrase')
-    meta_topics_json_lines = create_multi_records(item, key='meta_topics', dest_key='topic')
-    links_json_lines = create_multi_records(item, key='links', dest_key='link')
+    phrases = create_multi_records(item, key='keyphrases', dest_key='phrase')
+    meta_topics = create_multi_records(item, key='meta_topics', dest_key='topic')
+    links = create_multi_records(item, key='links', dest_key='link')
 
     # Create partition key for S3
-    partition_timestamp = datetime.datetime(created_at.year, created_at.month, created_at.day, 0, 0, 0)
-    key = f"{partition_timestamp.strftime('%Y-%m-%d %H:%M:%S')}/{str(uuid.uuid1())}.json"
+    partition = partition_name(created_at, PARTITION_INTERVAL_MINUTES)
 
     logging.info('Key phrases')
-    logging.info(phrases_json_lines)
+    logging.info(phrases)
 
     logging.info('Meta topics')
-    logging.info(meta_topics_json_lines)
+    logging.info(meta_topics)
 
     logging.info('Links')
-    logging.info(links_json_lines)
+    logging.info(links)
 
     # Save item
     if item['process_location']:
@@ -91,36 +102,36 @@ def handler(event, context):
                 'model': item['model_id'], 'sentiment': item['sentiment'].lower().strip(), 'timestamp': item['timestamp'],
                 'count': item['count']}
 
-    s3.put_object(
-        Body=json.dumps(post, ensure_ascii=False),
-        Bucket=os.environ['POSTS_BUCKET'],
-        Key='posts/' + key
-    )
-
-    # Save 1:N objectsº
-
-    if phrases_json_lines:
-        # Save key phrases
-        s3.put_object(
-            Body=phrases_json_lines,
-            Bucket=os.environ['POSTS_BUCKET'],
-            Key='phrases/' + key
-        )
-
-    if meta_topics_json_lines:
-        # Save meta topics
-        s3.put_object(
-            Body=meta_topics_json_lines,
-            Bucket=os.environ['POSTS_BUCKET'],
-            Key='topics/' + key
-        )
-
-    if links_json_lines:
-        # Save links
-        s3.put_object(
-            Body=links_json_lines,
-            Bucket=os.environ['POSTS_BUCKET'],
-            Key='links/' + key
-        )
+    writer.write('posts', partition, [post])
+
+    # Save 1:N objects
+    writer.write('phrases', partition, phrases)
+    writer.write('topics', partition, meta_topics)
+    writer.write('links', partition, links)
+
+
+def handler(event, context):
+
+    # A batch of posts is written as one object per table and partition
+    if 'posts' in event:
+        items = [item for item in event['posts'] if item.get('process_post') and 'error' not in item]
+    else:
+        items = [event]
+
+    try:
+        for item in items:
+            save_item(item)
+
+        # The execution environment may be frozen or shut down after returning, nothing is left buffered
+        writer.flush()
+    except Exception:
+        # The retry of the invocation writes every record again, none is left for the next invocation
+        writer.discard()
+        raise
+
+    logging.info(writer.stats())
+
+    if 'posts' in event:
+        return {'success': True, 'saved': len(items)}
 
     return {'success': True}
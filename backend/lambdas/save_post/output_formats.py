@@ -0,0 +1,87 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import io
+
+import jsonlines
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Columns of the Glue tables in template.yaml, the partition_timestamp key is part of the object key only
+TABLE_COLUMNS = {
+    'posts': [('longitude', 'double'), ('latitude', 'double'), ('location', 'string'), ('topic', 'string'),
+              ('sentiment', 'string'), ('created_at', 'timestamp'), ('model', 'string'), ('notification', 'boolean'),
+              ('timestamp', 'timestamp'), ('text', 'string'), ('text_clean', 'string'), ('user', 'string'),
+              ('source', 'string'), ('count', 'tinyint'), ('platform', 'string')],
+    'phrases': [('created_at', 'timestamp'), ('timestamp', 'timestamp'), ('text_clean', 'string'), ('user', 'string'),
+                ('platform', 'string'), ('phrase', 'string'), ('count', 'tinyint')],
+    'topics': [('created_at', 'timestamp'), ('timestamp', 'timestamp'), ('text_clean', 'string'), ('user', 'string'),
+               ('platform', 'string'), ('topic', 'string'), ('sentiment', 'string'), ('longitude', 'double'),
+               ('latitude', 'double'), ('location', 'string'), ('count', 'tinyint')],
+    'links': [('created_at', 'timestamp'), ('timestamp', 'timestamp'), ('text_clean', 'string'), ('user', 'string'),
+              ('platform', 'string'), ('link', 'string'), ('count', 'tinyint')],
+}
+
+
+class JsonLinesFormat:
+    """One JSON document per line, read by the Glue tables with the Hive JsonSerDe"""
+
+    extension = 'json'
+
+    def encode(self, table: str, records: list) -> bytes:
+        lines = io.StringIO()
+        with jsonlines.Writer(lines) as writer:
+            writer.write_all(records)
+        return lines.getvalue().encode('utf-8')
+
+
+class ParquetFormat:
+    """Compressed Parquet with the explicit column types of the Glue tables"""
+
+    extension = 'parquet'
+
+    def __init__(self, compression: str = 'snappy'):
+        # pyarrow is only imported when Parquet output is enabled, it is deployed as a layer in that case only
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.compression = compression
+
+        # Microseconds, as in TIMESTAMP_FORMAT and the JSON output
+        types = {'string': pyarrow.string(), 'double': pyarrow.float64(), 'boolean': pyarrow.bool_(),
+                 'tinyint': pyarrow.int8(), 'timestamp': pyarrow.timestamp('us')}
+        self.schemas = {table: pyarrow.schema([(name, types[column_type]) for name, column_type in columns])
+                        for table, columns in TABLE_COLUMNS.items()}
+
+    @staticmethod
+    def parse_timestamp(value):
+        if value is None or isinstance(value, datetime.datetime):
+            return value
+        # Faster than strptime, TIMESTAMP_FORMAT is a valid ISO 8601 format
+        return datetime.datetime.fromisoformat(value)
+
+    def encode(self, table: str, records: list) -> bytes:
+
+        schema = self.schemas[table]
+        columns = {}
+
+        for field in schema:
+            values = [record.get(field.name) for record in records]
+            if self.pyarrow.types.is_timestamp(field.type):
+                values = [self.parse_timestamp(value) for value in values]
+            columns[field.name] = self.pyarrow.array(values, type=field.type)
+
+        output = io.BytesIO()
+        self.parquet.write_table(self.pyarrow.Table.from_pydict(columns, schema=schema), output,
+                                 compression=self.compression)
+
+        return output.getvalue()
+
+
+def get_output_format(name: str, compression: str = 'snappy'):
+    if name == 'parquet':
+        return ParquetFormat(compression)
+    return JsonLinesFormat()
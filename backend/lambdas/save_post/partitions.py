@@ -0,0 +1,44 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+from typing import List
+
+# Format of the partition_timestamp values in the object keys, see projection.partition_timestamp in template.yaml
+PARTITION_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Intervals that divide a day, so that partitions line up with the projection whatever day its range starts on
+PARTITION_INTERVALS_MINUTES = (1, 5, 10, 15, 30, 60, 120, 180, 240, 360, 720, 1440)
+
+
+def check_interval(interval_minutes: int) -> int:
+    if interval_minutes not in PARTITION_INTERVALS_MINUTES:
+        raise ValueError(f'The partition interval must be one of {PARTITION_INTERVALS_MINUTES} minutes, '
+                         f'got {interval_minutes}')
+    return interval_minutes
+
+
+def partition_timestamp(timestamp: datetime.datetime, interval_minutes: int) -> datetime.datetime:
+    """Start of the partition of the given interval that contains timestamp"""
+    midnight = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    minutes = (timestamp.hour * 60 + timestamp.minute) // interval_minutes * interval_minutes
+    return midnight + datetime.timedelta(minutes=minutes)
+
+
+def partition_name(timestamp: datetime.datetime, interval_minutes: int) -> str:
+    return partition_timestamp(timestamp, interval_minutes).strftime(PARTITION_FORMAT)
+
+
+def partition_prefixes(table: str, start: datetime.datetime, end: datetime.datetime,
+                       interval_minutes: int) -> List[str]:
+    """Prefixes read by a query on created_at between start and end (inclusive) after partition pruning"""
+
+    prefixes = []
+    current = partition_timestamp(start, interval_minutes)
+    step = datetime.timedelta(minutes=interval_minutes)
+
+    while current <= end:
+        prefixes.append(f'{table}/{current.strftime(PARTITION_FORMAT)}/')
+        current += step
+
+    return prefixes
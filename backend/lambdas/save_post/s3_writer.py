@@ -0,0 +1,145 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from output_formats import JsonLinesFormat
+
+
+class PartitionBuffer:
+    """Records of a single table and partition waiting to be written as one object"""
+
+    def __init__(self, created_at: float):
+        self.records = []
+        self.size = 0
+        self.created_at = created_at
+
+    def add(self, record: dict):
+        self.records.append(record)
+        # Approximated by the size of the record as JSON, whatever the output format
+        self.size += len(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class BufferedS3Writer:
+    """Accumulates records per table and partition and writes one object per table and partition
+
+    A buffer is written when it reaches max_bytes, max_records or max_age_seconds, or when flush() is called. Callers
+    flush before returning, as the execution environment may be frozen or shut down afterwards.
+
+    A failed write drops its records and raises, the invocation fails and its retry writes them again. Keeping them
+    buffered would write them twice, once by the retry and once by the next flush of the warm container.
+    """
+
+    def __init__(self, client, bucket: str, max_bytes: int = 8 * 1024 * 1024, max_records: int = 5000,
+                 max_age_seconds: float = 60, clock=time.monotonic, output_format=None):
+        self.client = client
+        self.bucket = bucket
+        self.output_format = output_format or JsonLinesFormat()
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self.buffers = {}
+        self.lock = threading.RLock()
+        self.objects_written = 0
+        self.records_written = 0
+        self.failed_writes = 0
+
+    def write(self, table: str, partition: str, records: list):
+
+        if not records:
+            return
+
+        with self.lock:
+            buffer = self.buffers.get((table, partition))
+            if buffer is None:
+                buffer = self.buffers[(table, partition)] = PartitionBuffer(self.clock())
+
+            for record in records:
+                buffer.add(record)
+
+            if len(buffer.records) >= self.max_records or buffer.size >= self.max_bytes:
+                self.flush_partition(table, partition)
+
+            self.flush_expired()
+
+    def flush_expired(self):
+        now = self.clock()
+        with self.lock:
+            for table, partition in [key for key, buffer in self.buffers.items()
+                                     if now - buffer.created_at >= self.max_age_seconds]:
+                self.flush_partition(table, partition)
+
+    def flush_partition(self, table: str, partition: str):
+
+        with self.lock:
+            buffer = self.buffers.pop((table, partition), None)
+            if buffer is None or not buffer.records:
+                return
+
+            key = f'{table}/{partition}/{uuid.uuid1()}.{self.output_format.extension}'
+
+            try:
+                body = self.output_format.encode(table, buffer.records)
+                self.client.put_object(Body=body, Bucket=self.bucket, Key=key)
+            except Exception:
+                self.failed_writes += 1
+                raise
+
+            self.objects_written += 1
+            self.records_written += len(buffer.records)
+            logging.info(f'Wrote {len(buffer.records)} records ({buffer.size} bytes) to {key}')
+
+    def flush(self):
+        """Writes every buffer, all of them are emptied even if a write fails and the first error is raised"""
+
+        error = None
+
+        with self.lock:
+            for table, partition in list(self.buffers):
+                try:
+                    self.flush_partition(table, partition)
+                except Exception as exception:
+                    logging.error(f'Unable to write {table}/{partition}: {exception}')
+                    error = error or exception
+
+        if error is not None:
+            raise error
+
+    def discard(self) -> int:
+        """Drops every buffered record, for invocations that fail and are retried"""
+        with self.lock:
+            discarded = sum(len(buffer.records) for buffer in self.buffers.values())
+            self.buffers.clear()
+        return discarded
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'objects_written': self.objects_written, 'records_written': self.records_written,
+                    'failed_writes': self.failed_writes, 'buffered_records': sum(len(buffer.records) for buffer in self.buffers.values())}
+
+
+class LocalFileSystemClient:
+    """Stand-in for the S3 client that writes objects below a local directory, used to run save_post locally"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put_object(self, Body, Bucket, Key):
+        path = os.path.join(self.root, Bucket, *Key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so that readers never see partial objects
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as object_file:
+            object_file.write(Body.encode('utf-8') if isinstance(Body, str) else Body)
+            object_file.flush()
+            os.fsync(object_file.fileno())
+        os.replace(temporary_path, path)
+
+        return {}
@@ -2,9 +2,12 @@
 # SPDX-License-Identifier: MIT-0
 
 import boto3
+import json
 import logging
 import os
 
+from botocore.config import Config
+
 from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType, batch_processor
 from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 
@@ -12,6 +15,16 @@ processor = BatchProcessor(event_type=EventType.SQS)
 
 logging.getLogger().setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
 
+# One client for the lifetime of the execution environment
+client = boto3.client('stepfunctions', config=Config(max_pool_connections=10, retries={'mode': 'adaptive'}))
+
+# When set, the records of a batch are processed by a single execution of this state machine
+PROCESS_POST_BATCH_STATE_MACHINE = os.environ.get('PROCESS_POST_BATCH_STATE_MACHINE')
+
+# Step Functions accepts inputs of up to 256 KiB, larger batches are split in several executions
+MAX_EXECUTION_INPUT_BYTES = 240 * 1024
+
+
 def record_handler(record: SQSRecord):
 
     message_body = record.body
@@ -23,7 +36,6 @@ def record_handler(record: SQSRecord):
 
         logging.info('Starting step function processing:')
 
-        client = boto3.client('stepfunctions')
         response = client.start_execution(
             stateMachineArn=os.environ['PROCESS_POST_STATE_MACHINE'],
             input=message_body
@@ -35,9 +47,89 @@ def record_handler(record: SQSRecord):
         return response
 
 
+def split_executions(posts):
+    """Groups (record, post) pairs so that the input of every execution fits the Step Functions limit"""
+
+    executions, execution, execution_bytes = [], [], 0
+
+    for record, post in posts:
+        post_bytes = len(json.dumps(post).encode('utf-8')) + 2
+        if execution and execution_bytes + post_bytes > MAX_EXECUTION_INPUT_BYTES:
+            executions.append(execution)
+            execution, execution_bytes = [], 0
+        execution.append((record, post))
+        execution_bytes += post_bytes
+
+    if execution:
+        executions.append(execution)
+
+    return executions
+
+
+def run_execution(execution):
+    """Runs one synchronous execution for the posts and returns the error of each failed message"""
+
+    records = [record for record, _ in execution]
+
+    response = client.start_sync_execution(
+        stateMachineArn=PROCESS_POST_BATCH_STATE_MACHINE,
+        input=json.dumps({'posts': [post for _, post in execution]})
+    )
+
+    logging.info({'execution': response['executionArn'], 'status': response['status'], 'posts': len(records)})
+
+    if response['status'] != 'SUCCEEDED':
+        error = f"Execution {response['status']}: {response.get('error')} {response.get('cause')}"
+        return {record.message_id: error for record in records}
+
+    # The Map state returns the outcome of every post in the order of the input
+    outcomes = json.loads(response['output'])
+
+    return {record.message_id: f"{outcome.get('error')}: {outcome.get('cause')}"
+            for record, outcome in zip(records, outcomes) if not outcome.get('success')}
+
+
+def batch_record_handler(record: SQSRecord, errors=None):
+
+    if record.message_id in errors:
+        raise Exception(errors[record.message_id])
+
+    return {'success': True}
+
+
+def batch_handler(event, context):
+
+    errors, posts = {}, []
+
+    # Empty messages are acknowledged without starting any processing, invalid ones fail on their own
+    for record in [SQSRecord(record) for record in event['Records']]:
+        if record.body:
+            try:
+                posts.append((record, json.loads(record.body, strict=False)))
+            except ValueError as exception:
+                errors[record.message_id] = f'Invalid message body: {exception}'
+
+    for execution in split_executions(posts):
+        try:
+            errors.update(run_execution(execution))
+        except Exception as exception:
+            logging.error(exception, exc_info=True)
+            errors.update({record.message_id: str(exception) for record, _ in execution})
+
+    with processor(records=event['Records'], handler=lambda record: batch_record_handler(record, errors)):
+        processor.process()
+
+    return processor.response()
+
+
 @batch_processor(record_handler=record_handler, processor=processor)
-def handler(event, context):
+def per_record_handler(event, context):
     return processor.response()
 
 
+def handler(event, context):
+
+    if PROCESS_POST_BATCH_STATE_MACHINE:
+        return batch_handler(event, context)
 
+    return per_record_handler(event, context)
@@ -0,0 +1,108 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Cache stores shared by the insights cache of process_post and the geocode cache of locate_post
+
+Deployed as a Lambda layer, see CacheLayer in template.yaml.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import boto3
+
+
+class LRUCache:
+    """In-process least recently used cache whose entries expire after their own time to live, ttl_seconds when
+    put without one"""
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value, ttl_seconds: Optional[float] = None):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, self.clock() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteBackend:
+    """Persistent cache backend stored in a table of a local SQLite file, meant for tests and local runs"""
+
+    def __init__(self, path: str, table_name: str, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.table_name = table_name
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {table_name} (cache_key TEXT PRIMARY KEY, value TEXT, expires_at REAL)'
+            )
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            row = self.connection.execute(
+                f'SELECT value, expires_at FROM {self.table_name} WHERE cache_key = ?', (key,)
+            ).fetchone()
+        if row is None or row[1] <= self.clock():
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict, ttl_seconds: float):
+        with self.lock, self.connection:
+            self.connection.execute(
+                f'INSERT OR REPLACE INTO {self.table_name} (cache_key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), self.clock() + ttl_seconds)
+            )
+
+
+class DynamoDBBackend:
+    """Persistent cache backend stored in a DynamoDB table with TTL enabled on the expires_at attribute"""
+
+    def __init__(self, table_name: str, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self.table.get_item(Key={'cache_key': key}).get('Item')
+        # DynamoDB deletes expired items lazily so the expiration is checked here as well
+        if item is None or int(item['expires_at']) <= self.clock():
+            return None
+        return json.loads(item['value'])
+
+    def put(self, key: str, value: dict, ttl_seconds: float):
+        self.table.put_item(Item={
+            'cache_key': key,
+            'value': json.dumps(value, ensure_ascii=False),
+            'expires_at': int(self.clock() + ttl_seconds),
+        })
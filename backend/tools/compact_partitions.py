@@ -0,0 +1,349 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Merges the small objects of every partition below a prefix, in S3 or on local disk, into a few large objects
+
+Run it on a table prefix or on the root of several tables, for example:
+
+    python compact_partitions.py s3://my-posts-bucket/phrases --output_format jsonl.gz
+    python compact_partitions.py ../../sample-files --output_format parquet --checkpoint compaction.jsonl
+
+Each checkpoint entry records its source, the default checkpoint file is named after the source so that tables with
+the same partition and object names never share one.
+
+A partition is every directory (or S3 prefix) that directly contains objects. For each one the merged objects are
+first written under a name starting with an underscore, which Athena ignores. Then the checkpoint records the
+merge, the original objects are deleted, and the merged objects are published under their final names. Readers
+can briefly see a partition without the merged rows, but never see the same rows twice. An interrupted run
+started again with the same checkpoint resumes the merges it had staged. A partition compacted before is only
+compacted again once new objects are written to it, its merged objects are then merged with them.
+
+Parquet output only works with tables whose Glue definition uses the Parquet SerDe, see OutputFormat in
+template.yaml. Never mix both formats under one table.
+"""
+
+import argparse
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas', 'save_post'))
+
+from output_formats import TABLE_COLUMNS, TIMESTAMP_FORMAT, ParquetFormat  # noqa: E402
+
+logging.getLogger().setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+STAGING_PREFIX = '_compacting-'
+COMPACTED_PREFIX = 'compacted-'
+EXTENSIONS = {'jsonl.gz': 'jsonl.gz', 'json': 'json', 'parquet': 'parquet'}
+
+parser = argparse.ArgumentParser(description='Compact the small objects of the partitions below a prefix')
+parser.add_argument('source', type=str, help='s3://bucket/prefix or a local directory')
+parser.add_argument('--output_format', type=str, default='jsonl.gz', choices=list(EXTENSIONS))
+parser.add_argument('--target_bytes', type=int, default=128 * 1024 * 1024,
+                    help='Uncompressed size of the records of each merged object')
+parser.add_argument('--small_bytes', type=int, default=16 * 1024 * 1024,
+                    help='Objects of this size or larger are left as they are')
+parser.add_argument('--min_objects', type=int, default=2, help='Partitions with fewer small objects are skipped')
+parser.add_argument('--min_age_minutes', type=float, default=60,
+                    help='Objects modified more recently may still be written to and are left as they are')
+parser.add_argument('--workers', type=int, default=os.cpu_count())
+parser.add_argument('--checkpoint', type=str,
+                    help='compaction-checkpoint-<source>.jsonl in the working directory by default')
+parser.add_argument('--dry_run', action='store_true', help='Only list the partitions that would be compacted')
+
+
+class LocalStorage:
+    """Objects are the files below a local directory, keys use / as separator"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def list(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                yield key, os.path.getsize(path), os.path.getmtime(path)
+
+    def read(self, key: str) -> bytes:
+        with open(self.path(key), 'rb') as object_file:
+            return object_file.read()
+
+    def write(self, key: str, body: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as object_file:
+            object_file.write(body)
+            object_file.flush()
+            os.fsync(object_file.fileno())
+
+    def delete(self, keys):
+        for key in keys:
+            if os.path.exists(self.path(key)):
+                os.remove(self.path(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def publish(self, staged_key: str, key: str):
+        os.replace(self.path(staged_key), self.path(key))
+
+
+class S3Storage:
+    """Objects below a prefix of an S3 bucket, keys are relative to the prefix"""
+
+    def __init__(self, bucket: str, prefix: str):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.s3 = boto3.client('s3')
+
+    def list(self):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for s3_object in page.get('Contents', []):
+                yield (s3_object['Key'][len(self.prefix):], s3_object['Size'],
+                       s3_object['LastModified'].timestamp())
+
+    def read(self, key: str) -> bytes:
+        return self.s3.get_object(Bucket=self.bucket, Key=self.prefix + key)['Body'].read()
+
+    def write(self, key: str, body: bytes):
+        self.s3.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=body)
+
+    def delete(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), 1000):
+            self.s3.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': self.prefix + key} for key in keys[start:start + 1000]], 'Quiet': True})
+
+    def exists(self, key: str) -> bool:
+        return 'Contents' in self.s3.list_objects_v2(Bucket=self.bucket, Prefix=self.prefix + key, MaxKeys=1)
+
+    def publish(self, staged_key: str, key: str):
+        self.s3.copy_object(Bucket=self.bucket, Key=self.prefix + key,
+                            CopySource={'Bucket': self.bucket, 'Key': self.prefix + staged_key})
+        self.delete([staged_key])
+
+
+def open_storage(source: str):
+    if source.startswith('s3://'):
+        bucket, _, prefix = source[len('s3://'):].partition('/')
+        return S3Storage(bucket, prefix)
+    return LocalStorage(source)
+
+
+def source_id(source: str) -> str:
+    """Identity of a source in the checkpoint, the keys of its entries are relative to it"""
+    return source.rstrip('/') if source.startswith('s3://') else os.path.abspath(source)
+
+
+def default_checkpoint(name: str, source: str) -> str:
+    source = source_id(source)
+    label = os.path.basename(source) or 'root'
+    return f'{name}-{label}-{hashlib.sha256(source.encode("utf-8")).hexdigest()[:8]}.jsonl'
+
+
+class Checkpoint:
+    """Append only log of the state of every partition of a source, shared by the worker processes
+
+    Entries of another source, or written without one, are ignored: their keys would designate the objects of
+    the wrong table.
+    """
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = source_id(source)
+
+    def load(self) -> dict:
+        states, foreign = {}, 0
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as checkpoint_file:
+                for line in checkpoint_file:
+                    # A line cut by an interruption is ignored, the partition is compacted again
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('source') != self.source:
+                        foreign += 1
+                        continue
+                    states[entry['partition']] = entry
+        if foreign:
+            logging.warning(f'Ignored {foreign} entries of {self.path} that are not about {self.source}')
+        return states
+
+    def append(self, entry: dict):
+        # Lines are written with a single append so that concurrent workers do not interleave them
+        with open(self.path, 'a', encoding='utf-8') as checkpoint_file:
+            checkpoint_file.write(json.dumps({**entry, 'source': self.source}) + '\n')
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+
+def read_records(key: str, body: bytes) -> list:
+
+    if key.endswith('.parquet'):
+        import pyarrow.parquet
+
+        records = pyarrow.parquet.read_table(io.BytesIO(body)).to_pylist()
+        for record in records:
+            for name, value in record.items():
+                if isinstance(value, datetime.datetime):
+                    record[name] = value.strftime(TIMESTAMP_FORMAT)
+        return records
+
+    if key.endswith('.gz'):
+        body = gzip.decompress(body)
+
+    return [json.loads(line) for line in body.decode('utf-8').splitlines() if line.strip()]
+
+
+def encode_records(table: str, records: list, output_format: str) -> bytes:
+
+    if output_format == 'parquet':
+        import pyarrow
+        import pyarrow.parquet
+
+        # Tables written by save_post keep the column types of their Glue table, others are inferred
+        if table in TABLE_COLUMNS:
+            return ParquetFormat().encode(table, records)
+
+        output = io.BytesIO()
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), output, compression='snappy')
+        return output.getvalue()
+
+    lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+    return gzip.compress(lines) if output_format == 'jsonl.gz' else lines
+
+
+def plan_partitions(storage, small_bytes: int, min_objects: int, min_age_minutes: float) -> dict:
+    """Small objects to merge, grouped by partition"""
+
+    newest = time.time() - min_age_minutes * 60
+    partitions = defaultdict(list)
+
+    for key, size, modified in storage.list():
+        partition, _, name = key.rpartition('/')
+        if not partition or name.startswith(('_', '.')) or size >= small_bytes or modified > newest:
+            continue
+        partitions[partition].append(key)
+
+    return {partition: sorted(keys) for partition, keys in partitions.items() if len(keys) >= min_objects}
+
+
+def publish_partition(storage, checkpoint: Checkpoint, entry: dict):
+    """Deletes the originals and makes the staged objects visible, safe to repeat after an interruption"""
+
+    storage.delete(entry['sources'])
+
+    for staged_key, key in zip(entry['staged'], entry['targets']):
+        if storage.exists(staged_key):
+            storage.publish(staged_key, key)
+
+    checkpoint.append({**entry, 'state': 'done'})
+
+
+def compact_partition(source: str, checkpoint_path: str, partition: str, sources: list, output_format: str,
+                      target_bytes: int) -> dict:
+
+    storage = open_storage(source)
+    checkpoint = Checkpoint(checkpoint_path, source)
+    # The table is the directory above the partition, or the source itself when it points to a single table
+    table = partition.split('/')[-2] if '/' in partition else os.path.basename(source.rstrip('/'))
+
+    # Records are split in objects of about target_bytes, measured on their JSON size
+    groups, group, group_bytes = [], [], 0
+    for key in sources:
+        for record in read_records(key, storage.read(key)):
+            record_bytes = len(json.dumps(record, ensure_ascii=False))
+            if group and group_bytes + record_bytes > target_bytes:
+                groups.append(group)
+                group, group_bytes = [], 0
+            group.append(record)
+            group_bytes += record_bytes
+    if group:
+        groups.append(group)
+
+    run_id = uuid.uuid4().hex
+    extension = EXTENSIONS[output_format]
+    staged, targets = [], []
+
+    for index, records in enumerate(groups):
+        name = f'{run_id}-{index:04d}.{extension}'
+        staged.append(f'{partition}/{STAGING_PREFIX}{name}')
+        targets.append(f'{partition}/{COMPACTED_PREFIX}{name}')
+        storage.write(staged[-1], encode_records(table, records, output_format))
+
+    entry = {'partition': partition, 'state': 'staged', 'sources': sources, 'staged': staged, 'targets': targets,
+             'records': sum(len(records) for records in groups)}
+    checkpoint.append(entry)
+
+    publish_partition(storage, checkpoint, entry)
+
+    return entry
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    args.checkpoint = args.checkpoint or default_checkpoint('compaction-checkpoint', args.source)
+
+    storage = open_storage(args.source)
+    checkpoint = Checkpoint(args.checkpoint, args.source)
+    states = checkpoint.load()
+
+    # Merges staged by an interrupted run are finished first, their originals may be partly deleted already
+    for entry in states.values():
+        if entry['state'] == 'staged':
+            logging.info(f'Resuming the staged merge of {entry["partition"]}')
+            publish_partition(storage, checkpoint, entry)
+
+    # Objects staged by a run interrupted before its checkpoint was written are never published
+    orphans = [key for key, _, _ in storage.list() if key.rpartition('/')[2].startswith(STAGING_PREFIX)]
+    storage.delete(orphans)
+
+    # Partitions whose objects are all the result of their last merge have nothing new to compact
+    compacted = {partition: set(entry['targets']) for partition, entry in checkpoint.load().items()
+                 if entry['state'] == 'done'}
+    plan = plan_partitions(storage, args.small_bytes, args.min_objects, args.min_age_minutes)
+    done = {partition for partition, keys in plan.items() if set(keys) <= compacted.get(partition, set())}
+    plan = {partition: keys for partition, keys in plan.items() if partition not in done}
+
+    logging.info(f'{len(plan)} partitions to compact, {len(done)} already compacted')
+
+    if args.dry_run:
+        for partition, keys in sorted(plan.items()):
+            print(f'{partition}: {len(keys)} objects')
+        sys.exit(0)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(compact_partition, args.source, args.checkpoint, partition, keys,
+                                   args.output_format, args.target_bytes): partition
+                   for partition, keys in plan.items()}
+
+        for future in as_completed(futures):
+            try:
+                entry = future.result()
+                logging.info(f'{entry["partition"]}: {len(entry["sources"])} objects merged into '
+                             f'{len(entry["targets"])} with {entry["records"]} records')
+            except Exception as exception:
+                failed += 1
+                logging.error(f'{futures[future]}: {exception}', exc_info=True)
+
+    sys.exit(1 if failed else 0)
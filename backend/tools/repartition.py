@@ -0,0 +1,146 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Rewrites the objects of existing partitions, for example day level ones, into the layout of another interval
+
+Run it after changing PartitionIntervalMinutes so that the data written before the change is found by the
+partition projection, for example:
+
+    python repartition.py s3://my-posts-bucket --interval_minutes 60
+
+Records are assigned to the partition of their created_at, objects are staged, recorded in the checkpoint and
+published the same way as compact_partitions.py does, so that an interrupted run can be resumed. The checkpoint only
+resumes the entries of the same source, its default name is derived from the source.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import sys
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas', 'save_post'))
+
+from compact_partitions import (EXTENSIONS, STAGING_PREFIX, Checkpoint, default_checkpoint,  # noqa: E402
+                                encode_records, open_storage, publish_partition, read_records)
+from output_formats import TIMESTAMP_FORMAT  # noqa: E402
+from partitions import PARTITION_FORMAT, PARTITION_INTERVALS_MINUTES, partition_name  # noqa: E402
+
+REPARTITIONED_PREFIX = 'repartitioned-'
+
+parser = argparse.ArgumentParser(description='Rewrite partitions into the layout of another partition interval')
+parser.add_argument('source', type=str, help='s3://bucket/prefix or a local directory')
+parser.add_argument('--interval_minutes', type=int, required=True, choices=PARTITION_INTERVALS_MINUTES)
+parser.add_argument('--output_format', type=str, default='json', choices=list(EXTENSIONS))
+parser.add_argument('--workers', type=int, default=os.cpu_count())
+parser.add_argument('--checkpoint', type=str,
+                    help='repartition-checkpoint-<source>.jsonl in the working directory by default')
+parser.add_argument('--dry_run', action='store_true', help='Only list the partitions that would be rewritten')
+
+
+def is_partition(partition: str) -> bool:
+    # Older layouts, like the one of sample-files, name day level partitions by their date only
+    for partition_format in (PARTITION_FORMAT, '%Y-%m-%d'):
+        try:
+            datetime.datetime.strptime(partition.rpartition('/')[2], partition_format)
+            return True
+        except ValueError:
+            pass
+    return False
+
+
+def plan_partitions(storage) -> dict:
+    """Visible objects grouped by the partition they are in"""
+
+    partitions = defaultdict(list)
+    for key, _, _ in storage.list():
+        partition, _, name = key.rpartition('/')
+        if is_partition(partition) and not name.startswith(('_', '.')):
+            partitions[partition].append(key)
+
+    return {partition: sorted(keys) for partition, keys in partitions.items()}
+
+
+def repartition(source: str, checkpoint_path: str, partition: str, sources: list, interval_minutes: int,
+                output_format: str):
+
+    storage = open_storage(source)
+    checkpoint = Checkpoint(checkpoint_path, source)
+    table_prefix, _, name = partition.rpartition('/')
+    table = table_prefix.rpartition('/')[2] or os.path.basename(source.rstrip('/'))
+
+    groups = defaultdict(list)
+    for key in sources:
+        for record in read_records(key, storage.read(key)):
+            created_at = datetime.datetime.strptime(record['created_at'], TIMESTAMP_FORMAT)
+            groups[partition_name(created_at, interval_minutes)].append(record)
+
+    # Partitions already in the layout of the interval are left as they are
+    if list(groups) in ([], [name]):
+        return None
+
+    run_id = uuid.uuid4().hex
+    staged, targets = [], []
+
+    for target_name, records in sorted(groups.items()):
+        target_partition = f'{table_prefix}/{target_name}' if table_prefix else target_name
+        object_name = f'{run_id}.{EXTENSIONS[output_format]}'
+        staged.append(f'{target_partition}/{STAGING_PREFIX}{object_name}')
+        targets.append(f'{target_partition}/{REPARTITIONED_PREFIX}{object_name}')
+        storage.write(staged[-1], encode_records(table, records, output_format))
+
+    entry = {'partition': partition, 'state': 'staged', 'sources': sources, 'staged': staged, 'targets': targets,
+             'records': sum(len(records) for records in groups.values())}
+    checkpoint.append(entry)
+
+    publish_partition(storage, checkpoint, entry)
+
+    return entry
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    args.checkpoint = args.checkpoint or default_checkpoint('repartition-checkpoint', args.source)
+
+    storage = open_storage(args.source)
+    checkpoint = Checkpoint(args.checkpoint, args.source)
+
+    for entry in checkpoint.load().values():
+        if entry['state'] == 'staged':
+            logging.info(f'Resuming the staged rewrite of {entry["partition"]}')
+            publish_partition(storage, checkpoint, entry)
+
+    orphans = [key for key, _, _ in storage.list() if key.rpartition('/')[2].startswith(STAGING_PREFIX)]
+    storage.delete(orphans)
+
+    done = {partition for partition, entry in checkpoint.load().items() if entry['state'] == 'done'}
+    plan = {partition: keys for partition, keys in plan_partitions(storage).items() if partition not in done}
+
+    logging.info(f'{len(plan)} partitions to check, {len(done)} already rewritten')
+
+    if args.dry_run:
+        for partition, keys in sorted(plan.items()):
+            print(f'{partition}: {len(keys)} objects')
+        sys.exit(0)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(repartition, args.source, args.checkpoint, partition, keys, args.interval_minutes,
+                                   args.output_format): partition
+                   for partition, keys in plan.items()}
+
+        for future in as_completed(futures):
+            try:
+                entry = future.result()
+                if entry:
+                    logging.info(f'{entry["partition"]}: {entry["records"]} records rewritten into '
+                                 f'{len(entry["targets"])} partitions')
+            except Exception as exception:
+                failed += 1
+                logging.error(f'{futures[future]}: {exception}', exc_info=True)
+
+    sys.exit(1 if failed else 0)
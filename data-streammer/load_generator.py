@@ -0,0 +1,250 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import queue
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+PROFILES = ['sustained', 'ramp', 'spike', 'replay']
+
+# Cadence of the default mode of stream_posts.py, replayed by the replay profile
+REPLAY_POSTS_PER_MINUTE = 20
+
+SQS_MAX_BATCH_ENTRIES = 10
+
+
+class RateProfile:
+    """Target posts per second at each second of the run
+
+    sustained keeps the rate, ramp goes from 0 to the rate over the run, spike multiplies the rate during
+    spike_seconds in the middle of the run and replay follows the cadence of the default mode sped up by
+    time_compression.
+    """
+
+    def __init__(self, profile, rate, duration_seconds, spike_multiplier=10.0, spike_seconds=10.0,
+                 time_compression=1.0):
+        if profile not in PROFILES:
+            raise ValueError(f'Unknown profile {profile}, expected one of {", ".join(PROFILES)}')
+        self.profile = profile
+        self.rate = rate
+        self.duration_seconds = duration_seconds
+        self.spike_multiplier = spike_multiplier
+        self.spike_seconds = spike_seconds
+        self.time_compression = time_compression
+        self.spike_start = (duration_seconds - spike_seconds) / 2
+
+    def rate_at(self, elapsed):
+        if self.profile == 'ramp':
+            return self.rate * min(1.0, elapsed / self.duration_seconds)
+        if self.profile == 'spike' and self.spike_start <= elapsed < self.spike_start + self.spike_seconds:
+            return self.rate * self.spike_multiplier
+        if self.profile == 'replay':
+            return REPLAY_POSTS_PER_MINUTE / 60 * self.time_compression
+        return self.rate
+
+
+class PostGenerator:
+    """Posts from the sample texts, with exact and near duplicates of recent posts at the given ratios"""
+
+    def __init__(self, texts, cities, duplicate_ratio=0.0, near_duplicate_ratio=0.0, location_ratio=0.1,
+                 recent_posts=200, seed=None):
+        self.texts = texts
+        self.cities = cities
+        self.duplicate_ratio = duplicate_ratio
+        self.near_duplicate_ratio = near_duplicate_ratio
+        self.location_ratio = location_ratio
+        self.recent = []
+        self.recent_posts = recent_posts
+        self.random = random.Random(seed)
+        self.index = 0
+        self.lock = threading.Lock()
+
+    def near_duplicate(self, text):
+        """Text as a retweet, a copy-paste or a light edit would change it"""
+        variant = self.random.randrange(5)
+        if variant == 0:
+            return f'RT @user{self.random.randrange(1000)}: {text}'
+        if variant == 1:
+            return text.upper() if self.random.random() < 0.5 else text.lower()
+        if variant == 2:
+            return re.sub(r'[.,!?]', '', text) + self.random.choice([' !!', ' 🎉', ' #2024', '...'])
+        if variant == 3:
+            return '  '.join(text.split(' '))
+        return re.sub(r'https?://\S+', f'https://t.co/{self.random.randrange(10 ** 8):x}', text) \
+            if 'http' in text else text + ' ' + self.random.choice(['lol', 'so true', '+1'])
+
+    def next_text(self):
+        draw = self.random.random()
+        if self.recent and draw < self.duplicate_ratio:
+            return self.random.choice(self.recent)
+        if self.recent and draw < self.duplicate_ratio + self.near_duplicate_ratio:
+            return self.near_duplicate(self.random.choice(self.recent))
+
+        text = self.texts[self.index % len(self.texts)]
+        self.index += 1
+
+        if self.random.uniform(0, 1) < self.location_ratio:
+            text = text + '. From ' + self.random.choice(self.cities)
+
+        self.recent.append(text)
+        if len(self.recent) > self.recent_posts:
+            self.recent.pop(0)
+
+        return text
+
+    def next_post(self, created_at):
+        with self.lock:
+            text = self.next_text()
+        return {
+            "text": text,
+            "user": "test_user",
+            "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.%fz"),
+            "source": "test",
+            "platform": "test client"
+        }
+
+
+class LocalSqs:
+    """Stand-in for the SQS client that answers after a simulated round trip and fails some batch entries"""
+
+    def __init__(self, latency_seconds=0.02, failure_rate=0.0, seed=None):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.messages = 0
+
+    def send_message_batch(self, QueueUrl, Entries):
+        time.sleep(self.latency_seconds)
+        successful, failed = [], []
+        with self.lock:
+            for entry in Entries:
+                if self.random.random() < self.failure_rate:
+                    failed.append({'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError',
+                                   'Message': 'Simulated failure'})
+                else:
+                    successful.append({'Id': entry['Id'], 'MessageId': str(self.messages)})
+                    self.messages += 1
+        return {'Successful': successful, 'Failed': failed}
+
+
+def percentile(values, ratio):
+    return sorted(values)[min(len(values) - 1, int(len(values) * ratio))] if values else 0.0
+
+
+class LoadGenerator:
+    """Sends posts at the rate of the profile with SendMessageBatch requests spread over a thread pool"""
+
+    def __init__(self, sqs, queue_url, profile, posts, threads=8, batch_size=SQS_MAX_BATCH_ENTRIES,
+                 linger_seconds=0.05, report_interval_seconds=5.0):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.profile = profile
+        self.posts = posts
+        self.threads = threads
+        self.batch_size = min(batch_size, SQS_MAX_BATCH_ENTRIES)
+        self.linger_seconds = linger_seconds
+        self.report_interval_seconds = report_interval_seconds
+        self.latencies = []
+        self.sent = 0
+        self.failed = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def send(self, messages):
+        entries = [{'Id': str(index), 'MessageBody': json.dumps(message)} for index, message in enumerate(messages)]
+        start = time.perf_counter()
+        try:
+            response = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+        except Exception as exception:
+            print(f'SendMessageBatch failed: {exception}')
+            with self.lock:
+                self.errors += 1
+                self.failed += len(entries)
+            return
+        latency = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.latencies.append(latency)
+            self.sent += len(response.get('Successful', []))
+            self.failed += len(response.get('Failed', []))
+
+    def run(self):
+        """Emits the posts due by the integral of the rate, without waiting for the sends to complete
+
+        Full batches are emitted as soon as they are due, a partial batch once its first post has waited linger_seconds.
+        """
+
+        start = time.monotonic()
+        virtual_start = datetime.utcnow()
+        due, emitted, last_tick, last_report, last_sent, first_due_at = 0.0, 0, 0.0, 0.0, 0, None
+        # Batches wait here when every thread is busy, more than a few means the target rate is not reached
+        pending = queue.Queue(maxsize=self.threads * 4)
+
+        def worker():
+            while True:
+                messages = pending.get()
+                if messages is None:
+                    return
+                self.send(messages)
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for _ in range(self.threads):
+                executor.submit(worker)
+
+            while True:
+                elapsed = time.monotonic() - start
+                if elapsed >= self.profile.duration_seconds:
+                    break
+
+                due += self.profile.rate_at(elapsed) * (elapsed - last_tick)
+                last_tick = elapsed
+
+                if first_due_at is None and due - emitted >= 1:
+                    first_due_at = elapsed
+
+                while due - emitted >= self.batch_size or \
+                        (due - emitted >= 1 and elapsed - first_due_at >= self.linger_seconds):
+                    count = min(self.batch_size, int(due - emitted))
+                    # Posts of the replay profile carry the time they would have had without compression
+                    created_at = virtual_start + timedelta(seconds=elapsed * self.profile.time_compression) \
+                        if self.profile.profile == 'replay' else datetime.utcnow()
+                    pending.put([self.posts.next_post(created_at) for _ in range(count)])
+                    emitted += count
+                    first_due_at = elapsed if due - emitted >= 1 else None
+
+                if elapsed - last_report >= self.report_interval_seconds:
+                    with self.lock:
+                        sent = self.sent
+                    print(f'{elapsed:6.1f} s: target {self.profile.rate_at(elapsed):8.1f} posts/s, '
+                          f'achieved {(sent - last_sent) / (elapsed - last_report):8.1f} posts/s, '
+                          f'{pending.qsize()} batches waiting')
+                    last_report, last_sent = elapsed, sent
+
+                time.sleep(0.002)
+
+            for _ in range(self.threads):
+                pending.put(None)
+
+        duration = time.monotonic() - start
+
+        return {
+            'profile': self.profile.profile,
+            'target_posts': emitted,
+            'sent': self.sent,
+            'failed': self.failed,
+            'request_errors': self.errors,
+            'duration_seconds': round(duration, 3),
+            'throughput_posts_per_second': round(self.sent / duration, 1),
+            'requests': len(self.latencies),
+            'latency_ms': {
+                'p50': round(percentile(self.latencies, 0.5), 2),
+                'p90': round(percentile(self.latencies, 0.9), 2),
+                'p99': round(percentile(self.latencies, 0.99), 2),
+                'max': round(max(self.latencies, default=0.0), 2),
+            },
+        }
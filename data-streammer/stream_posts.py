@@ -2,16 +2,38 @@
 # SPDX-License-Identifier: MIT-0
 
 import json
+import sys
 import time
 import boto3
 import argparse
 import pandas as pd
 import random
+from botocore.config import Config
 from datetime import datetime
 
+from load_generator import PROFILES, REPLAY_POSTS_PER_MINUTE, LoadGenerator, LocalSqs, PostGenerator, RateProfile
+
 parser = argparse.ArgumentParser(description='Stream sample posts to an Amazon SQS Queue for processing')
-parser.add_argument('--queue_url', type=str, help='Amazon SQS Queue URL')
+parser.add_argument('--queue_url', type=str, help='Amazon SQS Queue URL, or local to send to an in-process stand-in')
 parser.add_argument('--region', type=str, help='The region where the AI Powered Text Insights is deployed')
+parser.add_argument('--mode', choices=['stream', 'load'], default='stream',
+                    help='stream sends 20 posts a minute, load sends posts at the rate of --profile')
+parser.add_argument('--profile', choices=PROFILES, default='sustained')
+parser.add_argument('--rate', type=float, default=100, help='Target posts per second of the load profile')
+parser.add_argument('--duration', type=float, default=60, help='Seconds the load runs, replay defaults to the whole file')
+parser.add_argument('--spike_multiplier', type=float, default=10)
+parser.add_argument('--spike_seconds', type=float, default=10)
+parser.add_argument('--time_compression', type=float, default=60,
+                    help='How many times faster than the stream mode the replay profile sends the file')
+parser.add_argument('--threads', type=int, default=8)
+parser.add_argument('--batch_size', type=int, default=10)
+parser.add_argument('--duplicate_ratio', type=float, default=0.0, help='Share of exact copies of recent posts')
+parser.add_argument('--near_duplicate_ratio', type=float, default=0.0,
+                    help='Share of retweets and lightly edited copies of recent posts')
+parser.add_argument('--local_latency_ms', type=float, default=20, help='Round trip of the local SQS stand-in')
+parser.add_argument('--local_failure_rate', type=float, default=0.0)
+parser.add_argument('--report_json', type=str, help='File where the load results are written')
+parser.add_argument('--seed', type=int)
 
 sample_cities = ['New York', 'Chicago', 'Kentucky', 'Arkansas', 'Miami', 'Los Angeles',
                  'San Francisco', 'New Jersey', 'San Diego', 'Orlando', 'Arlington', 'Washington DC',
@@ -56,14 +78,37 @@ if __name__ == '__main__':
     queue_url = args.queue_url
     region = args.region
 
-    sqs = boto3.client('sqs')
-    translate = boto3.client(service_name='translate', region_name=region, use_ssl=True)
-
     new_years_resolutions_df = pd.read_csv('new_years_resolutions_tweets.csv')
     new_years_resolutions_df['text'] = new_years_resolutions_df['text'].map(lambda x: x.encode(encoding='UTF-8', errors='replace').decode())
 
     resolutions_text = new_years_resolutions_df['text'].values.tolist()
 
+    if args.mode == 'load':
+
+        sqs = LocalSqs(args.local_latency_ms / 1000, args.local_failure_rate, args.seed) if queue_url == 'local' \
+            else boto3.client('sqs', region_name=region, config=Config(max_pool_connections=args.threads))
+
+        duration = args.duration
+        if args.profile == 'replay' and '--duration' not in sys.argv:
+            duration = len(resolutions_text) / (REPLAY_POSTS_PER_MINUTE / 60 * args.time_compression)
+
+        profile = RateProfile(args.profile, args.rate, duration, args.spike_multiplier, args.spike_seconds,
+                              args.time_compression)
+        posts = PostGenerator(resolutions_text, sample_cities, args.duplicate_ratio, args.near_duplicate_ratio,
+                              seed=args.seed)
+
+        results = LoadGenerator(sqs, queue_url, profile, posts, args.threads, args.batch_size).run()
+
+        print(json.dumps(results, indent=2))
+        if args.report_json:
+            with open(args.report_json, 'w') as report_file:
+                json.dump(results, report_file, indent=2)
+
+        sys.exit(0)
+
+    sqs = boto3.client('sqs')
+    translate = boto3.client(service_name='translate', region_name=region, use_ssl=True)
+
     #Use Amazon translate to translate the text into Spanish
     delta_i = 20
     for i in range(0, len(resolutions_text), delta_i):
@@ -6,11 +6,16 @@ import time
 
 import requests
 
+from metrics import REGISTRY
+
 
 class Backoff:
 
-    def __init__(self):
+    def __init__(self, name='default'):
         self.wait_time = 0
+        self.wait_time_gauge = REGISTRY.gauge('stream_getter_backoff_wait_seconds',
+                                              'Current wait of the backoff of each loop', {'loop': name})
+        self.waits = REGISTRY.counter('stream_getter_backoff_waits_total', 'Waits after an exception', {'loop': name})
 
     def wait_on_exception(self, exception):
         if isinstance(exception, requests.exceptions.HTTPError):
@@ -28,6 +33,8 @@ class Backoff:
         else:
             self.update_wait_time(1, 1, 1)
         logging.info(f'Sleeping for {self.wait_time} seconds...')
+        self.wait_time_gauge.set(self.wait_time)
+        self.waits.inc()
         time.sleep(self.wait_time)
 
     def update_wait_time(self, interval, multiplier, max_wait_time):
@@ -39,3 +46,4 @@ class Backoff:
 
     def reset_wait_time(self):
         self.wait_time = 0
+        self.wait_time_gauge.set(0)
@@ -0,0 +1,120 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Measures how many tweets per second the SQS consumer threads send, by batch size and thread count"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqs_helper import SqsHelper  # noqa: E402
+from stream_match import StreamMatch  # noqa: E402
+
+parser = argparse.ArgumentParser(description='Benchmark the SQS producer of stream-getter against a local SQS stand-in')
+parser.add_argument('--messages', type=int, default=2000)
+parser.add_argument('--request_latency_ms', type=float, default=20, help='Simulated round trip of an SQS request')
+parser.add_argument('--failure_rate', type=float, default=0.02,
+                    help='Share of the entries of a batch reported as failed by SendMessageBatch')
+parser.add_argument('--batch_sizes', default='1,5,10')
+parser.add_argument('--threads', default='1,2,4,8')
+parser.add_argument('--linger_ms', type=float, default=50)
+parser.add_argument('--seed', type=int, default=7)
+
+
+class FakeSqs:
+    """Receives SendMessage and SendMessageBatch requests after a simulated round trip, failing some batch entries"""
+
+    def __init__(self, latency_seconds, failure_rate, seed):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.requests = 0
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes):
+        time.sleep(self.latency_seconds)
+        with self.lock:
+            self.requests += 1
+            self.messages.append(MessageBody)
+        return {'MessageId': str(len(self.messages))}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        time.sleep(self.latency_seconds)
+        successful, failed = [], []
+        with self.lock:
+            self.requests += 1
+            for entry in Entries:
+                if self.random.random() < self.failure_rate:
+                    failed.append({'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError',
+                                   'Message': 'Simulated failure'})
+                else:
+                    self.messages.append(entry['MessageBody'])
+                    successful.append({'Id': entry['Id'], 'MessageId': str(len(self.messages))})
+        return {'Successful': successful, 'Failed': failed}
+
+
+def tweet(index):
+    return json.dumps({
+        'data': {'id': str(index), 'author_id': '1', 'text': f'Tweet number {index} about new years resolutions',
+                 'created_at': '2024-01-01T00:00:00.000Z', 'source': 'Benchmark'},
+        'includes': {'users': [{'id': '1', 'username': 'benchmark'}]},
+        'matching_rules': [{'id': '1', 'tag': 'resolutions'}]
+    })
+
+
+def consume(sqs_helper, matches_queue, batch):
+    """Same loop as send_tweets_to_sqs in main.py"""
+    if batch:
+        for entries in sqs_helper.batches(matches_queue):
+            sqs_helper.send_batch_to_sqs(entries)
+    else:
+        while True:
+            sqs_helper.send_tweet_to_sqs(matches_queue.get())
+
+
+def run(args, matches, batch_size, threads):
+
+    sqs = FakeSqs(args.request_latency_ms / 1000, args.failure_rate if batch_size else 0.0, args.seed)
+    sqs_helper = SqsHelper('https://sqs.local/benchmark', sqs_client=sqs, max_batch_entries=batch_size or 1,
+                           linger_seconds=args.linger_ms / 1000)
+
+    matches_queue = queue.SimpleQueue()
+    for match in matches:
+        matches_queue.put(match)
+
+    start = time.perf_counter()
+    for _ in range(threads):
+        threading.Thread(target=consume, args=[sqs_helper, matches_queue, bool(batch_size)], daemon=True).start()
+
+    while len(sqs.messages) < len(matches):
+        time.sleep(0.001)
+
+    return len(matches) / (time.perf_counter() - start), sqs.requests
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    matches = [StreamMatch(tweet(index)) for index in range(args.messages)]
+
+    print(f'{args.messages} tweets, {args.request_latency_ms} ms per request, '
+          f'{args.failure_rate:.0%} of batch entries failed and retried')
+
+    for threads in [int(value) for value in args.threads.split(',')]:
+        messages_per_second, requests = run(args, matches, 0, threads)
+        print(f'send_message         threads {threads:2d}: {messages_per_second:8.0f} messages/s, {requests} requests')
+
+        for batch_size in [int(value) for value in args.batch_sizes.split(',')]:
+            messages_per_second, requests = run(args, matches, batch_size, threads)
+            print(f'send_message_batch {batch_size:2d} threads {threads:2d}: {messages_per_second:8.0f} messages/s, '
+                  f'{requests} requests')
@@ -0,0 +1,125 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Measures the CPU time spent on every line of the filtered stream, by the producer and by the consumer threads"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import stream_match  # noqa: E402
+
+parser = argparse.ArgumentParser(description='Benchmark the parsing of filtered stream lines')
+parser.add_argument('--lines_file', help='Recorded stream, one line per message. Lines are generated when not given')
+parser.add_argument('--messages', type=int, default=50000)
+parser.add_argument('--seed', type=int, default=7)
+
+
+class LegacyStreamMatch:
+    """StreamMatch as it was before it parsed lines once, kept as the baseline of the benchmark"""
+
+    def __init__(self, content):
+        self.content = content
+
+    def to_tweet_json(self):
+        input_object = json.loads(self.content)
+        user = next(filter(lambda x: x['id'] == input_object['data']['author_id'], input_object['includes']['users']))
+        output_object = {
+            'text': input_object['data']['text'],
+            'user': user['username'],
+            'created_at': input_object['data']['created_at'] if 'created_at' in input_object['data'] else datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'source': input_object['data']['source'] if 'source' in input_object['data'] else 'Undefined',
+            'platform': 'Twitter'
+        }
+        return json.dumps(output_object, ensure_ascii=False)
+
+    def get_matching_rule(self):
+        input_object = json.loads(self.content)
+        matching_rule = input_object['matching_rules'][0]['tag']
+        return matching_rule
+
+    def has_errors(self):
+        return 'errors' in json.loads(self.content)
+
+
+def generate_lines(count, rng):
+    """Lines shaped like the v2 filtered stream: replies and quotes expand the users they reference"""
+
+    words = ['new', 'year', 'resolution', 'gym', 'run', 'read', 'more', 'books', 'save', 'money', 'learn', 'cook',
+             'travel', 'family', 'friends', 'é', '🎉', 'this', 'time', 'really']
+    lines = []
+
+    for index in range(count):
+        if index % 200 == 199:
+            lines.append(json.dumps({'errors': [{'title': 'operational-disconnect', 'type': 'about:blank'}]}))
+            continue
+        users = [{'id': str(rng.randrange(10 ** 12)), 'username': f'user{rng.randrange(10 ** 6)}',
+                  'name': 'Some Name'} for _ in range(rng.randint(1, 6))]
+        author = rng.choice(users)
+        lines.append(json.dumps({
+            'data': {'id': str(10 ** 18 + index), 'author_id': author['id'], 'edit_history_tweet_ids': [str(index)],
+                     'text': ' '.join(rng.choice(words) for _ in range(rng.randint(8, 50))),
+                     'created_at': '2024-01-01T00:00:00.000Z', 'source': 'Twitter for iPhone'},
+            'includes': {'users': users},
+            'matching_rules': [{'id': '1742', 'tag': 'new years resolutions'}]
+        }, ensure_ascii=False))
+
+    return [line.encode('utf-8') for line in lines]
+
+
+def consume(match):
+    if not match.has_errors():
+        match.get_matching_rule()
+        match.to_tweet_json()
+
+
+def measure(lines, produce):
+    start = time.process_time()
+    matches = [produce(line) for line in lines]
+    producer = time.process_time() - start
+
+    start = time.process_time()
+    for match in matches:
+        consume(match)
+    consumer = time.process_time() - start
+
+    return producer / len(lines) * 10 ** 6, consumer / len(lines) * 10 ** 6
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    if args.lines_file:
+        with open(args.lines_file, 'rb') as lines_file:
+            lines = [line.strip() for line in lines_file if line.strip()]
+    else:
+        lines = generate_lines(args.messages, random.Random(args.seed))
+
+    backends = [('json', json.loads, lambda value: json.dumps(value, ensure_ascii=False))]
+    if 'orjson' in sys.modules:
+        backends.append(('orjson', stream_match.loads, stream_match.dumps))
+
+    # The serialized messages only differ by the separators of the JSON backend
+    for line in lines[:1000]:
+        legacy, match = LegacyStreamMatch(line.decode('utf-8')), stream_match.StreamMatch(line)
+        assert legacy.has_errors() == match.has_errors()
+        if not match.has_errors():
+            assert json.loads(legacy.to_tweet_json()) == json.loads(match.to_tweet_json())
+            assert legacy.get_matching_rule() == match.get_matching_rule()
+
+    print(f'{len(lines)} lines, {sum(len(line) for line in lines) / len(lines):.0f} bytes on average')
+
+    producer, consumer = measure(lines, lambda line: LegacyStreamMatch(line.decode('utf-8')))
+    print(f'before          : producer {producer:6.2f} us, consumer {consumer:6.2f} us per message')
+
+    for name, loads, dumps in backends:
+        stream_match.loads, stream_match.dumps = loads, dumps
+        producer, consumer = measure(lines, stream_match.StreamMatch)
+        print(f'after ({name:6s}): producer {producer:6.2f} us, consumer {consumer:6.2f} us per message')
@@ -0,0 +1,135 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Checks that the matches queue stays bounded while SQS is stalled, keeps the order, and survives a killed process"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_sqs_producer import FakeSqs, tweet  # noqa: E402
+from spill_queue import FSYNC_POLICIES, SegmentLog, SpillQueue  # noqa: E402
+from sqs_helper import SqsHelper  # noqa: E402
+from stream_match import StreamMatch  # noqa: E402
+
+parser = argparse.ArgumentParser(description='Check the spill queue of stream-getter')
+parser.add_argument('--messages', type=int, default=5000)
+parser.add_argument('--max_in_memory', type=int, default=500)
+parser.add_argument('--stall_seconds', type=float, default=3)
+parser.add_argument('--fsync', default='interval', choices=FSYNC_POLICIES)
+parser.add_argument('--child', help=argparse.SUPPRESS)
+
+
+class StalledSqs(FakeSqs):
+    """SQS stand-in whose requests hang until it is released"""
+
+    def __init__(self):
+        super().__init__(latency_seconds=0.005, failure_rate=0.0, seed=0)
+        self.released = threading.Event()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.released.wait()
+        return super().send_message_batch(QueueUrl, Entries)
+
+
+def create_queue(directory, args, max_spill_bytes=0):
+    return SpillQueue(SegmentLog(directory, 1024 * 1024, args.fsync, 0.2), max_items=args.max_in_memory,
+                      max_spill_bytes=max_spill_bytes, serialize=lambda match: match.content,
+                      deserialize=StreamMatch)
+
+
+def tweet_id(message_body):
+    return int(json.loads(message_body)['text'].split()[2])
+
+
+def check_stall(args, directory):
+
+    matches_queue = create_queue(directory, args)
+    sqs = StalledSqs()
+    sqs_helper = SqsHelper('https://sqs.local/check', sqs_client=sqs, linger_seconds=0.01)
+
+    def consume():
+        for entries in sqs_helper.batches(matches_queue):
+            sqs_helper.send_batch_to_sqs(entries)
+
+    # A single consumer so that the messages reach SQS in the order they were queued
+    threading.Thread(target=consume, daemon=True).start()
+
+    peak = {}
+    start = time.monotonic()
+    for index in range(args.messages):
+        matches_queue.put(StreamMatch(tweet(index).encode('utf-8')))
+        # The firehose keeps coming while SQS is stalled
+        time.sleep(args.stall_seconds / args.messages)
+    for key, value in matches_queue.stats().items():
+        peak[key] = max(peak.get(key, 0), value)
+
+    print(f'stalled for {time.monotonic() - start:.1f} s: {peak}')
+    assert peak['memory_depth'] <= args.max_in_memory
+
+    sqs.released.set()
+    while len(sqs.messages) < args.messages:
+        time.sleep(0.01)
+    print(f'drained in {time.monotonic() - start:.1f} s: {matches_queue.stats()}')
+
+    ids = [tweet_id(message) for message in sqs.messages]
+    assert ids == list(range(args.messages)), 'Messages were reordered or lost'
+    assert not [name for name in os.listdir(directory) if name.endswith('.log')], 'Segments were not deleted'
+    print(f'{len(ids)} messages sent in order, spilled segments deleted')
+
+
+def run_child(args, directory):
+    """Queues every message with SQS stalled, then waits to be killed"""
+    matches_queue = create_queue(directory, args)
+    for index in range(args.messages):
+        matches_queue.put(StreamMatch(tweet(index).encode('utf-8')))
+    print(json.dumps(matches_queue.stats()), flush=True)
+    time.sleep(3600)
+
+
+def check_kill(args, directory):
+
+    child = subprocess.Popen([sys.executable, __file__, '--child', directory, '--messages', str(args.messages),
+                              '--max_in_memory', str(args.max_in_memory), '--fsync', args.fsync],
+                             stdout=subprocess.PIPE, text=True)
+    stats = json.loads(child.stdout.readline())
+    os.kill(child.pid, signal.SIGKILL)
+    child.wait()
+    print(f'killed the producer with {stats}')
+
+    # The matches held in memory are lost with the process, the spilled ones are read back in order
+    matches_queue = create_queue(directory, args)
+    recovered = matches_queue.stats()
+    ids = []
+    while matches_queue.qsize():
+        ids.append(tweet_id(matches_queue.get().to_tweet_json()))
+
+    assert recovered['spilled_records'] == stats['spilled_records']
+    assert ids == list(range(args.max_in_memory, args.messages)), 'Spilled messages were reordered or lost'
+    print(f'recovered {len(ids)} spilled messages in order after the restart, '
+          f'oldest queued {recovered["oldest_age_seconds"]} s before')
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args, args.child)
+        sys.exit(0)
+
+    for check in [check_stall, check_kill]:
+        directory = tempfile.mkdtemp(prefix='spill-')
+        try:
+            check(args, directory)
+        finally:
+            shutil.rmtree(directory)
@@ -3,12 +3,14 @@
 
 import logging
 import os
-import queue
 import threading
 
 import requests
 
+import metrics
 from backoff import Backoff
+from metrics import REGISTRY
+from spill_queue import SegmentLog, SpillQueue
 from sqs_helper import SqsHelper
 from stream_match import StreamMatch
 
@@ -17,7 +19,49 @@ REQUEST_CONNECT_TIMEOUT_SECONDS = 4
 REQUEST_READ_TIMEOUT_SECONDS = 30  # Twitter sends 20-second keep alive heartbeats
 STREAM_QUERY_PARAMS = 'tweet.fields=created_at,source&expansions=author_id&user.fields=username'
 
-matches_queue = queue.SimpleQueue()
+# Tweets are sent with SendMessageBatch by several threads sharing one client
+SQS_CONSUMER_THREADS = int(os.environ.get('SQS_CONSUMER_THREADS', '4'))
+SQS_BATCH_MAX_ENTRIES = int(os.environ.get('SQS_BATCH_MAX_ENTRIES', '10'))
+SQS_BATCH_MAX_BYTES = int(os.environ.get('SQS_BATCH_MAX_BYTES', str(256 * 1024)))
+SQS_BATCH_LINGER_MS = int(os.environ.get('SQS_BATCH_LINGER_MS', '50'))
+
+# Matches waiting to be sent, the ones that do not fit in memory are spilled to an append-only log on disk
+QUEUE_MAX_IN_MEMORY = int(os.environ.get('QUEUE_MAX_IN_MEMORY', '10000'))
+SPILL_DIR = os.environ.get('SPILL_DIR', '/tmp/stream-getter-spill')
+SPILL_MAX_BYTES = int(os.environ.get('SPILL_MAX_BYTES', str(1024 * 1024 * 1024)))
+SPILL_SEGMENT_BYTES = int(os.environ.get('SPILL_SEGMENT_BYTES', str(64 * 1024 * 1024)))
+SPILL_FSYNC = os.environ.get('SPILL_FSYNC', 'interval')
+SPILL_FSYNC_INTERVAL_MS = int(os.environ.get('SPILL_FSYNC_INTERVAL_MS', '1000'))
+
+matches_queue = SpillQueue(
+    SegmentLog(SPILL_DIR, SPILL_SEGMENT_BYTES, SPILL_FSYNC, SPILL_FSYNC_INTERVAL_MS / 1000),
+    max_items=QUEUE_MAX_IN_MEMORY,
+    max_spill_bytes=SPILL_MAX_BYTES,
+    serialize=lambda stream_match: stream_match.content,
+    deserialize=StreamMatch
+)
+
+# Metrics are served for scraping on METRICS_PORT and, when METRICS_EMF_INTERVAL_SECONDS is set, written as EMF lines
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9100'))
+METRICS_EMF_INTERVAL_SECONDS = int(os.environ.get('METRICS_EMF_INTERVAL_SECONDS', '0'))
+
+# One line in LOG_SAMPLE_EVERY is logged with its content at INFO level
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', '1000'))
+
+LINES_READ = REGISTRY.counter('stream_getter_lines_read_total', 'Lines read from the stream, without heartbeats')
+HEARTBEATS = REGISTRY.counter('stream_getter_heartbeats_total', 'Keep alive heartbeats read from the stream')
+CONNECTIONS = REGISTRY.counter('stream_getter_connections_total', 'Connections opened to the stream')
+RECONNECTS = REGISTRY.counter('stream_getter_reconnects_total', 'Connections to the stream lost or refused')
+
+
+def queue_metric(name):
+    return lambda: matches_queue.stats()[name]
+
+
+for queue_stat, queue_help in [('depth', 'Matches waiting to be sent'),
+                               ('spill_bytes', 'Bytes of the matches spilled to disk'),
+                               ('oldest_age_seconds', 'Age of the oldest match waiting to be sent')]:
+    REGISTRY.gauge(f'stream_getter_queue_{queue_stat}', queue_help, function=queue_metric(queue_stat))
 
 
 def bearer_oauth(r):
@@ -27,7 +71,7 @@ def bearer_oauth(r):
 
 
 def get_tweets_from_twitter():
-    backoff = Backoff()
+    backoff = Backoff('stream')
     while True:
         try:
             response = requests.get(
@@ -38,44 +82,69 @@ def get_tweets_from_twitter():
             )
             response.raise_for_status()
             logging.info('Connected to the Twitter stream')
+            CONNECTIONS.inc()
             backoff.reset_wait_time()
             for line in response.iter_lines():
                 if line:
-                    logging.info('New match!')
-                    decoded_line = line.decode('utf-8')
-                    logging.info(decoded_line)
-                    matches_queue.put(StreamMatch(decoded_line))
+                    # Lines are parsed by the consumers, the producer only has to keep up with the stream
+                    LINES_READ.inc()
+                    if LINES_READ.value % LOG_SAMPLE_EVERY == 0:
+                        logging.info(f'Line {LINES_READ.value}: {line.decode("utf-8")}')
+                    matches_queue.put(StreamMatch(line))
+                else:
+                    HEARTBEATS.inc()
         except Exception as exception:
             logging.error(exception, exc_info=True)
+            RECONNECTS.inc()
             backoff.wait_on_exception(exception)
             continue
 
 
 def send_tweets_to_sqs(sqs_helper):
-    backoff = Backoff()
+    backoff = Backoff('sqs')
+    batches = sqs_helper.batches(matches_queue)
+    batch = None
     while True:
         try:
-            stream_match = matches_queue.get()
-            if stream_match.has_errors():
-                logging.info('Skipping error')
-            else:
-                logging.info('Sending tweet to SQS')
-                sqs_helper.send_tweet_to_sqs(stream_match)
-                logging.info('Tweet sent to SQS')
+            # A batch that could not be sent is sent again before the next one is taken from the queue
+            if batch is None:
+                batch = next(batches)
+            failed = sqs_helper.send_batch_to_sqs(batch)
+            logging.debug(f'{len(batch) - failed} of {len(batch)} tweets sent to SQS')
+            batch = None
+            backoff.reset_wait_time()
         except Exception as exception:
             logging.error(exception, exc_info=True)
+            if batch is None:
+                # The generator is finished after raising, StopIteration included, a new one reads the queue
+                batches = sqs_helper.batches(matches_queue)
+            elif not sqs_helper.is_retryable(exception):
+                sqs_helper.drop_batch(batch)
+                batch = None
             backoff.wait_on_exception(exception)
             continue
 
 
 def main():
-    sqs_helper = SqsHelper(os.environ.get('SQS_QUEUE_URL'))
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+    if METRICS_EMF_INTERVAL_SECONDS:
+        metrics.emit_emf_periodically(METRICS_EMF_INTERVAL_SECONDS)
+    sqs_helper = SqsHelper(
+        os.environ.get('SQS_QUEUE_URL'),
+        max_batch_entries=SQS_BATCH_MAX_ENTRIES,
+        max_batch_bytes=SQS_BATCH_MAX_BYTES,
+        linger_seconds=SQS_BATCH_LINGER_MS / 1000,
+        max_pool_connections=max(10, SQS_CONSUMER_THREADS)
+    )
     producer = threading.Thread(target=get_tweets_from_twitter)
-    consumer = threading.Thread(target=send_tweets_to_sqs, args=[sqs_helper])
+    consumers = [threading.Thread(target=send_tweets_to_sqs, args=[sqs_helper]) for _ in range(SQS_CONSUMER_THREADS)]
     producer.start()
-    consumer.start()
+    for consumer in consumers:
+        consumer.start()
     producer.join()
-    consumer.join()
+    for consumer in consumers:
+        consumer.join()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,218 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import bisect
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Milliseconds, for request latencies
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def collect(self):
+        return self.value
+
+
+class Gauge:
+    """Value set by the code, or read from a function when the metrics are collected"""
+
+    kind = 'gauge'
+
+    def __init__(self, function=None):
+        self.value = 0
+        self.function = function
+
+    def set(self, value):
+        self.value = value
+
+    def collect(self):
+        return self.function() if self.function is not None else self.value
+
+
+class Histogram:
+    """Counts of observations by upper bound, cumulated when collected"""
+
+    kind = 'histogram'
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, ratio):
+        """Upper bound of the bucket holding the quantile, the largest bound for the overflow bucket"""
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        rank, seen = ratio * count, 0
+        for bound, bucket_count in zip(self.buckets + (self.buckets[-1],), counts):
+            seen += bucket_count
+            if seen >= rank and seen:
+                return bound
+        return 0
+
+    def collect(self):
+        with self.lock:
+            return {'buckets': list(zip(self.buckets, self.counts)), 'overflow': self.counts[-1], 'sum': self.sum,
+                    'count': self.count}
+
+
+class MetricsRegistry:
+    """Metrics of the process by name and labels, rendered in the Prometheus text format or as EMF log lines"""
+
+    def __init__(self, namespace='TextInsights/StreamGetter', service='stream-getter'):
+        self.namespace = namespace
+        self.service = service
+        self.metrics = {}
+        self.help = {}
+        self.emitted = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, help_text, labels, factory):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            if key not in self.metrics:
+                self.metrics[key] = factory()
+                self.help[name] = help_text
+            return self.metrics[key]
+
+    def counter(self, name, help_text, labels=None):
+        return self.register(name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text, labels=None, function=None):
+        return self.register(name, help_text, labels, lambda: Gauge(function))
+
+    def histogram(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        return self.register(name, help_text, labels, lambda: Histogram(buckets))
+
+    def render_prometheus(self):
+
+        lines, described = [], set()
+
+        with self.lock:
+            metrics = sorted(self.metrics.items(), key=lambda item: str(item[0]))
+
+        for (name, labels), metric in metrics:
+            if name not in described:
+                lines.append(f'# HELP {name} {self.help[name]}')
+                lines.append(f'# TYPE {name} {metric.kind}')
+                described.add(name)
+
+            if metric.kind != 'histogram':
+                lines.append(f'{name}{format_labels(labels)} {metric.collect()}')
+                continue
+
+            collected, cumulated = metric.collect(), 0
+            for bound, count in collected['buckets']:
+                cumulated += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulated}')
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {collected["count"]}')
+            lines.append(f'{name}_sum{format_labels(labels)} {collected["sum"]}')
+            lines.append(f'{name}_count{format_labels(labels)} {collected["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def emf_record(self):
+        """Embedded metric format record of every metric
+
+        Counters are written as their increase since the previous record, histograms as their count, p50 and p99.
+        """
+
+        values, definitions = {}, []
+
+        with self.lock:
+            metrics = list(self.metrics.items())
+
+        for (name, labels), metric in metrics:
+            metric_name = name + ''.join(f'_{value}' for _, value in labels)
+            if metric.kind == 'histogram':
+                values[f'{metric_name}_count'] = metric.count
+                values[f'{metric_name}_p50'] = metric.quantile(0.5)
+                values[f'{metric_name}_p99'] = metric.quantile(0.99)
+            elif metric.kind == 'counter':
+                value = metric.collect()
+                values[metric_name] = value - self.emitted.get(metric_name, 0)
+                self.emitted[metric_name] = value
+            else:
+                values[metric_name] = metric.collect()
+
+        for metric_name in values:
+            definitions.append({'Name': metric_name, 'Unit': 'None'})
+
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{'Namespace': self.namespace, 'Dimensions': [['Service']],
+                                       'Metrics': definitions}]
+            },
+            'Service': self.service,
+            **values
+        }
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_http_server(port, registry=REGISTRY):
+    """Serves the metrics in the Prometheus text format on http://0.0.0.0:<port>/metrics"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def emit_emf_periodically(interval_seconds, registry=REGISTRY, stream=sys.stdout):
+    """Writes an EMF record every interval, on its own line so that CloudWatch Logs extracts the metrics"""
+
+    def emit():
+        while True:
+            time.sleep(interval_seconds)
+            stream.write(json.dumps(registry.emf_record()) + '\n')
+            stream.flush()
+
+    threading.Thread(target=emit, daemon=True).start()
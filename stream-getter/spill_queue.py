@@ -0,0 +1,289 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+# Length and CRC32 of the payload, then the time the record was queued
+FRAME_HEADER = struct.Struct('<IId')
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+CURSOR_FILE = 'cursor'
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+# Records moved back to memory at a time when the log is read
+REFILL_RECORDS = 100
+
+
+class SegmentLog:
+    """Append-only log of records in numbered segment files, read back in the order they were written
+
+    Every record is written with a single write call and the file is synced according to the fsync policy: after every
+    record, at most every fsync_interval_seconds, or never. A record torn by a crash fails its length or CRC check and
+    ends the segment. The read position is saved in a cursor file with the same policy, records read after the last
+    save are read again after a restart.
+    """
+
+    def __init__(self, directory, segment_max_bytes=64 * 1024 * 1024, fsync='interval', fsync_interval_seconds=1.0,
+                 clock=time.monotonic):
+
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'Unknown fsync policy {fsync}, expected one of {", ".join(FSYNC_POLICIES)}')
+
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self.clock = clock
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = sorted(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                               if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+        self.next_segment = self.segments[-1] + 1 if self.segments else 0
+        self.write_fd, self.write_offset = None, 0
+        self.read_file, self.read_offset = None, 0
+        self.records, self.bytes = 0, 0
+        self.last_fsync, self.last_cursor_save = clock(), clock()
+
+        self.recover()
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f'{SEGMENT_PREFIX}{segment:012d}{SEGMENT_SUFFIX}')
+
+    def recover(self):
+        """Counts the unread records left by a previous process, starting from its saved cursor"""
+
+        cursor_segment, cursor_offset = -1, 0
+        cursor_path = os.path.join(self.directory, CURSOR_FILE)
+        if os.path.exists(cursor_path):
+            with open(cursor_path) as cursor_file:
+                cursor_segment, cursor_offset = (int(value) for value in cursor_file.read().split())
+
+        # Segments before the cursor were read completely
+        for segment in [segment for segment in self.segments if segment < cursor_segment]:
+            os.remove(self.segment_path(segment))
+        self.segments = [segment for segment in self.segments if segment >= cursor_segment]
+
+        for segment in self.segments:
+            offset = cursor_offset if segment == cursor_segment else 0
+            with open(self.segment_path(segment), 'rb') as segment_file:
+                segment_file.seek(offset)
+                for payload, _ in iter(lambda: read_frame(segment_file), None):
+                    self.records += 1
+                    self.bytes += FRAME_HEADER.size + len(payload)
+
+        if self.segments:
+            self.read_offset = cursor_offset if self.segments[0] == cursor_segment else 0
+            logging.warning(f'Recovered {self.records} records from {len(self.segments)} segments in {self.directory}')
+
+    def append(self, payload, queued_at):
+
+        frame = FRAME_HEADER.pack(len(payload), zlib.crc32(payload), queued_at) + payload
+
+        if self.write_fd is None or (self.write_offset and self.write_offset + len(frame) > self.segment_max_bytes):
+            self.rotate()
+
+        os.write(self.write_fd, frame)
+        self.write_offset += len(frame)
+        self.records += 1
+        self.bytes += len(frame)
+
+        if self.fsync == 'always' or (self.fsync == 'interval'
+                                      and self.clock() - self.last_fsync >= self.fsync_interval_seconds):
+            os.fsync(self.write_fd)
+            self.last_fsync = self.clock()
+
+    def rotate(self):
+        if self.write_fd is not None:
+            if self.fsync != 'never':
+                os.fsync(self.write_fd)
+            os.close(self.write_fd)
+        segment = self.next_segment
+        self.next_segment += 1
+        self.write_fd = os.open(self.segment_path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self.write_offset = 0
+        self.segments.append(segment)
+
+    def read(self):
+        """Returns the oldest unread (payload, queued_at), or None when the log has been read completely"""
+
+        while self.records:
+
+            if self.read_file is None:
+                self.read_file = open(self.segment_path(self.segments[0]), 'rb')
+                self.read_file.seek(self.read_offset)
+
+            frame = read_frame(self.read_file)
+
+            if frame is None:
+                if len(self.segments) == 1:
+                    # Only a corrupted record can be missing from the segment being written
+                    logging.error(f'Dropping {self.records} unreadable records from {self.directory}')
+                    self.reset()
+                    return None
+                self.finish_segment()
+                continue
+
+            payload, queued_at = frame
+            self.read_offset += FRAME_HEADER.size + len(payload)
+            self.records -= 1
+            self.bytes -= FRAME_HEADER.size + len(payload)
+
+            if self.records == 0:
+                self.reset()
+            elif self.fsync == 'always' or (self.fsync == 'interval'
+                                            and self.clock() - self.last_cursor_save >= self.fsync_interval_seconds):
+                self.save_cursor()
+
+            return payload, queued_at
+
+        return None
+
+    def oldest_queued_at(self):
+        for index, segment in enumerate(self.segments):
+            with open(self.segment_path(segment), 'rb') as segment_file:
+                segment_file.seek(self.read_offset if index == 0 else 0)
+                header = segment_file.read(FRAME_HEADER.size)
+            if len(header) == FRAME_HEADER.size:
+                return FRAME_HEADER.unpack(header)[2]
+        return None
+
+    def finish_segment(self):
+        self.read_file.close()
+        self.read_file = None
+        os.remove(self.segment_path(self.segments.pop(0)))
+        self.read_offset = 0
+        self.save_cursor()
+
+    def reset(self):
+        """Deletes the segments once every record has been read, the next record starts a new segment"""
+        self.close_files()
+        for segment in self.segments:
+            os.remove(self.segment_path(segment))
+        self.segments, self.read_offset, self.records, self.bytes = [], 0, 0, 0
+        self.save_cursor()
+
+    def save_cursor(self):
+        cursor_path = os.path.join(self.directory, CURSOR_FILE)
+        segment = self.segments[0] if self.segments else self.next_segment
+        with open(f'{cursor_path}.tmp', 'w') as cursor_file:
+            cursor_file.write(f'{segment} {self.read_offset}')
+        os.replace(f'{cursor_path}.tmp', cursor_path)
+        self.last_cursor_save = self.clock()
+
+    def close_files(self):
+        if self.read_file is not None:
+            self.read_file.close()
+            self.read_file = None
+        if self.write_fd is not None:
+            if self.fsync != 'never':
+                os.fsync(self.write_fd)
+            os.close(self.write_fd)
+            self.write_fd = None
+
+    def close(self):
+        self.close_files()
+        if self.segments:
+            self.save_cursor()
+
+
+def read_frame(segment_file):
+    header = segment_file.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    length, crc, queued_at = FRAME_HEADER.unpack(header)
+    payload = segment_file.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        return None
+    return payload, queued_at
+
+
+class SpillQueue:
+    """FIFO queue that keeps up to max_items in memory and spills the rest to a SegmentLog
+
+    Once a record has been spilled, new records are appended to the log until it has been read completely, so records
+    come out in the order they were put. When max_spill_bytes is set and the log reaches it, put blocks until the
+    consumers catch up. get has the same signature as queue.Queue.get.
+    """
+
+    def __init__(self, log, max_items=10000, max_spill_bytes=0, serialize=bytes, deserialize=bytes, clock=time.time):
+        self.log = log
+        self.max_items = max_items
+        self.max_spill_bytes = max_spill_bytes
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.clock = clock
+        self.memory = deque()
+        self.spilled = 0
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def put(self, item):
+        with self.lock:
+            if not self.log.records and len(self.memory) < self.max_items:
+                self.memory.append((self.clock(), item))
+            else:
+                while self.max_spill_bytes and self.log.bytes >= self.max_spill_bytes:
+                    self.not_full.wait()
+                self.log.append(self.serialize(item), self.clock())
+                self.spilled += 1
+            self.not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        with self.lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.memory and not self.refill():
+                if not block:
+                    raise queue.Empty
+                if deadline is None:
+                    self.not_empty.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.not_empty.wait(remaining)
+            return self.memory.popleft()[1]
+
+    def refill(self):
+        """Moves the oldest spilled records back to memory, returns whether there were any"""
+
+        for _ in range(max(1, min(self.max_items, REFILL_RECORDS))):
+            record = self.log.read()
+            if record is None:
+                break
+            payload, queued_at = record
+            try:
+                self.memory.append((queued_at, self.deserialize(payload)))
+            except Exception as exception:
+                logging.error(f'Dropping a spilled record that cannot be read: {exception}')
+
+        self.not_full.notify_all()
+        return bool(self.memory)
+
+    def qsize(self):
+        with self.lock:
+            return len(self.memory) + self.log.records
+
+    def stats(self):
+        with self.lock:
+            oldest = self.memory[0][0] if self.memory else self.log.oldest_queued_at() if self.log.records else None
+            return {
+                'depth': len(self.memory) + self.log.records,
+                'memory_depth': len(self.memory),
+                'spilled_records': self.log.records,
+                'spill_bytes': self.log.bytes,
+                'spilled_total': self.spilled,
+                'oldest_age_seconds': round(self.clock() - oldest, 3) if oldest is not None else 0.0,
+            }
+
+    def close(self):
+        with self.lock:
+            self.log.close()
@@ -1,14 +1,46 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import logging
+import queue
+import time
+
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from metrics import REGISTRY
+
+# Limits of SendMessageBatch
+SQS_MAX_BATCH_ENTRIES = 10
+SQS_MAX_BATCH_BYTES = 256 * 1024
+
+# Errors of SendMessageBatch caused by the entries themselves, sending the same batch again fails the same way
+INVALID_BATCH_ERRORS = ('InvalidParameterValue', 'InvalidMessageContents', 'BatchRequestTooLong',
+                        'BatchEntryIdsNotDistinct', 'TooManyEntriesInBatchRequest', 'EmptyBatchRequest',
+                        'InvalidBatchEntryId')
+
+PARSE_ERRORS = REGISTRY.counter('stream_getter_parse_errors_total', 'Stream lines that could not be parsed')
+ERROR_MESSAGES = REGISTRY.counter('stream_getter_error_messages_total', 'Stream messages skipped as errors')
+MESSAGES_SENT = REGISTRY.counter('stream_getter_messages_sent_total', 'Messages sent to SQS')
+MESSAGES_RETRIED = REGISTRY.counter('stream_getter_messages_retried_total', 'Batch entries retried one by one')
+MESSAGES_FAILED = REGISTRY.counter('stream_getter_messages_failed_total', 'Messages that could not be sent to SQS')
+BATCH_SIZE = REGISTRY.histogram('stream_getter_batch_size', 'Entries of each SendMessageBatch request',
+                                buckets=range(1, SQS_MAX_BATCH_ENTRIES + 1))
+SEND_LATENCY = REGISTRY.histogram('stream_getter_sqs_send_latency_ms', 'Latency of the SendMessageBatch requests')
 
 
 class SqsHelper:
 
-    def __init__(self, sqs_queue_url):
-        self.sqs_client = boto3.client('sqs')
+    def __init__(self, sqs_queue_url, sqs_client=None, max_batch_entries=SQS_MAX_BATCH_ENTRIES,
+                 max_batch_bytes=SQS_MAX_BATCH_BYTES, linger_seconds=0.05, max_attempts=3, max_pool_connections=10):
+        # The client is shared by every consumer thread, its pool needs a connection for each of them
+        self.sqs_client = sqs_client or boto3.client('sqs', config=Config(max_pool_connections=max_pool_connections))
         self.sqs_queue_url = sqs_queue_url
+        self.max_batch_entries = min(max_batch_entries, SQS_MAX_BATCH_ENTRIES)
+        self.max_batch_bytes = min(max_batch_bytes, SQS_MAX_BATCH_BYTES)
+        self.linger_seconds = linger_seconds
+        self.max_attempts = max_attempts
 
     def send_tweet_to_sqs(self, stream_match):
         self.sqs_client.send_message(
@@ -21,3 +53,128 @@ class SqsHelper:
                 }
             }
         )
+
+    @staticmethod
+    def to_entry(stream_match, entry_id):
+        return {
+            'Id': entry_id,
+            'MessageBody': stream_match.to_tweet_json(),
+            'MessageAttributes': {
+                'matching_rule': {
+                    'StringValue': stream_match.get_matching_rule(),
+                    'DataType': 'String'
+                }
+            }
+        }
+
+    @staticmethod
+    def entry_size(entry):
+        # SQS counts the body and the name, type and value of every attribute towards the size of a message
+        size = len(entry['MessageBody'].encode('utf-8'))
+        for name, attribute in entry['MessageAttributes'].items():
+            size += len(name) + len(attribute['DataType']) + len(attribute['StringValue'].encode('utf-8'))
+        return size
+
+    def batches(self, matches_queue):
+        """Yields lists of entries taken from the queue
+
+        A batch is sent when it has max_batch_entries entries, when the next entry would make it larger than
+        max_batch_bytes, or linger_seconds after its first entry was taken. Every consumer thread uses its own generator.
+        """
+
+        pending = None
+        while True:
+            batch, batch_bytes, deadline = [], 0, None
+
+            while len(batch) < self.max_batch_entries:
+                if pending is not None:
+                    entry, pending = pending, None
+                else:
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    try:
+                        stream_match = matches_queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    # A match that cannot be read is dropped here, an exception would end the generator
+                    try:
+                        if stream_match.has_errors():
+                            logging.debug('Skipping error')
+                            ERROR_MESSAGES.inc()
+                            continue
+                        entry = self.to_entry(stream_match, str(len(batch)))
+                    except Exception as exception:
+                        logging.error(exception, exc_info=True)
+                        PARSE_ERRORS.inc()
+                        continue
+
+                size = self.entry_size(entry)
+                if batch and batch_bytes + size > self.max_batch_bytes:
+                    pending = entry
+                    break
+
+                # Ids only need to be unique within a batch, the entry of a full batch is carried to the next one
+                entry['Id'] = str(len(batch))
+                batch.append(entry)
+                batch_bytes += size
+                if deadline is None:
+                    deadline = time.monotonic() + self.linger_seconds
+
+            if batch:
+                yield batch
+
+    def send_batch_to_sqs(self, entries):
+        """Sends the entries with one request and retries the ones that failed one by one
+
+        Returns the number of entries that could not be sent.
+        """
+
+        start = time.perf_counter()
+        response = self.sqs_client.send_message_batch(QueueUrl=self.sqs_queue_url, Entries=entries)
+        SEND_LATENCY.observe((time.perf_counter() - start) * 1000)
+        BATCH_SIZE.observe(len(entries))
+
+        entries_by_id = {entry['Id']: entry for entry in entries}
+        failed = 0
+
+        for failure in response.get('Failed', []):
+            logging.warning(f"Retrying message {failure['Id']}: {failure.get('Code')} {failure.get('Message')}")
+            MESSAGES_RETRIED.inc()
+            if not self.send_entry_to_sqs(entries_by_id[failure['Id']]):
+                failed += 1
+
+        MESSAGES_SENT.inc(len(entries) - failed)
+        MESSAGES_FAILED.inc(failed)
+
+        return failed
+
+    @staticmethod
+    def is_retryable(exception):
+        """Whether a batch whose request raised the exception can be sent again"""
+        if isinstance(exception, ClientError):
+            # Queues with the JSON protocol prefix the codes with AWS.SimpleQueueService.
+            return exception.response.get('Error', {}).get('Code', '').split('.')[-1] not in INVALID_BATCH_ERRORS
+        return True
+
+    def drop_batch(self, entries):
+        MESSAGES_FAILED.inc(len(entries))
+        for entry in entries:
+            logging.error(f"Unable to send message: {entry['MessageBody']}")
+
+    def send_entry_to_sqs(self, entry):
+
+        for attempt in range(self.max_attempts):
+            try:
+                self.sqs_client.send_message(
+                    QueueUrl=self.sqs_queue_url,
+                    MessageBody=entry['MessageBody'],
+                    MessageAttributes=entry['MessageAttributes']
+                )
+                return True
+            except Exception as exception:
+                logging.warning(f'Attempt {attempt + 1} to send a message failed: {exception}')
+                time.sleep(0.1 * 2 ** attempt)
+
+        logging.error(f"Unable to send message: {entry['MessageBody']}")
+        return False
@@ -1,30 +1,75 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import json
 import datetime
+import json
+
+# orjson parses and serializes several times faster when it is installed
+try:
+    import orjson
+
+    def loads(content):
+        return orjson.loads(content)
+
+    def dumps(value):
+        return orjson.dumps(value).decode('utf-8')
+
+except ImportError:
+
+    def loads(content):
+        return json.loads(content)
+
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False)
+
 
 class StreamMatch:
+    """A line of the filtered stream, parsed once the first time one of its fields is needed
+
+    The producer thread only stores the raw line, parsing is left to the consumer threads.
+    """
+
+    __slots__ = ('content', 'parsed', 'errors', 'text', 'user', 'created_at', 'source', 'matching_rule')
 
     def __init__(self, content):
         self.content = content
+        self.parsed = False
+
+    def parse(self):
+        if self.parsed:
+            return
+
+        input_object = loads(self.content)
+        self.errors = 'errors' in input_object
+
+        if not self.errors:
+            data = input_object['data']
+            # Authors of the tweet and of the tweets it references are expanded, the author is found by id
+            users = {user['id']: user['username'] for user in input_object['includes']['users']}
+
+            self.text = data['text']
+            self.user = users[data['author_id']]
+            self.created_at = data['created_at'] if 'created_at' in data \
+                else datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            self.source = data.get('source', 'Undefined')
+            self.matching_rule = input_object['matching_rules'][0]['tag']
+
+        self.parsed = True
 
     def to_tweet_json(self):
-        input_object = json.loads(self.content)
-        user = next(filter(lambda x: x['id'] == input_object['data']['author_id'], input_object['includes']['users']))
-        output_object = {
-            'text': input_object['data']['text'],
-            'user': user['username'],
-            'created_at': input_object['data']['created_at'] if 'created_at' in input_object['data'] else datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z'),
-            'source': input_object['data']['source'] if 'source' in input_object['data'] else 'Undefined',
+        self.parse()
+        return dumps({
+            'text': self.text,
+            'user': self.user,
+            'created_at': self.created_at,
+            'source': self.source,
             'platform': 'Twitter'
-        }
-        return json.dumps(output_object, ensure_ascii=False)
+        })
 
     def get_matching_rule(self):
-        input_object = json.loads(self.content)
-        matching_rule = input_object['matching_rules'][0]['tag']
-        return matching_rule
+        self.parse()
+        return self.matching_rule
 
     def has_errors(self):
-        return 'errors' in json.loads(self.content)
+        self.parse()
+        return self.errors